@@ -1,25 +1,1497 @@
 """BankIQ+ Simplified Agent - Let Claude Decide Which Tools to Use"""
-from bedrock_agentcore.runtime import BedrockAgentCoreApp
-from strands import Agent, tool
-from strands.models import BedrockModel
-import boto3
-import json
-import requests
-import os
-from typing import List, Dict
+import time
+from contextlib import asynccontextmanager, contextmanager
 
-app = BedrockAgentCoreApp()
+# Per-phase import/startup timings in seconds, reported by prewarm()
+startup_started = time.perf_counter()
+startup_timings = {}
 
-# Initialize AWS clients
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-s3 = boto3.client('s3', region_name='us-east-1')
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round(time.perf_counter() - started, 3)
+
+with startup_phase("import stdlib"):
+    import asyncio
+    import contextvars
+    import hashlib
+    import importlib
+    import inspect
+    import io
+    import json
+    import mmap
+    import os
+    import re
+    import sys
+    import threading
+    import weakref
+    import zlib
+    from collections import OrderedDict
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from typing import List, Dict, Optional
+with startup_phase("import boto3"):
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+with startup_phase("import strands"):
+    from strands import Agent, tool
+    from strands.models import BedrockModel
+with startup_phase("import bedrock_agentcore"):
+    from bedrock_agentcore.runtime import BedrockAgentCoreApp
+with startup_phase("import extract_pdf_metadata"):
+    from extract_pdf_metadata import MAX_METADATA_PAGES, SPOOL_MAX_MEMORY, decode_base64_to_spool, extract_metadata_from_file
+
+# ============================================================================
+# STARTUP
+# ============================================================================
+
+# Cold-start mode: AWS clients, the Strands agent, httpx and PyPDF2 are
+# built or imported on first use instead of at import, so new instances
+# answer pings sooner during scale-out. Set LAZY_STARTUP=false to build
+# everything at import and fail fast on bad configuration.
+LAZY_STARTUP = os.environ.get('LAZY_STARTUP', 'true').lower() == 'true'
+# In lazy mode, warm everything in a background thread once the server starts
+PREWARM_ON_START = os.environ.get('PREWARM_ON_START', 'true').lower() == 'true'
+# Imported by prewarm(); tools import them where they are used
+PREWARM_MODULES = ['httpx', 'PyPDF2']
+
+class LazyResource:
+    """Builds an object on first attribute access and proxies to it afterwards.
+    
+    Thread-safe: concurrent first uses wait for a single build."""
+    
+    def __init__(self, name: str, factory):
+        self.name = name
+        self.factory = factory
+        self.instance = None
+        self.lock = threading.Lock()
+    
+    def get(self):
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    with startup_phase(f"build {self.name}"):
+                        self.instance = self.factory()
+        return self.instance
+    
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+@asynccontextmanager
+async def warm_on_start(app):
+    if LAZY_STARTUP and PREWARM_ON_START:
+        threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
+    yield
+
+app = BedrockAgentCoreApp(lifespan=warm_on_start)
+
+# Bedrock runtime settings; region follows the deployment unless pinned
+BEDROCK_REGION = os.environ.get('BEDROCK_REGION', os.environ.get('AWS_REGION', 'us-east-1'))
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', 50))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', 8))
+BEDROCK_CONNECT_TIMEOUT = int(os.environ.get('BEDROCK_CONNECT_TIMEOUT', 10))
+# Long reports stream for minutes; the read timeout is per socket read
+BEDROCK_READ_TIMEOUT = int(os.environ.get('BEDROCK_READ_TIMEOUT', 300))
+# In-process cap on concurrent Bedrock calls (streams hold a slot until drained)
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', 16))
+# Seconds to wait for a free slot before failing the call as throttled
+BEDROCK_SLOT_TIMEOUT = float(os.environ.get('BEDROCK_SLOT_TIMEOUT', 60))
+
+THROTTLE_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException'}
+
+bedrock_metrics = {"calls": 0, "errors": 0, "throttles": 0, "retries": 0, "waits": 0, "wait_seconds": 0.0, "in_flight": 0}
+bedrock_metrics_lock = threading.Lock()
+
+def count_bedrock(**deltas):
+    with bedrock_metrics_lock:
+        for name, delta in deltas.items():
+            bedrock_metrics[name] += delta
+
+def count_throttle(response=None, attempts=None, **kwargs):
+    """needs-retry hook: counts every throttled attempt, including ones botocore retries."""
+    if response is not None:
+        code = response[1].get('Error', {}).get('Code', '')
+        if code in THROTTLE_ERROR_CODES:
+            count_bedrock(throttles=1)
+            print(f"[bedrock] {code} on attempt {attempts}")
+
+class LimitedBedrockClient:
+    """bedrock-runtime client wrapper that bounds in-flight calls and records metrics.
+
+    Anything other than converse/converse_stream is passed through untouched.
+    """
+    
+    def __init__(self, client, max_concurrency: int, slot_timeout: float = BEDROCK_SLOT_TIMEOUT):
+        self.client = client
+        self.slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.slot_timeout = slot_timeout
+    
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+    
+    def acquire(self):
+        if not self.slots.acquire(blocking=False):
+            start_time = time.time()
+            acquired = self.slots.acquire(timeout=self.slot_timeout)
+            count_bedrock(waits=1, wait_seconds=time.time() - start_time)
+            if not acquired:
+                count_bedrock(errors=1, throttles=1)
+                print(f"[bedrock] No free slot after {self.slot_timeout}s")
+                raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': f'No Bedrock slot free after {self.slot_timeout}s'}}, 'AcquireSlot')
+        count_bedrock(calls=1, in_flight=1)
+    
+    def release(self):
+        count_bedrock(in_flight=-1)
+        self.slots.release()
+    
+    def call(self, operation, kwargs):
+        try:
+            response = operation(**kwargs)
+        except ClientError as e:
+            count_bedrock(errors=1, retries=e.response.get('ResponseMetadata', {}).get('RetryAttempts', 0))
+            raise
+        except Exception:
+            count_bedrock(errors=1)
+            raise
+        count_bedrock(retries=response.get('ResponseMetadata', {}).get('RetryAttempts', 0))
+        return response
+    
+    def converse(self, **kwargs):
+        self.acquire()
+        try:
+            return self.call(self.client.converse, kwargs)
+        finally:
+            self.release()
+    
+    def converse_stream(self, **kwargs):
+        self.acquire()
+        try:
+            response = self.call(self.client.converse_stream, kwargs)
+        except Exception:
+            self.release()
+            raise
+        response['stream'] = SlotHoldingStream(response['stream'], self.release)
+        return response
+
+class SlotHoldingStream:
+    """Event stream that releases its concurrency slot once drained, failed, closed or dropped.
+
+    Use it as a context manager when the loop may stop early; a stream that is
+    never consumed releases its slot when it is garbage collected.
+    """
+    
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.events = iter(stream)
+        # Runs at most once: on close() or when the stream is collected
+        self.finalizer = weakref.finalize(self, release)
+    
+    @property
+    def released(self) -> bool:
+        return not self.finalizer.alive
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        try:
+            return next(self.events)
+        except BaseException:
+            self.release()
+            raise
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def release(self):
+        self.finalizer()
+    
+    def close(self):
+        """Stop reading the underlying stream and give the slot back."""
+        try:
+            if hasattr(self.stream, 'close'):
+                self.stream.close()
+        finally:
+            self.release()
+
+def create_bedrock_client() -> LimitedBedrockClient:
+    """Shared bedrock-runtime client: large pool, adaptive retries, throttle metrics."""
+    client = boto3.client('bedrock-runtime', region_name=BEDROCK_REGION, config=Config(
+        retries={'total_max_attempts': BEDROCK_MAX_ATTEMPTS, 'mode': 'adaptive'},
+        max_pool_connections=max(BEDROCK_MAX_POOL_CONNECTIONS, BEDROCK_MAX_CONCURRENCY),
+        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+        read_timeout=BEDROCK_READ_TIMEOUT
+    ))
+    client.meta.events.register('needs-retry.bedrock-runtime', count_throttle)
+    return LimitedBedrockClient(client, BEDROCK_MAX_CONCURRENCY)
+
+bedrock = LazyResource("bedrock client", create_bedrock_client)
+
+# S3 uploads switch to concurrent multipart above this size
+S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 16 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+S3_MULTIPART_CONCURRENCY = int(os.environ.get('S3_MULTIPART_CONCURRENCY', 8))
+S3_MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', 5))
+
+def create_s3_client():
+    # Each multipart part is its own request, so retries are per part
+    return boto3.client('s3', region_name='us-east-1', config=Config(
+        retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+        max_pool_connections=max(10, S3_MULTIPART_CONCURRENCY * 2)
+    ))
+
+s3 = LazyResource("s3 client", create_s3_client)
+s3_transfer_config = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=S3_MULTIPART_CONCURRENCY
+)
+
+# ============================================================================
+# MODEL ROUTING
+# ============================================================================
+
+# Each tier is an ordered fallback chain; override with MODEL_TIER_<TIER>
+# as a comma-separated list of model IDs
+MODEL_TIERS = {
+    "fast": os.environ.get('MODEL_TIER_FAST', "anthropic.claude-3-haiku-20240307-v1:0,anthropic.claude-3-5-sonnet-20241022-v2:0"),
+    "large": os.environ.get('MODEL_TIER_LARGE', "anthropic.claude-3-5-sonnet-20241022-v2:0,anthropic.claude-3-5-sonnet-20240620-v1:0"),
+}
+
+# Task class -> tier; override with MODEL_ROUTE_<TASK>=<tier>
+MODEL_ROUTES = {
+    "pdf_metadata": "fast",
+    "chunk_notes": "fast",
+    "banking_answer": "large",
+    "report_section": "large",
+    "document_analysis": "large",
+    "document_chat": "large",
+}
+
+# Errors that mean "this model is busy", not "this request is wrong"
+FALLBACK_ERROR_CODES = {
+    'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException',
+    'ModelNotReadyException', 'ModelTimeoutException',
+}
+
+def route_models(task: str) -> List[str]:
+    """Ordered model IDs to try for a task class."""
+    tier = os.environ.get(f'MODEL_ROUTE_{task.upper()}', MODEL_ROUTES.get(task, "large"))
+    chain = MODEL_TIERS.get(tier, MODEL_TIERS["large"])
+    return [model_id.strip() for model_id in chain.split(',') if model_id.strip()]
+
+def call_with_fallback(task: str, call):
+    """Run call(model_id) on the task's models in order, moving on when a model is throttled."""
+    models = route_models(task)
+    for attempt, model_id in enumerate(models):
+        try:
+            return call(model_id)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code', '')
+            if code not in FALLBACK_ERROR_CODES or attempt == len(models) - 1:
+                raise
+            print(f"[model_router] {task}: {model_id} returned {code}, falling back to {models[attempt + 1]}")
+
+def converse_routed(task: str, **kwargs):
+    """bedrock.converse on the model chain routed for a task."""
+    response = call_with_fallback(task, lambda model_id: bedrock.converse(modelId=model_id, **kwargs))
+    record_usage(task, estimate_tokens(request_text(kwargs)), response.get('usage', {}), kwargs.get('inferenceConfig', {}).get('maxTokens', 0))
+    return response
+
+def converse_stream_routed(task: str, **kwargs):
+    """bedrock.converse_stream on the model chain routed for a task.
+
+    Fallback only covers errors raised when opening the stream."""
+    return call_with_fallback(task, lambda model_id: bedrock.converse_stream(modelId=model_id, **kwargs))
+
+# ============================================================================
+# CONTEXT BUDGETING
+# ============================================================================
+
+# Token counts are estimated locally from character counts; compare the
+# estimates with the actual usage logged per call and tune CHARS_PER_TOKEN
+# if they drift. 3.5 is slightly conservative for English filings.
+CHARS_PER_TOKEN = float(os.environ.get('CHARS_PER_TOKEN', 3.5))
+MODEL_CONTEXT_TOKENS = int(os.environ.get('MODEL_CONTEXT_TOKENS', 200000))
+# Headroom for estimation error and the user's question
+CONTEXT_RESERVE_TOKENS = 2000
+
+# Upper bound on retrieved document context per call, in tokens; override
+# with CONTEXT_BUDGET_<TASK>. Within the model window, more context helps
+# answers but costs latency, so these stay well below 200K. "report" is the
+# total across all sections of one report, which each get their share.
+CONTEXT_BUDGETS = {
+    "document_chat": 30000,
+    "document_analysis": 30000,
+    "report": 24000,
+    "report_section": 3000,
+}
+
+usage_lock = threading.Lock()
+token_usage = {}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for text."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def budget_chars(tokens: int) -> int:
+    """Characters that fit in a token budget."""
+    return int(tokens * CHARS_PER_TOKEN)
+
+def context_budget(task: str, fixed_text: str, max_output_tokens: int) -> int:
+    """Tokens available for retrieved context in one call.
+
+    The model window is shared between the fixed prompt, the context and the
+    expected output; the task's cap keeps calls from growing past the point
+    where more context stops paying for its latency.
+    """
+    cap = int(os.environ.get(f'CONTEXT_BUDGET_{task.upper()}', CONTEXT_BUDGETS.get(task, 8000)))
+    available = MODEL_CONTEXT_TOKENS - estimate_tokens(fixed_text) - max_output_tokens - CONTEXT_RESERVE_TOKENS
+    return max(0, min(cap, available))
+
+def topic_terms(text: str) -> set:
+    """Crude stems (first 5 letters of longer words) for matching context to a topic."""
+    return {word[:5] for word in re.findall(r'[a-z]{4,}', text.lower())}
+
+def relevant_context(text: str, topic: str, tokens: int) -> str:
+    """The lines of text most related to topic that fit in a token budget.
+    
+    Lines are ranked by how many topic terms they share, ties going to the
+    earlier line, and returned in document order under their "###" headings."""
+    terms = topic_terms(topic)
+    lines = []
+    heading = ""
+    for position, line in enumerate(text.split('\n')):
+        if line.startswith('### '):
+            heading = line
+        elif line.strip():
+            lines.append((len(terms & topic_terms(line)), position, heading, line))
+    
+    limit = budget_chars(tokens)
+    chosen = []
+    used = 0
+    for score, position, heading, line in sorted(lines, key=lambda item: (-item[0], item[1])):
+        if used + len(line) + 1 > limit:
+            continue
+        chosen.append((position, heading, line))
+        used += len(line) + 1
+    if not chosen:
+        return fit_context(text, tokens)
+    
+    output = []
+    current = None
+    for _, heading, line in sorted(chosen):
+        if heading and heading != current:
+            output.append(heading)
+            current = heading
+        output.append(line)
+    return fit_context('\n'.join(output), tokens)
+
+def fit_context(text: str, tokens: int) -> str:
+    """Trim text to a token budget, preferring to cut at a line break."""
+    limit = budget_chars(tokens)
+    if len(text) <= limit:
+        return text
+    cut = text.rfind('\n', 0, limit)
+    return text[:cut if cut > limit * 0.8 else limit]
+
+def request_text(kwargs: Dict) -> str:
+    """All text sent in a converse request (documents and images excluded)."""
+    blocks = list(kwargs.get('system', []))
+    for message in kwargs.get('messages', []):
+        blocks.extend(message.get('content', []))
+    return "".join(block.get('text', '') for block in blocks)
+
+def record_usage(task: str, estimated_input: int, usage: Dict, max_output_tokens: int = 0):
+    """Log estimated vs. actual token usage for a call and add it to the per-task totals."""
+    if not usage:
+        return
+    cached = usage.get('cacheReadInputTokens', 0) + usage.get('cacheWriteInputTokens', 0)
+    actual_input = usage.get('inputTokens', 0) + cached
+    with usage_lock:
+        totals = token_usage.setdefault(task, {"calls": 0, "estimated_input": 0, "input": 0, "output": 0})
+        totals["calls"] += 1
+        totals["estimated_input"] += estimated_input
+        totals["input"] += actual_input
+        totals["output"] += usage.get('outputTokens', 0)
+    print(f"[context_budget] {task}: input {actual_input} tokens (estimated {estimated_input}, {cached} via cache), "
+          f"output {usage.get('outputTokens', 0)}/{max_output_tokens or '?'}")
+
+# ============================================================================
+# REQUEST COALESCING
+# ============================================================================
+
+class SingleFlight:
+    """Coalesces concurrent identical upstream calls.
+    
+    The first caller for a key runs the call; callers arriving with the same
+    key while it is in flight wait for it and share its result (or error)
+    instead of calling upstream again. Followers may wait from worker threads
+    (run) or from any event loop (run_async). Nothing is kept once the call
+    finishes - caching is left to the callers."""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+    
+    def join(self, key):
+        """(future, is_leader) for key; the leader must call finish()."""
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            # A running future can't be cancelled, so a follower that is
+            # cancelled while waiting leaves the shared call alone
+            future.set_running_or_notify_cancel()
+            self.in_flight[key] = future
+            self.calls += 1
+            return future, True
+    
+    def finish(self, key, future: Future, result=None, error: Optional[BaseException] = None):
+        with self.lock:
+            self.in_flight.pop(key, None)
+        if isinstance(error, asyncio.CancelledError):
+            # The leader's request went away; followers were not cancelled
+            error = RuntimeError(f"{self.name}: shared upstream call was cancelled")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def run(self, key, call):
+        future, is_leader = self.join(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = call()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+    
+    async def run_async(self, key, call):
+        """Like run, for a call that returns a coroutine."""
+        future, is_leader = self.join(key)
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await call()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+# FDIC/SEC GETs keyed by URL and params; PDF text by document and limits;
+# derived artifacts by S3 object
+upstream_flight = SingleFlight("upstream_http")
+document_flight = SingleFlight("document_text")
+derived_flight = SingleFlight("derived_s3")
+
+# ============================================================================
+# S3 DOCUMENT ACCESS
+# ============================================================================
+
+S3_RANGE_BLOCK_SIZE = int(os.environ.get('S3_RANGE_BLOCK_SIZE', 256 * 1024))
+S3_RANGE_CACHE_BLOCKS = int(os.environ.get('S3_RANGE_CACHE_BLOCKS', 64))
+
+# Lifetime of presigned upload URLs (seconds)
+PRESIGNED_UPLOAD_EXPIRES = int(os.environ.get('PRESIGNED_UPLOAD_EXPIRES', 900))
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable, read-only file over an S3 object backed by ranged GETs.
+    
+    Data is fetched in fixed-size blocks kept in a small LRU cache, so a PDF
+    parser only transfers the trailer, xref and the objects it touches
+    instead of the whole filing."""
+    
+    def __init__(self, bucket: str, key: str, client=None,
+                 block_size: int = S3_RANGE_BLOCK_SIZE, cache_blocks: int = S3_RANGE_CACHE_BLOCKS):
+        self.client = client or s3
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.cache_blocks = max(1, cache_blocks)
+        self.size = self.client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.pos = 0
+        self.blocks = OrderedDict()
+        self.bytes_fetched = 0
+        self.requests = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self.pos
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self.pos = pos
+        return self.pos
+    
+    def fetch_blocks(self, first: int, last: int):
+        """Fetch blocks first..last (inclusive) in one ranged GET and cache them"""
+        start = first * self.block_size
+        end = min((last + 1) * self.block_size, self.size) - 1
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+        data = response['Body'].read()
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        for index in range(first, last + 1):
+            offset = (index - first) * self.block_size
+            self.blocks[index] = data[offset:offset + self.block_size]
+            self.blocks.move_to_end(index)
+        while len(self.blocks) > self.cache_blocks:
+            self.blocks.popitem(last=False)
+    
+    def readinto(self, buffer):
+        if self.pos >= self.size:
+            return 0
+        length = min(len(buffer), self.size - self.pos)
+        first = self.pos // self.block_size
+        last = (self.pos + length - 1) // self.block_size
+        
+        # Coalesce runs of missing blocks into single requests
+        index = first
+        while index <= last:
+            if index in self.blocks:
+                index += 1
+                continue
+            run_end = index
+            while run_end < last and run_end + 1 not in self.blocks:
+                run_end += 1
+            self.fetch_blocks(index, run_end)
+            index = run_end + 1
+        
+        view = memoryview(buffer)
+        written = 0
+        for index in range(first, last + 1):
+            block = self.blocks.get(index)
+            if block is None:
+                # Evicted while filling a read larger than the cache
+                self.fetch_blocks(index, index)
+                block = self.blocks[index]
+            self.blocks.move_to_end(index)
+            offset = self.pos + written - index * self.block_size
+            chunk = block[offset:offset + length - written]
+            view[written:written + len(chunk)] = chunk
+            written += len(chunk)
+        
+        self.pos += written
+        return written
+
+def open_s3_document(bucket: str, key: str) -> io.BufferedReader:
+    """Open an S3 object as a buffered, seekable file (e.g. for PdfReader)."""
+    return io.BufferedReader(S3RangeReader(bucket, key), buffer_size=S3_RANGE_BLOCK_SIZE)
+
+class UploadProgress:
+    """Transfer callback that logs upload progress in ~10% steps."""
+    
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = max(total, 1)
+        self.sent = 0
+        self.next_report = 10
+        self.lock = threading.Lock()
+    
+    def __call__(self, bytes_amount: int):
+        with self.lock:
+            self.sent += bytes_amount
+            percent = self.sent * 100 // self.total
+            if percent >= self.next_report:
+                print(f"[s3_upload] {self.label}: {self.sent}/{self.total} bytes ({percent}%)")
+                self.next_report = (percent // 10 + 1) * 10
+
+def upload_to_s3(body, bucket: str, key: str, size: int, metadata: Dict[str, str], content_type: str):
+    """Upload a file object to S3, using concurrent multipart upload above
+    S3_MULTIPART_THRESHOLD so large documents use parallel parts and a
+    transient failure only retries the affected part."""
+    body.seek(0)
+    extra_args = {'Metadata': metadata, 'ContentType': content_type}
+    callback = UploadProgress(key, size) if size >= S3_MULTIPART_THRESHOLD else None
+    s3.upload_fileobj(body, bucket, key, ExtraArgs=extra_args, Config=s3_transfer_config, Callback=callback)
+
+def spooled_size(spool) -> int:
+    """Size in bytes of a spooled document file (position is reset to 0)."""
+    spool.seek(0, io.SEEK_END)
+    size = spool.tell()
+    spool.seek(0)
+    return size
+
+def spooled_buffer(spool):
+    """Read-only bytes-like view of a spooled document for APIs that need a buffer.
+    
+    Returns an mmap once the spool has rolled over to disk, so large documents
+    are paged in by the OS instead of copied; small in-memory spools (at most
+    SPOOL_MAX_MEMORY) are returned as bytes. Close the result when done."""
+    size = spooled_size(spool)
+    if size <= SPOOL_MAX_MEMORY:
+        return spool.read()
+    return mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+
+def extract_document_text(bucket: str, s3_key: str, max_pages: int, max_chars: int, log_prefix: str) -> str:
+    """Extract page-tagged text from an uploaded PDF, stopping after max_pages
+    pages or once max_chars is exceeded.
+    
+    Results are kept for the rest of the session, and for content-addressed
+    uploads also cached (memory + S3) so repeat uploads and follow-up tools
+    skip the PDF parse."""
+    session_key = ("document_text", bucket, s3_key, max_pages, max_chars)
+    cached = session_get(session_key)
+    if cached is not None:
+        print(f"[{log_prefix}] Reusing session text ({len(cached)} chars) for {s3_key}")
+        return cached
+    
+    # Sessions asking about the same filing at once share one download and parse
+    text_content = document_flight.run(session_key, lambda: load_document_text(bucket, s3_key, max_pages, max_chars, log_prefix))
+    session_put(session_key, text_content)
+    return text_content
+
+def load_document_text(bucket: str, s3_key: str, max_pages: int, max_chars: int, log_prefix: str) -> str:
+    """Derived-cache lookup, else download and parse, for extract_document_text."""
+    digest = key_digest(s3_key)
+    cache_name = f"text-{max_pages}-{max_chars}.txt"
+    if digest:
+        cached = get_derived(bucket, digest, cache_name)
+        if cached is not None:
+            print(f"[{log_prefix}] Reusing cached text ({len(cached)} chars) for {digest[:12]}")
+            return cached
+    
+    from PyPDF2 import PdfReader
+    
+    pdf_file = open_s3_document(bucket, s3_key)
+    reader = PdfReader(pdf_file)
+    
+    text_content = ""
+    total_pages = len(reader.pages)
+    pages_read = 0
+    for i in range(min(max_pages, total_pages)):
+        page_text = reader.pages[i].extract_text()
+        text_content += f"\n--- Page {i+1} ---\n{page_text}\n"
+        pages_read = i + 1
+        if len(text_content) > max_chars:
+            break
+    
+    # Log extraction stats for debugging
+    print(f"[{log_prefix}] Extracted {len(text_content)} chars from {pages_read}/{total_pages} pages")
+    print(f"[{log_prefix}] Fetched {pdf_file.raw.bytes_fetched}/{pdf_file.raw.size} bytes in {pdf_file.raw.requests} range requests")
+    
+    if digest:
+        put_derived(bucket, digest, cache_name, text_content)
+    return text_content
+
+# ============================================================================
+# DOCUMENT INDEX (content-hash deduplication)
+# ============================================================================
+
+# Uploads are stored under uploads/<sha256>/<filename>; the index maps each
+# digest to its key and metadata, and derived/<sha256>/ holds extracted text
+# and analyses so identical documents are only processed once.
+DOCUMENT_INDEX_PREFIX = 'index/sha256/'
+DERIVED_PREFIX = 'derived/'
+DERIVED_CACHE_ITEMS = int(os.environ.get('DERIVED_CACHE_ITEMS', 32))
+CONTENT_KEY_RE = re.compile(r'^uploads/([0-9a-f]{64})/')
+# Staging keys handed out by get_pdf_upload_url and /api/upload-url; the only
+# keys register_uploaded_pdf may read, move and delete
+STAGED_UPLOAD_RE = re.compile(r'^uploads/[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}/[^/]+$')
+
+# Tools run concurrently on worker threads; both maps are guarded by one lock
+document_index = {}
+derived_cache = OrderedDict()
+document_index_lock = threading.Lock()
+
+def sha256_file(f) -> str:
+    """SHA-256 hex digest of a file's contents (position is reset to 0)."""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+def content_key(digest: str, filename: str) -> str:
+    """Content-addressed S3 key for an uploaded document."""
+    return f"uploads/{digest}/{os.path.basename(filename)}"
+
+def key_digest(s3_key: str) -> Optional[str]:
+    """Digest embedded in a content-addressed key, or None for legacy keys."""
+    match = CONTENT_KEY_RE.match(s3_key)
+    return match.group(1) if match else None
+
+def lookup_document(bucket: str, digest: str) -> Optional[Dict]:
+    """Index entry for a previously uploaded document, if it still exists."""
+    with document_index_lock:
+        entry = document_index.get(digest)
+    if entry is None:
+        try:
+            response = s3.get_object(Bucket=bucket, Key=f"{DOCUMENT_INDEX_PREFIX}{digest}.json")
+            entry = json.loads(response['Body'].read())
+        except Exception:
+            return None
+    
+    # Uploads expire via bucket lifecycle - don't point at a missing object
+    try:
+        s3.head_object(Bucket=bucket, Key=entry['s3_key'])
+    except Exception:
+        with document_index_lock:
+            document_index.pop(digest, None)
+        return None
+    
+    with document_index_lock:
+        document_index[digest] = entry
+    return entry
+
+def record_document(bucket: str, digest: str, entry: Dict):
+    """Add a document to the content-hash index."""
+    with document_index_lock:
+        document_index[digest] = entry
+    try:
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"{DOCUMENT_INDEX_PREFIX}{digest}.json",
+            Body=json.dumps(entry).encode('utf-8'),
+            ContentType='application/json'
+        )
+    except Exception as e:
+        print(f"[document_index] Could not persist index entry for {digest[:12]}: {e}")
+
+def get_derived(bucket: str, digest: str, name: str) -> Optional[str]:
+    """Cached derived artifact (extracted text, analysis) for a document."""
+    cache_key = (digest, name)
+    with document_index_lock:
+        if cache_key in derived_cache:
+            derived_cache.move_to_end(cache_key)
+            return derived_cache[cache_key]
+    object_key = f"{DERIVED_PREFIX}{digest}/{name}"
+    try:
+        value = derived_flight.run((bucket, object_key), lambda: s3.get_object(Bucket=bucket, Key=object_key)['Body'].read().decode('utf-8'))
+    except Exception:
+        return None
+    remember_derived(cache_key, value)
+    return value
+
+def put_derived(bucket: str, digest: str, name: str, value: str):
+    """Store a derived artifact in memory and S3."""
+    remember_derived((digest, name), value)
+    try:
+        s3.put_object(Bucket=bucket, Key=f"{DERIVED_PREFIX}{digest}/{name}", Body=value.encode('utf-8'))
+    except Exception as e:
+        print(f"[document_index] Could not persist {name} for {digest[:12]}: {e}")
+
+def remember_derived(cache_key, value: str):
+    with document_index_lock:
+        derived_cache[cache_key] = value
+        derived_cache.move_to_end(cache_key)
+        while len(derived_cache) > DERIVED_CACHE_ITEMS:
+            derived_cache.popitem(last=False)
+
+# ============================================================================
+# RESULT CACHES
+# ============================================================================
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry TTL and LRU eviction."""
+    
+    def __init__(self, max_items: int, ttl_seconds: float):
+        self.max_items = max(1, max_items)
+        self.ttl_seconds = ttl_seconds
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None or time.time() - item[0] > self.ttl_seconds:
+                self.items.pop(key, None)
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+    
+    def set(self, key, value, created_at: Optional[float] = None):
+        with self.lock:
+            self.items[key] = (created_at or time.time(), value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+    
+    def pop(self, key):
+        with self.lock:
+            item = self.items.pop(key, None)
+            return item[1] if item else None
+    
+    def values(self) -> List:
+        """Snapshot of unexpired values, most recently used last."""
+        with self.lock:
+            now = time.time()
+            return [value for created_at, value in self.items.values() if now - created_at <= self.ttl_seconds]
+
+# Bump REPORT_PROMPT_VERSION whenever REPORT_SECTIONS or REPORT_SECTION_PROMPT
+# change so cached reports built from the old prompt are no longer served
+REPORT_PROMPT_VERSION = "v2"
+REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 6 * 3600))
+REPORT_CACHE_ITEMS = int(os.environ.get('REPORT_CACHE_ITEMS', 100))
+# Optional shared S3 tier (unset = memory only)
+REPORT_CACHE_BUCKET = os.environ.get('REPORT_CACHE_BUCKET', '')
+REPORT_CACHE_PREFIX = 'report-cache/'
+
+report_cache = TTLCache(REPORT_CACHE_ITEMS, REPORT_CACHE_TTL)
+
+def report_cache_key(bank_name: str) -> str:
+    """Cache key for a bank report: prompt version, primary model and normalized bank name."""
+    return f"{REPORT_PROMPT_VERSION}|{route_models('report_section')[0]}|{' '.join(bank_name.lower().split())}"
+
+def get_cached_report(bank_name: str) -> Optional[str]:
+    """Cached report for a bank from memory, then the optional S3 tier."""
+    key = report_cache_key(bank_name)
+    report = report_cache.get(key)
+    if report is not None or not REPORT_CACHE_BUCKET:
+        return report
+    
+    object_key = f"{REPORT_CACHE_PREFIX}{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+    try:
+        response = s3.get_object(Bucket=REPORT_CACHE_BUCKET, Key=object_key)
+        entry = json.loads(response['Body'].read())
+    except Exception:
+        return None
+    if entry.get('key') != key or time.time() - entry.get('created_at', 0) > REPORT_CACHE_TTL:
+        return None
+    report_cache.set(key, entry['report'], created_at=entry['created_at'])
+    return entry['report']
+
+def put_cached_report(bank_name: str, report: str):
+    """Store a report in memory and the optional S3 tier."""
+    key = report_cache_key(bank_name)
+    created_at = time.time()
+    report_cache.set(key, report, created_at=created_at)
+    if not REPORT_CACHE_BUCKET:
+        return
+    
+    object_key = f"{REPORT_CACHE_PREFIX}{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+    try:
+        s3.put_object(
+            Bucket=REPORT_CACHE_BUCKET,
+            Key=object_key,
+            Body=json.dumps({"key": key, "created_at": created_at, "report": report}).encode('utf-8'),
+            ContentType='application/json'
+        )
+    except Exception as e:
+        print(f"[report_cache] Could not persist report for {bank_name}: {e}")
+
+# answer_banking_question answers depend only on the question and context,
+# and generic questions ("what is NIM?") repeat across analysts
+ANSWER_PROMPT_VERSION = "v1"
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 24 * 3600))
+ANSWER_CACHE_ITEMS = int(os.environ.get('ANSWER_CACHE_ITEMS', 500))
+# Answers are reused when the questions have the same words apart from
+# stopwords, punctuation and word order. Near-duplicate matching (Jaccard
+# similarity of hashed character shingles) also serves textually close
+# questions such as "increase" vs "decrease", so it is off unless opted into
+ANSWER_NEAR_DUPLICATES = os.environ.get('ANSWER_NEAR_DUPLICATES', 'false').lower() == 'true'
+ANSWER_SIMILARITY_THRESHOLD = float(os.environ.get('ANSWER_SIMILARITY_THRESHOLD', 0.85))
+SHINGLE_SIZE = 3
+
+QUESTION_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "to", "in", "on", "for", "and", "or",
+    "what", "whats", "explain", "define", "describe", "tell", "me", "us", "about", "please", "can",
+    "could", "would", "you", "i", "do", "does", "meaning", "mean", "means", "definition", "give",
+}
+
+answer_cache = TTLCache(ANSWER_CACHE_ITEMS, ANSWER_CACHE_TTL)
+
+def question_words(text: str) -> List[str]:
+    """Lowercased words of text in order, without punctuation or stopwords."""
+    words = re.sub(r"[^\w\s]", " ", text.lower().replace("'", "")).split()
+    return [word for word in words if word not in QUESTION_STOPWORDS]
+
+def normalize_question(text: str) -> str:
+    """The question's distinct non-stopword words, sorted."""
+    return " ".join(sorted(set(question_words(text))))
+
+def question_shingles(normalized: str) -> set:
+    """Hashed character shingles of a normalized question."""
+    padded = f" {normalized} "
+    return {zlib.crc32(padded[i:i + SHINGLE_SIZE].encode('utf-8')) for i in range(max(1, len(padded) - SHINGLE_SIZE + 1))}
+
+def answer_cache_key(question: str, context: str) -> str:
+    context_words = " ".join(question_words(context))
+    return f"{ANSWER_PROMPT_VERSION}|{route_models('banking_answer')[0]}|{context_words}|{normalize_question(question)}"
+
+def get_cached_answer(question: str, context: str) -> Optional[str]:
+    """Cached answer for the same normalized question, or a near-duplicate if enabled."""
+    key = answer_cache_key(question, context)
+    entry = answer_cache.get(key)
+    if entry is not None:
+        return entry["answer"]
+    if not ANSWER_NEAR_DUPLICATES:
+        return None
+    
+    context_key, normalized = key.rsplit("|", 1)
+    shingles = question_shingles(normalized)
+    # Questions that differ only in a number ("tier 1" vs "tier 2") are
+    # textually close but not the same question
+    numbers = set(re.findall(r"\w*\d\w*", normalized))
+    best, best_score = None, ANSWER_SIMILARITY_THRESHOLD
+    for candidate in answer_cache.values():
+        if candidate["context_key"] != context_key or candidate["numbers"] != numbers:
+            continue
+        score = len(shingles & candidate["shingles"]) / len(shingles | candidate["shingles"])
+        if score >= best_score:
+            best, best_score = candidate, score
+    if best is not None:
+        print(f"[answer_cache] Near-duplicate hit ({best_score:.2f}): '{normalized}' ~ '{best['question']}'")
+        return best["answer"]
+    return None
+
+def put_cached_answer(question: str, context: str, answer: str):
+    key = answer_cache_key(question, context)
+    context_key, normalized = key.rsplit("|", 1)
+    answer_cache.set(key, {
+        "answer": answer,
+        "question": normalized,
+        "context_key": context_key,
+        "shingles": question_shingles(normalized),
+        "numbers": set(re.findall(r"\w*\d\w*", normalized)),
+    })
+
+# Document chat keeps the filing excerpt in a Bedrock prompt cache prefix.
+# Bedrock expires a cached prefix after ~5 minutes without a hit, so entries
+# here mirror that sliding window to tell warm follow-ups from cold starts.
+PROMPT_CACHE_TTL = int(os.environ.get('PROMPT_CACHE_TTL', 300))
+PROMPT_CACHE_DOCUMENTS = int(os.environ.get('PROMPT_CACHE_DOCUMENTS', 100))
+# Bedrock ignores cache points on prefixes below ~1,024 tokens
+PROMPT_CACHE_MIN_CHARS = 4000
+
+document_prompt_cache = TTLCache(PROMPT_CACHE_DOCUMENTS, PROMPT_CACHE_TTL)
+prompt_cache_unsupported = set()
+
+def converse_with_cached_prefix(task: str, prefix: List[Dict], messages: List[Dict], inference_config: Dict, document_key: str, log_prefix: str):
+    """Call converse with `prefix` as the system prompt, followed by a cache point.
+
+    Falls back to an uncached call (and stops trying) if the model rejects
+    cache points. Tracks per-document cache state in document_prompt_cache.
+    """
+    def call(model_id: str):
+        cacheable = model_id not in prompt_cache_unsupported and sum(len(block.get('text', '')) for block in prefix) >= PROMPT_CACHE_MIN_CHARS
+        system = prefix + [{"cachePoint": {"type": "default"}}] if cacheable else prefix
+        try:
+            response = bedrock.converse(modelId=model_id, system=system, messages=messages, inferenceConfig=inference_config)
+        except ClientError as e:
+            if not cacheable or e.response.get('Error', {}).get('Code') != 'ValidationException' or 'cach' not in str(e).lower():
+                raise
+            print(f"[{log_prefix}] {model_id} does not accept cache points, continuing uncached: {e}")
+            prompt_cache_unsupported.add(model_id)
+            cacheable = False
+            response = bedrock.converse(modelId=model_id, system=prefix, messages=messages, inferenceConfig=inference_config)
+        
+        if cacheable:
+            # Cached prefixes are per model, so track them per model too
+            cache_key = f"{model_id}|{document_key}"
+            usage = response.get('usage', {})
+            state = document_prompt_cache.get(cache_key) or {"created_at": time.time(), "turns": 0, "cache_reads": 0, "cache_writes": 0}
+            state["turns"] += 1
+            state["cache_reads"] += usage.get('cacheReadInputTokens', 0)
+            state["cache_writes"] += usage.get('cacheWriteInputTokens', 0)
+            # Re-set on every turn: each hit extends Bedrock's cache lifetime
+            document_prompt_cache.set(cache_key, state)
+            print(f"[{log_prefix}] Prompt cache turn {state['turns']}: read {usage.get('cacheReadInputTokens', 0)}, "
+                  f"wrote {usage.get('cacheWriteInputTokens', 0)}, uncached input {usage.get('inputTokens', 0)} tokens")
+        return response
+    
+    response = call_with_fallback(task, call)
+    record_usage(task, estimate_tokens(request_text({"system": prefix, "messages": messages})), response.get('usage', {}), inference_config.get('maxTokens', 0))
+    return response
+
+# ============================================================================
+# SESSION STATE
+# ============================================================================
+
+# Follow-up questions in one AgentCore session usually concern the same bank
+# and document, so resolved identifiers, fetched datasets and extracted text
+# are kept per session. Sessions idle for SESSION_IDLE_TTL are dropped, and
+# least recently used entries are evicted once SESSION_CACHE_MAX_BYTES is hit.
+SESSION_IDLE_TTL = int(os.environ.get('SESSION_IDLE_TTL', 1800))
+SESSION_CACHE_MAX_BYTES = int(os.environ.get('SESSION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Set by invoke from the session ID AgentCore passes in; tools run via
+# asyncio.to_thread, which carries it into their worker thread
+current_session = contextvars.ContextVar('current_session', default=None)
+
+class SessionStore:
+    """Thread-safe per-session string cache with idle eviction and a byte cap."""
+    
+    def __init__(self, idle_seconds: float, max_bytes: int):
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        # session_id -> {"last_used": t, "items": OrderedDict(key -> value)}, least recently used first
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, session_id: str, key):
+        with self.lock:
+            self.evict_idle()
+            session = self.sessions.get(session_id)
+            value = session["items"].get(key) if session else None
+            if value is None:
+                self.misses += 1
+                return None
+            self.touch(session_id)
+            session["items"].move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, session_id: str, key, value: str):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.evict_idle()
+            session = self.sessions.setdefault(session_id, {"last_used": 0, "items": OrderedDict()})
+            previous = session["items"].pop(key, None)
+            if previous is not None:
+                self.total_bytes -= sys.getsizeof(previous)
+            session["items"][key] = value
+            self.total_bytes += size
+            self.touch(session_id)
+            self.evict_to_cap()
+    
+    def touch(self, session_id: str):
+        self.sessions[session_id]["last_used"] = time.time()
+        self.sessions.move_to_end(session_id)
+    
+    def evict_idle(self):
+        # Sessions are ordered by last use, so idle ones are at the front
+        now = time.time()
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if now - session["last_used"] <= self.idle_seconds:
+                break
+            self.sessions.popitem(last=False)
+            self.total_bytes -= sum(sys.getsizeof(value) for value in session["items"].values())
+            print(f"[session_cache] Evicted idle session {session_id}")
+    
+    def evict_to_cap(self):
+        # Oldest entries of the least recently used session go first
+        while self.total_bytes > self.max_bytes and self.sessions:
+            session = next(iter(self.sessions.values()))
+            _, value = session["items"].popitem(last=False)
+            self.total_bytes -= sys.getsizeof(value)
+            if not session["items"]:
+                self.sessions.popitem(last=False)
+
+session_store = SessionStore(SESSION_IDLE_TTL, SESSION_CACHE_MAX_BYTES)
+
+def session_get(key):
+    """Value cached under key for the current session, or None outside a session."""
+    session_id = current_session.get()
+    return session_store.get(session_id, key) if session_id else None
+
+def session_put(key, value: str):
+    """Cache a string for the rest of the current session (no-op outside a session)."""
+    session_id = current_session.get()
+    if session_id and value is not None:
+        session_store.set(session_id, key, value)
+
+# ============================================================================
+# RESPONSE STREAMING
+# ============================================================================
+
+# Set by invoke for streaming requests; tools run in worker threads that
+# inherit this context, so they can push text out while still generating
+stream_sink = contextvars.ContextVar('stream_sink', default=None)
+
+def emit_delta(text: str, source: str):
+    """Forward a chunk of tool output to the streaming caller, if any."""
+    sink = stream_sink.get()
+    if sink is not None and text:
+        sink(text, source)
+
+# Structured tool results (chart data) travel beside the model's text rather
+# than through it: invoke returns them as "artifacts" next to the output, and
+# streaming requests receive them as {"artifact": ...} events
+artifact_sink = contextvars.ContextVar('artifact_sink', default=None)
+
+def attach_artifact(kind: str, data: Dict) -> Optional[str]:
+    """Attach structured data to the current invocation's response.
+    
+    Returns the artifact id, or None when nothing is collecting artifacts
+    (the caller should then return the data inline)."""
+    sink = artifact_sink.get()
+    if sink is None:
+        return None
+    artifact_id = f"{kind}-{os.urandom(4).hex()}"
+    sink({"id": artifact_id, "type": kind, "data": data})
+    return artifact_id
+
+def collect_converse_stream(response, source: str, task: str = "", estimated_input: int = 0) -> str:
+    """Accumulate a converse_stream response, emitting each text delta as it arrives."""
+    full_text = ""
+    with response['stream'] as stream:
+        for event in stream:
+            if 'contentBlockDelta' in event:
+                delta = event['contentBlockDelta']['delta']
+                if 'text' in delta:
+                    full_text += delta['text']
+                    emit_delta(delta['text'], source)
+            elif 'metadata' in event and task:
+                record_usage(task, estimated_input, event['metadata'].get('usage', {}))
+    return full_text
+
+async def stream_agent(user_message: str, session_id: Optional[str] = None):
+    """Run the agent and yield model and tool text deltas as SSE events."""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def sink(text: str, source: str):
+        loop.call_soon_threadsafe(events.put_nowait, {"chunk": text, "source": source})
+
+    def artifact(item: Dict):
+        loop.call_soon_threadsafe(events.put_nowait, {"artifact": item})
+
+    async def run():
+        try:
+            async with fresh_agent() as prompt_agent:
+                async for event in prompt_agent.stream_async(user_message):
+                    if "data" in event:
+                        events.put_nowait({"chunk": event["data"], "source": "agent"})
+                    elif "result" in event:
+                        events.put_nowait({"done": True, "output": str(event["result"])})
+        except Exception as e:
+            events.put_nowait({"error": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    token = stream_sink.set(sink)
+    artifact_token = artifact_sink.set(artifact)
+    session_token = current_session.set(session_id)
+    try:
+        task = asyncio.create_task(run())
+    finally:
+        current_session.reset(session_token)
+        artifact_sink.reset(artifact_token)
+        stream_sink.reset(token)
+
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        if not task.done():
+            task.cancel()
+
+# ============================================================================
+# REPORT ENGINE
+# ============================================================================
+
+# Sections are independent, so each gets its own completion and they run
+# concurrently; the report is assembled in this order
+REPORT_SECTIONS = [
+    ("Executive Summary", "Market position, recent performance highlights, strategic direction, and overall assessment"),
+    ("Financial Performance", "Revenue trends, profitability metrics (ROA, ROE, NIM), net income, balance sheet strength, and year-over-year comparisons"),
+    ("Business Segments & Revenue Mix", "Core business lines, revenue diversification, segment performance, competitive advantages, and market share"),
+    ("Risk Profile & Management", "Credit risk exposure, market risks, operational risks, regulatory challenges, and risk mitigation strategies"),
+    ("Capital Position & Liquidity", "Capital ratios (CET1, Tier 1), stress test results, liquidity coverage, regulatory compliance, and capital deployment strategy"),
+    ("Strategic Initiatives & Innovation", "Digital transformation efforts, technology investments, operational efficiency programs, M&A activity, and growth initiatives"),
+    ("Market Position & Competitive Landscape", "Industry trends, competitive positioning, market opportunities, threats, and differentiation factors"),
+    ("Investment Outlook & Recommendations", "Valuation assessment, investment thesis, key catalysts, risks to watch, and forward-looking perspective"),
+]
+
+REPORT_SECTION_PROMPT = """You are a senior banking analyst writing a comprehensive financial report on {bank_name} for institutional investors and C-suite executives.
+
+{context}Write ONLY the "{title}" section of the report: 4-6 complete sentences covering: {guidance}.
+
+CRITICAL REQUIREMENTS:
+- Do not include a header, a title, or any other section
+- Use specific financial metrics and data points where possible
+- Maintain professional, business-focused tone
+- Include quantitative analysis alongside qualitative insights"""
+
+REPORT_SECTION_CONCURRENCY = int(os.environ.get('REPORT_SECTION_CONCURRENCY', 8))
+REPORT_SECTION_MAX_TOKENS = int(os.environ.get('REPORT_SECTION_MAX_TOKENS', 800))
+
+class OrderedSectionEmitter:
+    """Streams concurrently generated sections in report order.
+
+    Deltas of the earliest unfinished section go out live; later sections are
+    buffered and flushed as soon as every section before them has finished.
+    """
+    
+    def __init__(self, titles: List[str], source: str):
+        self.titles = titles
+        self.source = source
+        self.buffers = [""] * len(titles)
+        self.finished = [False] * len(titles)
+        self.head = 0
+        self.lock = threading.Lock()
+    
+    def start(self, title_line: str):
+        with self.lock:
+            emit_delta(title_line, self.source)
+            emit_delta(f"## {self.titles[0]}\n", self.source)
+    
+    def delta(self, index: int, text: str):
+        with self.lock:
+            self.buffers[index] += text
+            if index == self.head:
+                emit_delta(text, self.source)
+    
+    def finish(self, index: int):
+        with self.lock:
+            self.finished[index] = True
+            while self.head < len(self.titles) and self.finished[self.head]:
+                self.head += 1
+                if self.head < len(self.titles):
+                    emit_delta(f"\n\n## {self.titles[self.head]}\n", self.source)
+                    emit_delta(self.buffers[self.head], self.source)
+
+def generate_report_section(emitter: OrderedSectionEmitter, index: int, prompt: str) -> bool:
+    """Generate one report section, streaming it through the emitter. Returns False on failure."""
+    try:
+        response = converse_stream_routed(
+            "report_section",
+            messages=[{"role": "user", "content": [{"text": prompt}]}],
+            inferenceConfig={"maxTokens": REPORT_SECTION_MAX_TOKENS, "temperature": 0.3}
+        )
+        with response['stream'] as stream:
+            for event in stream:
+                if 'contentBlockDelta' in event:
+                    delta = event['contentBlockDelta']['delta']
+                    if 'text' in delta:
+                        emitter.delta(index, delta['text'])
+                elif 'metadata' in event:
+                    record_usage("report_section", estimate_tokens(prompt), event['metadata'].get('usage', {}), REPORT_SECTION_MAX_TOKENS)
+        return True
+    except Exception as e:
+        print(f"[{emitter.source}] Section '{emitter.titles[index]}' failed: {e}")
+        emitter.delta(index, f"\n\n_This section could not be generated: {e}_")
+        return False
+    finally:
+        emitter.finish(index)
+
+def report_section_budget() -> int:
+    """Context tokens for each section: its share of the report budget, within the section cap."""
+    report_tokens = context_budget("report", "", 0) // len(REPORT_SECTIONS)
+    return min(report_tokens, context_budget("report_section", REPORT_SECTION_PROMPT, REPORT_SECTION_MAX_TOKENS))
+
+def generate_report(bank_name: str, context: str, source: str, section_contexts: Optional[List[str]] = None):
+    """Generate the 8-section report with sections in parallel.
+
+    context is shared by every section; section_contexts, if given, holds
+    one context per REPORT_SECTIONS entry instead. Returns (report_markdown,
+    complete) where complete is False if any section failed and was
+    replaced by a placeholder.
+    """
+    titles = [title for title, _ in REPORT_SECTIONS]
+    title_line = f"# Financial Analysis Report: {bank_name}\n\n"
+    emitter = OrderedSectionEmitter(titles, source)
+    emitter.start(title_line)
+    
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, REPORT_SECTION_CONCURRENCY)) as executor:
+        futures = []
+        for index, (title, guidance) in enumerate(REPORT_SECTIONS):
+            section_context = section_contexts[index] if section_contexts else context
+            prompt = REPORT_SECTION_PROMPT.format(bank_name=bank_name, context=section_context, title=title, guidance=guidance)
+            # Worker threads don't inherit contextvars, so carry the stream sink over
+            futures.append(executor.submit(contextvars.copy_context().run, generate_report_section, emitter, index, prompt))
+        complete = all(future.result() for future in futures)
+    print(f"[{source}] Generated {len(titles)} sections in {time.time() - start_time:.1f}s")
+    
+    report = title_line + "\n\n".join(f"## {title}\n{text.strip()}" for title, text in zip(titles, emitter.buffers))
+    return report, complete
+
+# ============================================================================
+# DOCUMENT MAP-REDUCE
+# ============================================================================
+
+# Long filings are split into page-aligned chunks, each chunk is condensed
+# into analyst notes in parallel, and the notes (not a head excerpt) feed
+# the report. Notes are bank- and analysis-agnostic so every analysis type
+# on the same document reuses them.
+MAP_REDUCE_ANALYSIS = os.environ.get('MAP_REDUCE_ANALYSIS', 'true').lower() == 'true'
+MAP_CHUNK_CHARS = int(os.environ.get('MAP_CHUNK_CHARS', 40000))
+MAP_CONCURRENCY = int(os.environ.get('MAP_CONCURRENCY', 6))
+MAP_SUMMARY_MAX_TOKENS = int(os.environ.get('MAP_SUMMARY_MAX_TOKENS', 1000))
+# Bump when CHUNK_SUMMARY_PROMPT changes so cached notes are regenerated
+CHUNK_SUMMARY_VERSION = "v1"
+
+CHUNK_SUMMARY_PROMPT = """You are a senior banking analyst reading part {part} of {parts} of an SEC filing ({pages}).
+
+Write dense analyst notes on this part for a later report. Capture every material fact:
+- Financial metrics with exact figures and periods (revenue, net income, NIM, ROA, ROE, efficiency ratio, EPS)
+- Balance sheet, credit quality, capital ratios and liquidity
+- Business segments, strategy, acquisitions and initiatives
+- Risk factors, regulatory matters and outlook statements
+
+Use terse bullet points. Omit boilerplate, legal text and anything immaterial. If this part has nothing material, reply "No material content."
+
+Filing text:
+{text}"""
+
+PAGE_MARKER_RE = re.compile(r'\n--- Page (\d+) ---\n')
+
+def chunk_document(text_content: str, chunk_chars: int) -> List[str]:
+    """Split page-tagged text into chunks of about chunk_chars, breaking only between pages."""
+    starts = [match.start() for match in PAGE_MARKER_RE.finditer(text_content)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text_content))
+    
+    chunks = []
+    chunk_start = 0
+    for page_start, page_end in zip(starts, starts[1:]):
+        if page_start > chunk_start and page_end - chunk_start > chunk_chars:
+            chunks.append(text_content[chunk_start:page_start])
+            chunk_start = page_start
+        # A single oversized page is split on character boundaries
+        while page_end - chunk_start > chunk_chars * 2:
+            chunks.append(text_content[chunk_start:chunk_start + chunk_chars])
+            chunk_start += chunk_chars
+    if chunk_start < len(text_content):
+        chunks.append(text_content[chunk_start:])
+    return chunks
+
+def chunk_pages(chunk: str) -> str:
+    """Human-readable page range of a chunk, e.g. "pages 12-24"."""
+    pages = PAGE_MARKER_RE.findall(chunk)
+    if not pages:
+        return "continued page"
+    return f"page {pages[0]}" if pages[0] == pages[-1] else f"pages {pages[0]}-{pages[-1]}"
+
+def summarize_chunk(chunk: str, part: int, parts: int, bucket: str, digest: Optional[str], log_prefix: str):
+    """Analyst notes for one chunk, from the derived cache when possible. Returns (notes, ok).
+    
+    Content-addressed uploads share notes across sessions; other keys (e.g.
+    /api/upload-pdf's uploads/<uuid>/) reuse them for the rest of the session."""
+    name = f"notes-{CHUNK_SUMMARY_VERSION}-{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:16]}.md"
+    cached = session_get(("chunk_notes", name))
+    if cached is not None:
+        return cached, True
+    if digest:
+        cached = get_derived(bucket, digest, name)
+        if cached is not None:
+            session_put(("chunk_notes", name), cached)
+            return cached, True
+    
+    prompt = CHUNK_SUMMARY_PROMPT.format(part=part, parts=parts, pages=chunk_pages(chunk), text=chunk)
+    try:
+        response = converse_routed(
+            "chunk_notes",
+            messages=[{"role": "user", "content": [{"text": prompt}]}],
+            inferenceConfig={"maxTokens": MAP_SUMMARY_MAX_TOKENS, "temperature": 0}
+        )
+        notes = response['output']['message']['content'][0]['text'].strip()
+    except Exception as e:
+        # Keep the report going on the raw head of the chunk; don't cache it
+        print(f"[{log_prefix}] Summarizing part {part}/{parts} failed: {e}")
+        return chunk[:MAP_CHUNK_CHARS // 10], False
+    
+    session_put(("chunk_notes", name), notes)
+    if digest:
+        put_derived(bucket, digest, name, notes)
+    return notes, True
+
+def document_notes(bucket: str, s3_key: str, text_content: str, log_prefix: str):
+    """Condense a whole document into ordered, page-labelled notes.
+
+    Documents that fit in one chunk are returned as-is. Returns
+    (notes, complete) where complete is False if any chunk fell back to raw text.
+    """
+    chunks = chunk_document(text_content, MAP_CHUNK_CHARS)
+    if len(chunks) <= 1:
+        return text_content, True
+    
+    digest = key_digest(s3_key)
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, MAP_CONCURRENCY)) as executor:
+        # Worker threads don't inherit contextvars, so carry the session over
+        futures = [
+            executor.submit(contextvars.copy_context().run, summarize_chunk, chunk, index + 1, len(chunks), bucket, digest, log_prefix)
+            for index, chunk in enumerate(chunks)
+        ]
+        results = [future.result() for future in futures]
+    print(f"[{log_prefix}] Summarized {len(chunks)} chunks ({len(text_content)} chars) in {time.time() - start_time:.1f}s")
+    
+    notes = "\n\n".join(
+        f"### Part {index + 1} ({chunk_pages(chunk)})\n{summary}"
+        for index, (chunk, (summary, _)) in enumerate(zip(chunks, results))
+    )
+    return notes, all(ok for _, ok in results)
 
 # ============================================================================
 # BANKING DATA TOOLS
 # ============================================================================
 
+# FDIC and SEC tools are async: the agent's concurrent tool executor overlaps
+# their HTTP calls on the event loop instead of parking a worker thread on
+# each. S3 and Bedrock tools stay synchronous and run in worker threads.
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', 50))
+
+def create_http_client():
+    import httpx
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+    )
+
+# One pooled client per event loop, so FDIC and SEC calls reuse keep-alive
+# connections across tools and requests. Pooled connections belong to the
+# loop that opened them: the server runs a single loop, but synchronous
+# agent calls and scripts run their own.
+http_clients = weakref.WeakKeyDictionary()
+
+def http_client():
+    """Shared async HTTP client for the FDIC and SEC APIs (don't close it)."""
+    loop = asyncio.get_running_loop()
+    client = http_clients.get(loop)
+    if client is None:
+        client = http_clients.setdefault(loop, LazyResource("http client", create_http_client))
+    return client.get()
+
+async def shared_get(client, url: str, **kwargs):
+    """client.get, sharing one upstream request with identical in-flight GETs
+    from other sessions (e.g. everyone asking about a bank after earnings).
+    The response body is already read, so followers can use it freely."""
+    key = (url, json.dumps(kwargs.get('params'), sort_keys=True))
+    return await upstream_flight.run_async(key, lambda: client.get(url, **kwargs))
+
 @tool
-def get_fdic_data() -> str:
+async def get_fdic_data() -> str:
     """Get current FDIC banking data for major US banks.
     
     Returns: Real-time financial metrics (ROA, ROE, NIM, assets, deposits) for top 50 banks
@@ -33,7 +1505,8 @@ def get_fdic_data() -> str:
             "format": "json"
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        client = http_client()
+        response = await shared_get(client, url, params=params)
         if response.status_code == 200:
             data = response.json()
             return json.dumps({"success": True, "data": data.get("data", [])[:20]})
@@ -43,7 +1516,7 @@ def get_fdic_data() -> str:
         return json.dumps({"success": False, "error": str(e)})
 
 @tool
-def search_fdic_bank(bank_name: str) -> str:
+async def search_fdic_bank(bank_name: str) -> str:
     """Search FDIC database for bank CERT number by name.
     
     Args:
@@ -52,6 +1525,11 @@ def search_fdic_bank(bank_name: str) -> str:
     Returns: CERT number and official name of the largest matching bank
     Use when: Need CERT number for banks not in hardcoded list
     Examples: "Find CERT for Regional Bank", "What's the CERT for XYZ Bank"""
+    session_key = ("fdic_cert", ' '.join(bank_name.upper().split()))
+    cached = session_get(session_key)
+    if cached is not None:
+        return cached
+    
     try:
         # Clean bank name - remove common suffixes
         clean_name = bank_name.upper()
@@ -64,7 +1542,8 @@ def search_fdic_bank(bank_name: str) -> str:
         
         for term in search_terms:
             url = f"https://api.fdic.gov/banks/institutions?search=NAME:{term}&fields=CERT,NAME,ASSET,ACTIVE&limit=50&format=json"
-            response = requests.get(url, timeout=10)
+            client = http_client()
+            response = await shared_get(client, url)
             if response.status_code == 200:
                 data = response.json().get("data", [])
                 if data:
@@ -74,19 +1553,48 @@ def search_fdic_bank(bank_name: str) -> str:
                         # Sort by asset size, return largest
                         sorted_banks = sorted(active_banks, key=lambda x: float(x['data'].get('ASSET', 0) or 0), reverse=True)
                         top_bank = sorted_banks[0]['data']
-                        return json.dumps({
+                        result = json.dumps({
                             "success": True,
                             "cert": str(top_bank['CERT']),
                             "name": top_bank['NAME'],
                             "asset": top_bank.get('ASSET', 0)
                         })
+                        session_put(session_key, result)
+                        return result
         
         return json.dumps({"success": False, "error": f"Bank not found: {bank_name}"})
     except Exception as e:
         return json.dumps({"success": False, "error": str(e)})
 
+def peer_analysis_result(result: Dict) -> str:
+    """Tool output for a peer comparison.
+    
+    The full chart data goes to the caller as a "peer_comparison" artifact and
+    the model only gets a compact summary (latest value per bank), so it never
+    has to repeat the data points. Without an artifact channel the full result
+    is returned inline as before."""
+    artifact_id = attach_artifact("peer_comparison", result)
+    if artifact_id is None:
+        return json.dumps(result)
+    
+    latest = {}
+    for point in result["data"]:
+        latest[point["Bank"]] = point["Value"]
+    quarters = [point["Quarter"] for point in result["data"]]
+    return json.dumps({
+        "artifact_id": artifact_id,
+        "chart_data": "delivered to the user separately - do not repeat it",
+        "base_bank": result["base_bank"],
+        "peer_banks": result["peer_banks"],
+        "data_points": len(result["data"]),
+        "period": f"{min(quarters)} to {max(quarters)}" if quarters else "",
+        "latest_values": latest,
+        "analysis": result["analysis"],
+        "source": result["source"]
+    })
+
 @tool
-def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
+async def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
     """Compare banking performance metrics across multiple banks.
     
     Args:
@@ -94,7 +1602,8 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
         peer_banks: List of peer banks to compare against (e.g., ["Bank of America", "Wells Fargo"])
         metric: The metric to compare (ROA, ROE, NIM, etc.)
     
-    Returns detailed comparison with quarterly trends and AI analysis.
+    Returns a summary with the latest value per bank and a short analysis; the
+    quarterly chart data is delivered to the user directly.
     Use this when user wants peer comparison or competitive analysis."""
     
     # Bank CERT numbers cache (fallback if search fails)
@@ -114,7 +1623,7 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
     }
     
     # Helper function to get CERT (try cache first, then search)
-    def get_cert(bank_name):
+    async def get_cert(bank_name):
         # Try exact match in cache
         if bank_name in bank_certs_cache:
             return bank_certs_cache[bank_name]
@@ -127,7 +1636,7 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
         
         # Try dynamic FDIC search
         try:
-            search_result = search_fdic_bank(bank_name)
+            search_result = await search_fdic_bank(bank_name)
             result = json.loads(search_result)
             if result.get('success'):
                 cert = result['cert']
@@ -159,22 +1668,26 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
             metric_key = field
             break
     
-    chart_data = []
-    all_banks = [base_bank] + peer_banks
-    bank_latest = {}
-    
-    for bank in all_banks:
-        cert = get_cert(bank)
+    # Fetch and compute each bank's quarters concurrently; returns the chart
+    # points and the most recent value
+    async def bank_points(bank, client):
+        points, latest = [], None
+        cert = await get_cert(bank)
         if not cert:
-            continue
+            return points, latest
             
         try:
-            url = f"https://api.fdic.gov/banks/financials?filters=CERT:{cert}&fields=ASSET,ROA,ROE,NIMY,EQTOT,DEP,LNLSNET,EINTEXP,NONII,NCRER&limit=200&format=json"
-            response = requests.get(url, timeout=10)
-            if response.status_code != 200:
-                continue
+            # The same quarterly history serves every metric asked about this bank
+            financials = session_get(("fdic_financials", cert))
+            if financials is None:
+                url = f"https://api.fdic.gov/banks/financials?filters=CERT:{cert}&fields=ASSET,ROA,ROE,NIMY,EQTOT,DEP,LNLSNET,EINTEXP,NONII,NCRER&limit=200&format=json"
+                response = await shared_get(client, url)
+                if response.status_code != 200:
+                    return points, latest
+                financials = response.text
+                session_put(("fdic_financials", cert), financials)
                 
-            data = response.json().get("data", [])
+            data = json.loads(financials).get("data", [])
             recent = [x for x in data if any(y in x['data']['ID'] for y in ['2023', '2024', '2025'])]
             recent.sort(key=lambda x: x['data']['ID'], reverse=True)
             
@@ -202,17 +1715,29 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
                 else:
                     value = record['data'].get(metric_key, 0)
                 
-                chart_data.append({
+                points.append({
                     "Bank": bank,
                     "Quarter": quarter,
                     "Metric": metric.replace("[Q] ", "").replace("[M] ", ""),
                     "Value": round(float(value), 2)
                 })
                 
-                if bank not in bank_latest:
-                    bank_latest[bank] = float(value)
+                if latest is None:
+                    latest = float(value)
         except:
-            continue
+            pass
+        return points, latest
+    
+    chart_data = []
+    all_banks = [base_bank] + peer_banks
+    bank_latest = {}
+    
+    client = http_client()
+    results = await asyncio.gather(*(bank_points(bank, client) for bank in all_banks))
+    for bank, (points, latest) in zip(all_banks, results):
+        chart_data.extend(points)
+        if latest is not None and bank not in bank_latest:
+            bank_latest[bank] = latest
     
     chart_data.sort(key=lambda x: x['Quarter'])
     
@@ -227,7 +1752,7 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
     else:
         analysis = f"Comparison of {metric_key} across selected banks."
     
-    return json.dumps({
+    return peer_analysis_result({
         "data": chart_data,
         "base_bank": base_bank,
         "peer_banks": peer_banks,
@@ -236,7 +1761,7 @@ def compare_banks(base_bank: str, peer_banks: List[str], metric: str) -> str:
     })
 
 @tool
-def get_sec_filings(bank_name: str, form_type: str = "10-K", cik: str = "") -> str:
+async def get_sec_filings(bank_name: str, form_type: str = "10-K", cik: str = "") -> str:
     """Get SEC EDGAR filings for a bank.
     
     Args:
@@ -248,8 +1773,14 @@ def get_sec_filings(bank_name: str, form_type: str = "10-K", cik: str = "") -> s
     Use when: User asks for "SEC filings", "10-K", "10-Q", "regulatory reports", "annual reports"
     Examples: "Get JPMorgan 10-K filings", "Show me Webster's quarterly reports"""
     
-    # If CIK is provided, use it directly
+    # If CIK is provided, use it directly (and remember it for follow-ups);
+    # otherwise reuse one resolved earlier in the session
+    bank_key = ("cik", ' '.join(bank_name.upper().split()))
     target_cik = cik if cik and cik != "0000000000" else None
+    if target_cik:
+        session_put(bank_key, target_cik)
+    else:
+        target_cik = session_get(bank_key)
     
     # Otherwise, try to find CIK from bank name
     if not target_cik:
@@ -283,14 +1814,20 @@ def get_sec_filings(bank_name: str, form_type: str = "10-K", cik: str = "") -> s
         return json.dumps({"success": False, "error": f"Bank CIK not found for: {bank_name}. Try using the search_banks tool first to get the CIK."})
     
     try:
-        headers = {"User-Agent": "BankIQ Analytics contact@bankiq.com"}
-        url = f"https://data.sec.gov/submissions/CIK{target_cik}.json"
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code != 200:
-            return json.dumps({"success": False, "error": f"SEC API error: {response.status_code}"})
+        # One submissions document covers every form type for this filer
+        submissions = session_get(("sec_submissions", target_cik))
+        if submissions is None:
+            headers = {"User-Agent": "BankIQ Analytics contact@bankiq.com"}
+            url = f"https://data.sec.gov/submissions/CIK{target_cik}.json"
+            
+            client = http_client()
+            response = await shared_get(client, url, headers=headers)
+            if response.status_code != 200:
+                return json.dumps({"success": False, "error": f"SEC API error: {response.status_code}"})
+            submissions = response.text
+            session_put(("sec_submissions", target_cik), submissions)
         
-        data = response.json()
+        data = json.loads(submissions)
         filings = data.get("filings", {}).get("recent", {})
         
         # Filter filings
@@ -320,70 +1857,29 @@ def get_sec_filings(bank_name: str, form_type: str = "10-K", cik: str = "") -> s
         return json.dumps({"success": False, "error": str(e)})
 
 @tool
-def generate_bank_report(bank_name: str) -> str:
+def generate_bank_report(bank_name: str, force_refresh: bool = False) -> str:
     """Generate a comprehensive financial analysis report for a bank.
     
     Args:
         bank_name: Name of the bank to analyze
+        force_refresh: Regenerate even if a cached report exists
     
     Returns: Detailed 8-section structured report with markdown headers
     Use when: User asks for full report, comprehensive analysis, detailed overview
     Examples: Generate a report on JPMorgan, Give me a full analysis of Wells Fargo"""
     
-    prompt = f"""You are a senior banking analyst writing a comprehensive financial report for institutional investors and C-suite executives.
-
-Generate a detailed financial analysis report for {bank_name} using this EXACT structure with markdown formatting:
-
-# Financial Analysis Report: {bank_name}
-
-## Executive Summary
-Write 4-6 sentences covering: Market position, recent performance highlights, strategic direction, and overall assessment.
-
-## Financial Performance
-Write 4-6 sentences analyzing: Revenue trends, profitability metrics (ROA, ROE, NIM), net income, balance sheet strength, and year-over-year comparisons.
-
-## Business Segments & Revenue Mix
-Write 4-6 sentences covering: Core business lines, revenue diversification, segment performance, competitive advantages, and market share.
-
-## Risk Profile & Management
-Write 4-6 sentences analyzing: Credit risk exposure, market risks, operational risks, regulatory challenges, and risk mitigation strategies.
-
-## Capital Position & Liquidity
-Write 4-6 sentences covering: Capital ratios (CET1, Tier 1), stress test results, liquidity coverage, regulatory compliance, and capital deployment strategy.
-
-## Strategic Initiatives & Innovation
-Write 4-6 sentences on: Digital transformation efforts, technology investments, operational efficiency programs, M&A activity, and growth initiatives.
-
-## Market Position & Competitive Landscape
-Write 4-6 sentences analyzing: Industry trends, competitive positioning, market opportunities, threats, and differentiation factors.
-
-## Investment Outlook & Recommendations
-Write 4-6 sentences providing: Valuation assessment, investment thesis, key catalysts, risks to watch, and forward-looking perspective.
-
-CRITICAL REQUIREMENTS:
-- Use markdown headers (##) for each section
-- Write ALL 8 sections - do not skip any
-- Each section must be 4-6 complete sentences
-- Use specific financial metrics and data points where possible
-- Maintain professional, business-focused tone
-- Include quantitative analysis alongside qualitative insights"""
+    if not force_refresh:
+        cached = get_cached_report(bank_name)
+        if cached is not None:
+            print(f"[generate_bank_report] Cache hit for {bank_name}")
+            emit_delta(cached, "generate_bank_report")
+            return cached
     
     try:
-        response = bedrock.converse_stream(
-            modelId="anthropic.claude-3-5-sonnet-20241022-v2:0",
-            messages=[{"role": "user", "content": [{"text": prompt}]}],
-            inferenceConfig={"maxTokens": 4000, "temperature": 0.3}
-        )
-        
-        # Collect streamed response for better generation
-        full_text = ""
-        for event in response['stream']:
-            if 'contentBlockDelta' in event:
-                delta = event['contentBlockDelta']['delta']
-                if 'text' in delta:
-                    full_text += delta['text']
-        
-        return full_text
+        report, complete = generate_report(bank_name, "", "generate_bank_report")
+        if complete:
+            put_cached_report(bank_name, report)
+        return report
     except Exception as e:
         return f"Error generating report: {str(e)}"
 
@@ -414,18 +1910,25 @@ Provide a detailed 4-6 paragraph professional analysis covering:
 
 Use professional banking terminology with specific insights and analysis."""
     
+    cached = get_cached_answer(question, context)
+    if cached is not None:
+        print(f"[answer_banking_question] Cache hit for: {question[:80]}")
+        return cached
+    
     try:
-        response = bedrock.converse(
-            modelId="anthropic.claude-3-5-sonnet-20241022-v2:0",
+        response = converse_routed(
+            "banking_answer",
             messages=[{"role": "user", "content": [{"text": prompt}]}],
             inferenceConfig={"maxTokens": 4000, "temperature": 0.3}
         )
-        return response['output']['message']['content'][0]['text']
+        answer = response['output']['message']['content'][0]['text']
+        put_cached_answer(question, context, answer)
+        return answer
     except Exception as e:
         return f"Error: {str(e)}"
 
 @tool
-def search_banks(query: str) -> str:
+async def search_banks(query: str) -> str:
     """Search for banks by name or ticker symbol using SEC EDGAR database.
     
     Args:
@@ -436,9 +1939,6 @@ def search_banks(query: str) -> str:
     Examples: "Find Webster Financial", "Search for JPM", "What banks match 'regional'?"""
     
     try:
-        import requests
-        import re
-        
         # First check our major banks cache for quick results
         major_banks = [
             {"name": "JPMORGAN CHASE & CO", "ticker": "JPM", "cik": "0000019617"},
@@ -479,6 +1979,11 @@ def search_banks(query: str) -> str:
         if cache_results:
             return json.dumps({"success": True, "results": cache_results[:10]})
         
+        session_key = ("sec_search", ' '.join(query_upper.split()))
+        cached = session_get(session_key)
+        if cached is not None:
+            return cached
+        
         # If not in cache, search SEC EDGAR
         # SEC EDGAR company search endpoint
         headers = {
@@ -491,7 +1996,8 @@ def search_banks(query: str) -> str:
         search_url = f"https://www.sec.gov/cgi-bin/browse-edgar?company={query}&owner=exclude&action=getcompany"
         
         try:
-            response = requests.get(search_url, headers=headers, timeout=10)
+            client = http_client()
+            response = await shared_get(client, search_url, headers=headers)
             
             # Parse HTML response to extract company info
             # Look for company name and CIK in the response
@@ -510,7 +2016,12 @@ def search_banks(query: str) -> str:
                         "cik": cik,
                         "ticker": query.upper() if len(query) <= 5 else ""
                     }]
-                    return json.dumps({"success": True, "results": results})
+                    result = json.dumps({"success": True, "results": results})
+                    # get_sec_filings can then resolve either name without a CIK
+                    session_put(session_key, result)
+                    session_put(("cik", ' '.join(query_upper.split())), cik)
+                    session_put(("cik", ' '.join(name.upper().split())), cik)
+                    return result
         except:
             pass
         
@@ -543,15 +2054,11 @@ def upload_csv_to_s3(csv_content: str, filename: str) -> str:
         doc_id = str(uuid.uuid4())
         s3_key = f"csv/{doc_id}/{filename}"
         
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=s3_key,
-            Body=csv_content.encode('utf-8'),
-            Metadata={
-                'upload_type': 'peer_analytics_csv',
-                'content_type': 'text/csv'
-            }
-        )
+        body = io.BytesIO(csv_content.encode('utf-8'))
+        upload_to_s3(body, bucket_name, s3_key, len(body.getbuffer()), {
+            'upload_type': 'peer_analytics_csv',
+            'content_type': 'text/csv'
+        }, 'text/csv')
         
         return json.dumps({
             "success": True,
@@ -572,7 +2079,7 @@ def analyze_csv_peer_performance(s3_key: str, base_bank: str, peer_banks: List[s
         peer_banks: List of peer banks
         metric: Metric to compare
     
-    Returns: Analysis with chart data from uploaded CSV
+    Returns: Summary and analysis of the uploaded CSV data (chart data is delivered to the user directly)
     Use when: Analyzing custom uploaded CSV data for peer comparison
     Examples: "Analyze my uploaded data", "Compare banks using my CSV"""
     
@@ -625,7 +2132,7 @@ def analyze_csv_peer_performance(s3_key: str, base_bank: str, peer_banks: List[s
         else:
             analysis = f"Analysis of {metric} for {base_bank} vs {', '.join(peer_banks)}"
         
-        return json.dumps({
+        return peer_analysis_result({
             "data": formatted_data,
             "base_bank": base_bank,
             "peer_banks": peer_banks,
@@ -635,6 +2142,109 @@ def analyze_csv_peer_performance(s3_key: str, base_bank: str, peer_banks: List[s
     except Exception as e:
         return json.dumps({"success": False, "error": str(e)})
 
+def trim_pdf(document, max_pages: int) -> Optional[bytes]:
+    """The first max_pages pages of a spooled PDF as a new PDF, or None if it is already that short."""
+    from PyPDF2 import PdfReader, PdfWriter
+    
+    document.seek(0)
+    try:
+        reader = PdfReader(document)
+        if len(reader.pages) <= max_pages:
+            return None
+        writer = PdfWriter()
+        for i in range(max_pages):
+            writer.add_page(reader.pages[i])
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+    finally:
+        document.seek(0)
+
+def identify_pdf(document, filename: str):
+    """Bank name, form type and fiscal year of a spooled PDF.
+    
+    Runs the local cover-page heuristics from extract_pdf_metadata first and
+    only asks Claude when they are not confident, sending just the first
+    MAX_METADATA_PAGES pages. Returns (bank_name, form_type, year)."""
+    document.seek(0)
+    local = extract_metadata_from_file(document, filename)
+    document.seek(0)
+    if local.get('success'):
+        if local.get('confident'):
+            print(f"[identify_pdf] Local metadata for {filename} from {local['pages_read']} page(s)")
+            return local['bank_name'], local['form_type'], local['year']
+        fallback = (local['bank_name'], local['form_type'], local['year'])
+    else:
+        fallback = (filename.replace('.pdf', '').replace('_', ' ').replace('-', ' ').title(), "10-K", 2024)
+    
+    try:
+        trimmed = trim_pdf(document, MAX_METADATA_PAGES)
+    except Exception as e:
+        print(f"[identify_pdf] Could not trim {filename}, sending the whole file: {e}")
+        trimmed = None
+    document_buffer = trimmed if trimmed is not None else spooled_buffer(document)
+    try:
+        response = converse_routed(
+            "pdf_metadata",
+            messages=[{
+                "role": "user",
+                "content": [
+                    {
+                        "document": {
+                            "format": "pdf",
+                            "name": filename,
+                            "source": {
+                                "bytes": document_buffer
+                            }
+                        }
+                    },
+                    {
+                        "text": """Analyze this financial document and extract:
+1. Bank/Company Name (full legal name)
+2. Document Type (10-K, 10-Q, or other)
+3. Fiscal Year
+
+Return ONLY a JSON object in this exact format:
+{"bank_name": "Webster Financial Corporation", "form_type": "10-K", "year": 2024}
+
+Be precise with the bank name as it appears in the document header."""
+                    }
+                ]
+            }],
+            inferenceConfig={"maxTokens": 500}
+        )
+        
+        # Parse Claude's response
+        analysis_text = response['output']['message']['content'][0]['text']
+        
+        # Extract JSON from response
+        import re
+        json_match = re.search(r'\{[^}]+\}', analysis_text)
+        if json_match:
+            doc_info = json.loads(json_match.group(0))
+            return (doc_info.get('bank_name', fallback[0]),
+                    doc_info.get('form_type', fallback[1]),
+                    doc_info.get('year', fallback[2]))
+        # Fallback to the local (low-confidence) result
+        return fallback
+    except Exception as e:
+        # Fallback if Claude analysis fails
+        print(f"[identify_pdf] Claude metadata extraction failed for {filename}: {e}")
+        return fallback
+    finally:
+        if isinstance(document_buffer, mmap.mmap):
+            document_buffer.close()
+        document.seek(0)
+
+def document_metadata(bank_name: str, form_type: str, year) -> Dict[str, str]:
+    """S3 object metadata stored with uploaded financial documents."""
+    return {
+        'bank_name': bank_name,
+        'form_type': form_type,
+        'year': str(year),
+        'upload_type': 'financial_document'
+    }
+
 @tool
 def analyze_and_upload_pdf(file_content: str, filename: str) -> str:
     """Analyze PDF document and upload to S3.
@@ -648,101 +2258,151 @@ def analyze_and_upload_pdf(file_content: str, filename: str) -> str:
     Examples: "Upload this 10-K report", "Analyze this PDF document"""
     
     try:
-        import uuid
-        import base64
-        
-        # Decode base64 content
+        # Decode base64 content into a spooled temp file (bounded memory)
         try:
-            content = base64.b64decode(file_content)
-        except:
+            document = decode_base64_to_spool(file_content)
+        except Exception:
             return json.dumps({"success": False, "error": "Invalid base64 content"})
         
-        # Use Claude to analyze the PDF document
-        try:
-            response = bedrock.converse(
-                modelId="anthropic.claude-3-5-sonnet-20241022-v2:0",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "document": {
-                                "format": "pdf",
-                                "name": filename,
-                                "source": {
-                                    "bytes": content
-                                }
-                            }
-                        },
-                        {
-                            "text": """Analyze this financial document and extract:
-1. Bank/Company Name (full legal name)
-2. Document Type (10-K, 10-Q, or other)
-3. Fiscal Year
-
-Return ONLY a JSON object in this exact format:
-{"bank_name": "Webster Financial Corporation", "form_type": "10-K", "year": 2024}
-
-Be precise with the bank name as it appears in the document header."""
-                        }
-                    ]
-                }],
-                inferenceConfig={"maxTokens": 500}
-            )
+        bucket_name = os.environ.get('UPLOADED_DOCS_BUCKET', 'bankiq-uploaded-docs-prod')
+        
+        with document:
+            size = spooled_size(document)
             
-            # Parse Claude's response
-            analysis_text = response['output']['message']['content'][0]['text']
+            # Identical content uploaded before - reuse its key and metadata
+            digest = sha256_file(document)
+            existing = lookup_document(bucket_name, digest)
+            if existing:
+                return json.dumps({"success": True, **existing, "deduplicated": True})
             
-            # Extract JSON from response
-            import json as json_lib
-            import re
-            json_match = re.search(r'\{[^}]+\}', analysis_text)
-            if json_match:
-                doc_info = json_lib.loads(json_match.group(0))
-                bank_name = doc_info.get('bank_name', 'Unknown Bank')
-                form_type = doc_info.get('form_type', '10-K')
-                year = doc_info.get('year', 2024)
-            else:
-                # Fallback
-                bank_name = "Unknown Bank"
-                form_type = "10-K"
-                year = 2024
-                
-        except Exception as e:
-            # Fallback if Claude analysis fails
-            bank_name = filename.replace('.pdf', '').replace('_', ' ').replace('-', ' ').title()
-            form_type = "10-K"
-            year = 2024
+            # Cover-page heuristics first, Claude on the first pages only if unsure
+            bank_name, form_type, year = identify_pdf(document, filename)
+            
+            # Upload to S3 under the content hash, streaming the body from the spooled file
+            s3_key = content_key(digest, filename)
+            
+            upload_to_s3(document, bucket_name, s3_key, size,
+                         document_metadata(bank_name, form_type, year), 'application/pdf')
+        
+        entry = {
+            "s3_key": s3_key,
+            "doc_id": digest,
+            "filename": filename,
+            "bank_name": bank_name,
+            "form_type": form_type,
+            "year": year,
+            "size": size
+        }
+        record_document(bucket_name, digest, entry)
+        
+        return json.dumps({"success": True, **entry})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@tool
+def get_pdf_upload_url(filename: str) -> str:
+    """Create a presigned S3 URL for uploading a PDF directly, without sending it through the agent.
+    
+    Args:
+        filename: Name of the file to upload
+    
+    Returns: Presigned PUT URL and the S3 key the document will be stored under
+    Use when: A client needs to upload a large document before analysis
+    Examples: "Give me an upload URL for report.pdf"""
+    
+    try:
+        import uuid
         
-        # Upload to S3
         bucket_name = os.environ.get('UPLOADED_DOCS_BUCKET', 'bankiq-uploaded-docs-prod')
         doc_id = str(uuid.uuid4())
-        s3_key = f"uploads/{doc_id}/{filename}"
+        s3_key = f"uploads/{doc_id}/{os.path.basename(filename)}"
         
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=s3_key,
-            Body=content,
-            Metadata={
-                'bank_name': bank_name,
-                'form_type': form_type,
-                'year': str(year),
-                'upload_type': 'financial_document'
-            }
+        upload_url = s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': bucket_name, 'Key': s3_key, 'ContentType': 'application/pdf'},
+            ExpiresIn=PRESIGNED_UPLOAD_EXPIRES
         )
         
         return json.dumps({
             "success": True,
+            "upload_url": upload_url,
             "s3_key": s3_key,
             "doc_id": doc_id,
-            "filename": filename,
-            "bank_name": bank_name,
-            "form_type": form_type,
-            "year": year,
-            "size": len(content)
+            "expires_in": PRESIGNED_UPLOAD_EXPIRES
         })
     except Exception as e:
         return json.dumps({"success": False, "error": str(e)})
 
+@tool
+def register_uploaded_pdf(s3_key: str, filename: str = "") -> str:
+    """Analyze a PDF that the client already uploaded to S3 via a presigned URL.
+    
+    Args:
+        s3_key: S3 key returned by get_pdf_upload_url (or /api/upload-url)
+        filename: Original file name (defaults to the last part of the key)
+    
+    Returns: Document metadata (bank name, form type, year) and S3 key, same format as analyze_and_upload_pdf
+    Use when: A document was uploaded by reference and only its S3 key is provided
+    Examples: "Register the uploaded document uploads/abc/report.pdf"""
+    
+    if not STAGED_UPLOAD_RE.match(s3_key):
+        return json.dumps({"success": False, "error": f"Not a staged upload key: {s3_key}"})
+    if filename and (filename != os.path.basename(filename) or filename in ('.', '..')):
+        return json.dumps({"success": False, "error": f"Invalid filename: {filename}"})
+    
+    try:
+        import shutil
+        import tempfile
+        
+        bucket_name = os.environ.get('UPLOADED_DOCS_BUCKET', 'bankiq-uploaded-docs-prod')
+        filename = filename or os.path.basename(s3_key)
+        
+        # Stream the object into a spooled temp file (bounded memory)
+        response = s3.get_object(Bucket=bucket_name, Key=s3_key)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as document:
+            shutil.copyfileobj(response['Body'], document, 1024 * 1024)
+            size = spooled_size(document)
+            digest = sha256_file(document)
+            
+            existing = lookup_document(bucket_name, digest)
+            if not existing:
+                bank_name, form_type, year = identify_pdf(document, filename)
+        
+        if existing:
+            entry = existing
+        else:
+            # Move the staged upload to its content-addressed key (server-side copy)
+            canonical_key = content_key(digest, filename)
+            s3.copy_object(
+                Bucket=bucket_name,
+                Key=canonical_key,
+                CopySource={'Bucket': bucket_name, 'Key': s3_key},
+                Metadata=document_metadata(bank_name, form_type, year),
+                MetadataDirective='REPLACE',
+                ContentType='application/pdf'
+            )
+            entry = {
+                "s3_key": canonical_key,
+                "doc_id": digest,
+                "filename": filename,
+                "bank_name": bank_name,
+                "form_type": form_type,
+                "year": year,
+                "size": size
+            }
+            record_document(bucket_name, digest, entry)
+        
+        # The staging object is now redundant
+        if entry['s3_key'] != s3_key:
+            try:
+                s3.delete_object(Bucket=bucket_name, Key=s3_key)
+            except Exception as e:
+                print(f"[register_uploaded_pdf] Could not delete staged upload {s3_key}: {e}")
+        
+        return json.dumps({"success": True, **entry, "deduplicated": bool(existing)})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
 @tool
 def upload_document_to_s3(file_content: str, filename: str, bank_name: str = "") -> str:
     """Legacy upload function - use analyze_and_upload_pdf instead.
@@ -766,110 +2426,104 @@ def analyze_uploaded_pdf(s3_key: str, bank_name: str, analysis_type: str = "comp
     Examples: "Analyze this 10-K", "Generate report from uploaded PDF", "Full analysis of document"""
     
     try:
-        # Get PDF from S3
         bucket_name = os.environ.get('UPLOADED_DOCS_BUCKET', 'bankiq-uploaded-docs-prod')
-        response = s3.get_object(Bucket=bucket_name, Key=s3_key)
-        pdf_bytes = response['Body'].read()
-        
-        # Extract text from PDF (first 50 pages for analysis)
-        from PyPDF2 import PdfReader
-        from io import BytesIO
         
-        pdf_file = BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
+        # Same document analyzed before (possibly uploaded by someone else)
+        digest = key_digest(s3_key)
+        analysis_mode = "full" if MAP_REDUCE_ANALYSIS else "head"
+        analysis_name = f"analysis-{analysis_type}-{analysis_mode}-{hashlib.sha256(bank_name.encode('utf-8')).hexdigest()[:12]}.md"
+        if digest:
+            cached = get_derived(bucket_name, digest, analysis_name)
+            if cached is not None:
+                print(f"[analyze_uploaded_pdf] Reusing cached {analysis_type} analysis for {digest[:12]}")
+                emit_delta(cached, "analyze_uploaded_pdf")
+                return cached
         
-        # Extract text from document - comprehensive analysis needs more context
-        text_content = ""
-        total_pages = len(reader.pages)
+        # Comprehensive reports split one report budget across the section
+        # calls; other types send the context once with a 4,000-token answer
+        if analysis_type == "comprehensive":
+            context_tokens = report_section_budget()
+        else:
+            context_tokens = context_budget("document_analysis", "", 4000)
         
-        # For full analysis, extract up to 150 pages or 500K chars
-        # This covers most complete 10-K filings
-        pages_to_analyze = min(150, total_pages)
+        # Map-reduce: condense the whole filing (up to 150 pages or 500K chars,
+        # which covers most complete 10-Ks) into notes shared by all analysis
+        # types; otherwise only extract the head of the document that fits
+        if MAP_REDUCE_ANALYSIS:
+            text_content = extract_document_text(bucket_name, s3_key, 150, 500000, "analyze_uploaded_pdf")
+            document_context, complete = document_notes(bucket_name, s3_key, text_content, "analyze_uploaded_pdf")
+            context_label = "Analyst notes covering the entire filing"
+        else:
+            document_context = extract_document_text(bucket_name, s3_key, 150, budget_chars(context_tokens), "analyze_uploaded_pdf")
+            complete = True
+            context_label = "Document excerpt"
         
-        for i in range(pages_to_analyze):
-            page_text = reader.pages[i].extract_text()
-            text_content += f"\n--- Page {i+1} ---\n{page_text}\n"
-            
-            # Stop if we hit 500K chars (leaves room for Claude's response)
-            if len(text_content) > 500000:
-                break
+        # Comprehensive reports fan out one completion per section, each
+        # given the parts of the notes that bear on its topic
+        if analysis_type == "comprehensive":
+            section_contexts = [
+                "Base your analysis on this SEC filing. Include specific numbers and metrics from the document.\n\n"
+                f"{context_label} (parts relevant to this section):\n"
+                f"{relevant_context(document_context, f'{title} {guidance}', context_tokens)}\n\n"
+                for title, guidance in REPORT_SECTIONS
+            ]
+            full_text, sections_complete = generate_report(bank_name, "", "analyze_uploaded_pdf", section_contexts)
+            if digest and complete and sections_complete:
+                put_derived(bucket_name, digest, analysis_name, full_text)
+            return full_text
         
-        # Log extraction stats for debugging
-        print(f"[analyze_uploaded_pdf] Extracted {len(text_content)} chars from {i+1}/{total_pages} pages")
+        document_context = fit_context(document_context, context_tokens)
         
         # Create analysis prompt based on type
-        if analysis_type == "comprehensive":
-            prompt = f"""Analyze this {bank_name} SEC filing and generate a comprehensive financial report using this EXACT structure with markdown formatting:
-
-# Financial Analysis Report: {bank_name}
-
-## Executive Summary
-Write 4-6 sentences covering: Market position, recent performance highlights, strategic direction, and overall assessment based on the filing.
-
-## Financial Performance
-Write 4-6 sentences analyzing: Revenue trends, profitability metrics (ROA, ROE, NIM), net income, balance sheet strength, and year-over-year comparisons from the document.
-
-## Business Segments & Revenue Mix
-Write 4-6 sentences covering: Core business lines, revenue diversification, segment performance, competitive advantages, and market share.
-
-## Risk Profile & Management
-Write 4-6 sentences analyzing: Credit risk exposure, market risks, operational risks, regulatory challenges, and risk mitigation strategies mentioned in the filing.
-
-## Capital Position & Liquidity
-Write 4-6 sentences covering: Capital ratios (CET1, Tier 1), stress test results, liquidity coverage, regulatory compliance, and capital deployment strategy.
-
-## Strategic Initiatives & Innovation
-Write 4-6 sentences on: Digital transformation efforts, technology investments, operational efficiency programs, M&A activity, and growth initiatives.
-
-## Market Position & Competitive Landscape
-Write 4-6 sentences analyzing: Industry trends, competitive positioning, market opportunities, threats, and differentiation factors.
-
-## Investment Outlook & Recommendations
-Write 4-6 sentences providing: Valuation assessment, investment thesis, key catalysts, risks to watch, and forward-looking perspective.
-
-Document excerpt:
-{text_content[:15000]}
-
-CRITICAL: Use markdown headers (##) for each section. Write ALL 8 sections with 4-6 sentences each. Include specific numbers and metrics from the document."""
-
-        elif analysis_type == "summary":
+        if analysis_type == "summary":
             prompt = f"""Provide a concise summary of this {bank_name} SEC filing, highlighting:
 - Key financial metrics
 - Major developments
 - Risk factors
 - Strategic initiatives
 
-Document excerpt:
-{text_content[:10000]}"""
+{context_label}:
+{document_context}"""
 
         else:
             prompt = f"""Analyze this {bank_name} SEC filing focusing on {analysis_type}.
 
-Document excerpt:
-{text_content[:10000]}
+{context_label}:
+{document_context}
 
 Provide detailed insights."""
         
         # Analyze with Claude (streaming for better UX on long documents)
-        response = bedrock.converse_stream(
-            modelId="anthropic.claude-3-5-sonnet-20241022-v2:0",
+        response = converse_stream_routed(
+            "document_analysis",
             messages=[{"role": "user", "content": [{"text": prompt}]}],
             inferenceConfig={"maxTokens": 4000, "temperature": 0.3}
         )
         
-        # Collect streamed response
-        full_text = ""
-        for event in response['stream']:
-            if 'contentBlockDelta' in event:
-                delta = event['contentBlockDelta']['delta']
-                if 'text' in delta:
-                    full_text += delta['text']
+        full_text = collect_converse_stream(response, "analyze_uploaded_pdf", "document_analysis", estimate_tokens(prompt))
         
+        if digest and complete and full_text:
+            put_derived(bucket_name, digest, analysis_name, full_text)
         return full_text
         
     except Exception as e:
         return f"Error analyzing PDF: {str(e)}"
 
+DOCUMENT_CHAT_PROMPT = """You are a senior financial analyst. Answer questions about the document below with comprehensive analysis.
+
+Document content (excerpt):
+{document}
+
+Provide a detailed 4-6 paragraph professional analysis covering:
+1. Direct answer to the question with key findings
+2. Supporting evidence and specific metrics from the document
+3. Industry context and comparative analysis
+4. Risk assessment and implications
+5. Strategic outlook and recommendations
+6. Investment perspective and key takeaways
+
+Use professional banking terminology with specific financial metrics and insights."""
+
 @tool
 def chat_with_documents(question: str, s3_key: str = "", bank_name: str = "", use_live: bool = False, form_type: str = "10-K") -> str:
     """Chat with uploaded documents or live SEC filings.
@@ -886,73 +2540,29 @@ def chat_with_documents(question: str, s3_key: str = "", bank_name: str = "", us
     Examples: "What was the revenue?", "Tell me about risks", "What are the key highlights?"""
     
     try:
-        document_content = ""
-        
-        if s3_key:
-            # Get PDF from S3 and extract text properly
-            try:
-                bucket = os.environ.get('UPLOADED_DOCS_BUCKET', 'bankiq-uploaded-docs-prod')
-                response = s3.get_object(Bucket=bucket, Key=s3_key)
-                
-                pdf_bytes = response['Body'].read()
-                
-                # Extract text from PDF using PyPDF2
-                from PyPDF2 import PdfReader
-                from io import BytesIO
-                
-                pdf_file = BytesIO(pdf_bytes)
-                reader = PdfReader(pdf_file)
-                
-                # Extract text from document - be generous with context for better answers
-                # Claude can handle ~200K tokens (~600K chars), so we can extract a lot
-                text_content = ""
-                total_pages = len(reader.pages)
-                
-                # Strategy: Extract more pages but with a reasonable char limit
-                # Most 10-Ks are 100-200 pages, we'll extract up to 100 pages or 400K chars
-                pages_to_read = min(100, total_pages)
-                
-                for i in range(pages_to_read):
-                    page_text = reader.pages[i].extract_text()
-                    text_content += f"\n--- Page {i+1} ---\n{page_text}\n"
-                    
-                    # Stop if we hit 400K chars (still well under Claude's limit)
-                    if len(text_content) > 400000:
-                        break
-                
-                document_content = text_content
-                
-                # Log extraction stats for debugging
-                print(f"[chat_with_documents] Extracted {len(text_content)} chars from {i+1}/{total_pages} pages")
-                
-            except Exception as e:
-                return f"Error reading PDF document: {str(e)}"
-        else:
+        if not s3_key:
             return "No document provided. Please upload a document first."
         
-        # Use Claude with document context to answer the question
-        prompt = f"""You are a senior financial analyst. Answer this question with comprehensive analysis.
-
-Question: {question}
-Bank: {bank_name}
-
-Document content (excerpt):
-{document_content[:20000]}
-
-Provide a detailed 4-6 paragraph professional analysis covering:
-1. Direct answer to the question with key findings
-2. Supporting evidence and specific metrics from the document
-3. Industry context and comparative analysis
-4. Risk assessment and implications
-5. Strategic outlook and recommendations
-6. Investment perspective and key takeaways
-
-Use professional banking terminology with specific financial metrics and insights."""
+        # Only extract as much text as the context budget can send. The budget
+        # ignores the question so the cached prefix is identical every turn.
+        context_tokens = context_budget("document_chat", DOCUMENT_CHAT_PROMPT, 4000)
+        try:
+            bucket = os.environ.get('UPLOADED_DOCS_BUCKET', 'bankiq-uploaded-docs-prod')
+            document_content = extract_document_text(bucket, s3_key, 100, budget_chars(context_tokens), "chat_with_documents")
+        except Exception as e:
+            return f"Error reading PDF document: {str(e)}"
         
-        response = bedrock.converse(
-            modelId="anthropic.claude-3-5-sonnet-20241022-v2:0",
-            messages=[{"role": "user", "content": [{"text": prompt}]}],
-            inferenceConfig={"maxTokens": 4000, "temperature": 0.3}
+        # Instructions and document excerpt form a stable prefix that Bedrock
+        # caches per document; only the question changes between turns
+        prefix = [{"text": DOCUMENT_CHAT_PROMPT.format(document=fit_context(document_content, context_tokens))}]
+        
+        response = converse_with_cached_prefix(
+            "document_chat",
+            prefix,
+            [{"role": "user", "content": [{"text": f"Question: {question}\nBank: {bank_name}"}]}],
+            {"maxTokens": 4000, "temperature": 0.3},
+            key_digest(s3_key) or s3_key,
+            "chat_with_documents"
         )
         
         return response['output']['message']['content'][0]['text']
@@ -964,38 +2574,42 @@ Use professional banking terminology with specific financial metrics and insight
 # AGENT SETUP
 # ============================================================================
 
-# Create agent with all tools (no explicit model - AgentCore handles this)
-agent = Agent(
-    tools=[
-        get_fdic_data,
-        search_fdic_bank,
-        compare_banks,
-        get_sec_filings,
-        generate_bank_report,
-        answer_banking_question,
-        search_banks,
-        upload_csv_to_s3,
-        analyze_csv_peer_performance,
-        analyze_and_upload_pdf,
-        upload_document_to_s3,
-        analyze_uploaded_pdf,
-        chat_with_documents
-    ]
-)
+AGENT_TOOLS = [
+    get_fdic_data,
+    search_fdic_bank,
+    compare_banks,
+    get_sec_filings,
+    generate_bank_report,
+    answer_banking_question,
+    search_banks,
+    upload_csv_to_s3,
+    analyze_csv_peer_performance,
+    analyze_and_upload_pdf,
+    get_pdf_upload_url,
+    register_uploaded_pdf,
+    upload_document_to_s3,
+    analyze_uploaded_pdf,
+    chat_with_documents
+]
+
+# Structured {"tool": ..., "args": ...} requests run these directly
+fast_path_tools = {agent_tool.tool_name: agent_tool for agent_tool in AGENT_TOOLS}
 
 # System prompt with clear tool selection guidance
-agent.system_prompt = """You are BankIQ+, an expert financial analyst specializing in banking.
+AGENT_SYSTEM_PROMPT = """You are BankIQ+, an expert financial analyst specializing in banking.
 
 TOOL SELECTION GUIDE:
 - get_fdic_data: Current banking data, latest metrics
-- compare_banks: Peer comparison, competitive analysis (returns JSON with chart data)
+- compare_banks: Peer comparison, competitive analysis (chart data goes to the user directly)
 - get_sec_filings: SEC filings, 10-K, 10-Q reports (pass CIK if provided)
-- generate_bank_report: Full structured reports with 8 sections and markdown headers
+- generate_bank_report: Full structured reports with 8 sections and markdown headers (cached; pass force_refresh=true only if the user asks to refresh/regenerate)
 - search_banks: Find banks by name/ticker, get CIK numbers
 - answer_banking_question: General banking questions, explanations
 - upload_csv_to_s3: Upload CSV data
 - analyze_csv_peer_performance: Analyze uploaded CSV data
 - analyze_and_upload_pdf: Upload and analyze PDFs (first time)
+- get_pdf_upload_url: Presigned URL for uploading a PDF directly to S3
+- register_uploaded_pdf: Analyze a PDF already uploaded to S3 (only the s3_key is given)
 - analyze_uploaded_pdf: Full analysis of uploaded PDFs (comprehensive reports)
 - chat_with_documents: Q&A with uploaded documents (specific questions)
 
@@ -1007,14 +2621,13 @@ DOCUMENT TOOL SELECTION:
 
 IMPORTANT INSTRUCTIONS FOR PEER ANALYSIS:
 1. When using compare_banks or analyze_csv_peer_performance:
-   - The tool returns a JSON string with data and analysis
-   - Return the tool's JSON output EXACTLY as-is on a single line
-   - Then on a new line, provide your own expanded analysis
-   
-2. Response format for peer analysis:
-   {"data": [...], "base_bank": "...", "peer_banks": [...], "analysis": "...", "source": "..."}
-   
-   Your expanded analysis here with additional insights and context...
+   - The chart data is delivered to the user directly; the tool returns a summary
+     with an artifact_id, the latest value per bank and a short analysis
+   - Do NOT reproduce the chart data, JSON or a DATA line
+   - Write your expanded analysis using the summary values
+
+2. If the tool output contains a "data" array instead of an artifact_id, return
+   that JSON EXACTLY as-is on a single line, then your expanded analysis
 4. For bank search requests:
    - Call search_banks tool
    - Return the EXACT JSON output from the tool (including the "results" array)
@@ -1027,15 +2640,13 @@ IMPORTANT INSTRUCTIONS FOR PEER ANALYSIS:
 
 RESPONSE LENGTH RULES:
 - For chat/questions: Must be 4-6 paragraphs (4-6 sentences each)
-- For comparisons: Include DATA line + 6-8 paragraph business analysis
+- For comparisons: 6-8 paragraph business analysis (no chart data)
 - For generate_bank_report: MUST follow the tool's exact 8-section markdown structure with ## headers
 - For analyze_uploaded_pdf with comprehensive type: MUST follow the tool's exact 8-section markdown structure with ## headers
 - For other analysis: 4-6 paragraphs
 - Be concise, clear, and business-focused
 
 Example response format for comparisons:
-DATA: {"data": [...], "analysis": "...", "base_bank": "...", "peer_banks": [...]}
-
 [6-8 paragraph business-style analysis here covering: executive summary, performance comparison, trends analysis, competitive positioning, risk assessment, strategic implications, market outlook, and investment perspective]
 
 Example response format for bank search:
@@ -1051,11 +2662,145 @@ Example response format for chat questions:
 
 Be professional and business-focused. For chat and reports, provide ONLY clean text analysis with NO JSON data."""
 
+def create_agent() -> Agent:
+    # No explicit model - AgentCore handles this
+    return Agent(tools=AGENT_TOOLS, system_prompt=AGENT_SYSTEM_PROMPT)
+
+agent = LazyResource("agent", create_agent)
+# The Strands agent runs one invocation at a time and keeps its history, so
+# prompts take turns and each starts from an empty conversation
+agent_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def fresh_agent():
+    async with agent_lock:
+        instance = agent.get()
+        instance.messages = []
+        yield instance
+
+def startup_report() -> Dict:
+    """Startup timing breakdown and whether every lazy resource is ready."""
+    return {
+        "lazy_startup": LAZY_STARTUP,
+        "ready": all(resource.instance is not None for resource in (bedrock, s3, agent))
+                 and all(module in sys.modules for module in PREWARM_MODULES),
+        "uptime_seconds": round(time.perf_counter() - startup_started, 3),
+        "phases": dict(startup_timings)
+    }
+
+def prewarm() -> Dict:
+    """Build the clients and agent and import lazily loaded modules now, so the
+    first request doesn't pay for them. Safe to call repeatedly and concurrently."""
+    for module in PREWARM_MODULES:
+        if module not in sys.modules:
+            with startup_phase(f"import {module}"):
+                importlib.import_module(module)
+    for resource in (bedrock, s3, agent):
+        resource.get()
+    report = startup_report()
+    print("[startup] Prewarmed: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report["phases"].items()))
+    return report
+
+async def run_tool(name: str, args) -> str:
+    """Run one tool for a structured request, skipping the agent's model turns.
+    
+    Async tools are awaited; synchronous ones run in a worker thread."""
+    tool_function = fast_path_tools.get(name)
+    if tool_function is None:
+        return json.dumps({"success": False, "error": f"Unknown tool: {name}"})
+    if not isinstance(args, dict):
+        return json.dumps({"success": False, "error": "args must be an object"})
+    try:
+        inspect.signature(tool_function).bind(**args)
+    except TypeError as e:
+        return json.dumps({"success": False, "error": f"Invalid args for {name}: {e}"})
+    
+    start_time = time.time()
+    if inspect.iscoroutinefunction(inspect.unwrap(tool_function)):
+        result = await tool_function(**args)
+    else:
+        result = await asyncio.to_thread(tool_function, **args)
+    print(f"[fast_path] {name} completed in {time.time() - start_time:.2f}s")
+    return result
+
+async def stream_tool(name: str, args, session_id: Optional[str] = None):
+    """Run a tool directly and yield its text deltas as SSE events."""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def sink(text: str, source: str):
+        loop.call_soon_threadsafe(events.put_nowait, {"chunk": text, "source": source})
+
+    def artifact(item: Dict):
+        loop.call_soon_threadsafe(events.put_nowait, {"artifact": item})
+
+    async def run():
+        try:
+            output = await run_tool(name, args)
+            events.put_nowait({"done": True, "output": output})
+        except Exception as e:
+            events.put_nowait({"error": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    token = stream_sink.set(sink)
+    artifact_token = artifact_sink.set(artifact)
+    session_token = current_session.set(session_id)
+    try:
+        task = asyncio.create_task(run())
+    finally:
+        current_session.reset(session_token)
+        artifact_sink.reset(artifact_token)
+        stream_sink.reset(token)
+
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        if not task.done():
+            task.cancel()
+
 @app.entrypoint
-def invoke(payload):
-    """AgentCore entrypoint"""
+async def invoke(payload, context):
+    """AgentCore entrypoint.
+
+    {"prompt": ...} runs the agent; {"tool": ..., "args": {...}} runs that tool
+    directly and returns its output. Structured data attached by tools comes
+    back as {"output": ..., "artifacts": [...]}. Pass "stream": true to
+    receive text deltas and artifacts as SSE events. Tools share
+    session_store state across requests with the same AgentCore session ID.
+    {"prewarm": true} builds whatever lazy startup deferred and returns the
+    startup timing breakdown.
+    """
+    if payload.get("prewarm"):
+        return await asyncio.to_thread(prewarm)
+    
+    session_id = getattr(context, "session_id", None)
+    current_session.set(session_id)
+    
     user_message = payload.get("prompt", "Hello! I'm BankIQ+, your banking analyst.")
-    return agent(user_message)
+    if payload.get("stream"):
+        if payload.get("tool"):
+            return stream_tool(payload["tool"], payload.get("args", {}), session_id)
+        return stream_agent(user_message, session_id)
+    
+    artifacts = []
+    artifact_sink.set(artifacts.append)
+    if payload.get("tool"):
+        result = await run_tool(payload["tool"], payload.get("args", {}))
+    else:
+        async with fresh_agent() as prompt_agent:
+            result = await prompt_agent.invoke_async(user_message)
+    if artifacts:
+        return {"output": str(result), "artifacts": artifacts}
+    return result
+
+startup_timings["module import"] = round(time.perf_counter() - startup_started, 3)
+if not LAZY_STARTUP:
+    prewarm()
 
 if __name__ == "__main__":
     app.run()
\ No newline at end of file
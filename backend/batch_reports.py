@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Generate bank reports for a list of banks, checkpointing each finished report
+
+Usage:
+    python batch_reports.py banks.txt --checkpoint ./reports
+    python batch_reports.py banks.txt --checkpoint s3://my-bucket/reports/2025-Q1 --concurrency 2
+
+banks.txt has one bank name per line (blank lines and # comments are skipped).
+Each finished report is written to the checkpoint location as it completes;
+rerunning the same command skips banks that already have a report there, so
+a crashed or interrupted batch resumes where it stopped.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import bank_iq_agent_v1_fixed as agent_module
+
+# Whole reports in flight; each report already fans out into 8 section
+# calls, so 2 reports keep BEDROCK_MAX_CONCURRENCY (16) busy
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 2))
+# A report with failed (usually throttled) sections is retried with
+# exponential backoff instead of being checkpointed
+BATCH_MAX_ATTEMPTS = int(os.environ.get('BATCH_MAX_ATTEMPTS', 4))
+BATCH_RETRY_BASE_SECONDS = float(os.environ.get('BATCH_RETRY_BASE_SECONDS', 15))
+
+def read_bank_list(path):
+    """Bank names from a text file, in order, without duplicates."""
+    banks = []
+    with open(path) as f:
+        for line in f:
+            name = line.strip()
+            if name and not name.startswith('#') and name not in banks:
+                banks.append(name)
+    return banks
+
+def checkpoint_name(bank_name):
+    """File name for a bank's report: readable slug plus a short hash for uniqueness."""
+    slug = re.sub(r'[^a-z0-9]+', '-', bank_name.lower()).strip('-')[:60]
+    return f"{slug}-{hashlib.sha256(bank_name.encode('utf-8')).hexdigest()[:8]}.json"
+
+class LocalCheckpoint:
+    """Reports stored as JSON files in a local directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.directory, name))
+
+    def write(self, name, body):
+        # Write then rename so a crash never leaves a truncated checkpoint
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'w') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+
+class S3Checkpoint:
+    """Reports stored as JSON objects under an S3 prefix."""
+
+    def __init__(self, url):
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/') + '/' if prefix else ''
+        self.existing = set()
+        paginator = agent_module.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                self.existing.add(obj['Key'][len(self.prefix):])
+
+    def exists(self, name):
+        return name in self.existing
+
+    def write(self, name, body):
+        agent_module.s3.put_object(Bucket=self.bucket, Key=self.prefix + name,
+                                   Body=body.encode('utf-8'), ContentType='application/json')
+        self.existing.add(name)
+
+def open_checkpoint(location):
+    if location.startswith('s3://'):
+        return S3Checkpoint(location)
+    return LocalCheckpoint(location)
+
+def generate_with_retries(bank_name):
+    """Generate a complete report, backing off while sections keep failing.
+
+    Returns the report, or None if it is still incomplete after BATCH_MAX_ATTEMPTS.
+    """
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        report, complete = agent_module.generate_report(bank_name, "", "batch_reports")
+        if complete:
+            return report
+        if attempt < BATCH_MAX_ATTEMPTS - 1:
+            delay = BATCH_RETRY_BASE_SECONDS * (2 ** attempt)
+            print(f"[batch_reports] {bank_name}: incomplete report (attempt {attempt + 1}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+    return None
+
+def run_batch(banks, checkpoint, concurrency):
+    """Generate and checkpoint reports for every bank not already checkpointed."""
+    pending = [bank for bank in banks if not checkpoint.exists(checkpoint_name(bank))]
+    print(f"[batch_reports] {len(banks)} banks, {len(banks) - len(pending)} already checkpointed, {len(pending)} to generate")
+
+    completed, failed = [], []
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(generate_with_retries, bank): bank for bank in pending}
+        for future in as_completed(futures):
+            bank = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                print(f"[batch_reports] {bank}: failed: {e}")
+                failed.append(bank)
+                continue
+            if report is None:
+                print(f"[batch_reports] {bank}: gave up after {BATCH_MAX_ATTEMPTS} attempts")
+                failed.append(bank)
+                continue
+
+            checkpoint.write(checkpoint_name(bank), json.dumps({
+                "bank_name": bank,
+                "report": report,
+                "prompt_version": agent_module.REPORT_PROMPT_VERSION,
+                "created_at": time.time()
+            }))
+            # Interactive generate_bank_report calls can now serve it from cache
+            agent_module.put_cached_report(bank, report)
+            completed.append(bank)
+            print(f"[batch_reports] {bank}: checkpointed ({len(completed)}/{len(pending)}, "
+                  f"{time.time() - start_time:.0f}s elapsed)")
+
+    throttles = agent_module.bedrock_metrics['throttles']
+    print(f"[batch_reports] Done: {len(completed)} generated, {len(failed)} failed, {throttles} throttled Bedrock calls")
+    return completed, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate bank reports for a list of banks with checkpointing')
+    parser.add_argument('bank_list', help='Text file with one bank name per line')
+    parser.add_argument('--checkpoint', required=True, help='Local directory or s3://bucket/prefix for finished reports')
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help='Reports generated at the same time')
+    args = parser.parse_args(argv)
+
+    banks = read_bank_list(args.bank_list)
+    _, failed = run_batch(banks, open_checkpoint(args.checkpoint), args.concurrency)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
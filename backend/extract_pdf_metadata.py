@@ -5,50 +5,107 @@ Extract bank name, document type, and year from SEC filing PDFs
 import sys
 import json
 import base64
+import os
 import re
-from io import BytesIO
-from PyPDF2 import PdfReader
+import tempfile
+from functools import lru_cache
 
-def extract_metadata(pdf_base64, filename):
+# Maximum number of pages scanned for cover-page metadata
+MAX_METADATA_PAGES = 5
+
+# Opt-in debug dump of the extracted text (set PDF_METADATA_DEBUG=1)
+DEBUG_DUMP = os.environ.get('PDF_METADATA_DEBUG', '').lower() in ('1', 'true', 'yes')
+DEBUG_DUMP_PATH = os.environ.get('PDF_METADATA_DEBUG_PATH', '/tmp/pdf_debug.txt')
+
+# Decoded documents above this size are spooled to disk instead of memory
+SPOOL_MAX_MEMORY = int(os.environ.get('PDF_SPOOL_MAX_MEMORY', 4 * 1024 * 1024))
+
+# Base64 characters decoded per step (multiple of 4)
+BASE64_CHUNK_CHARS = 1024 * 1024
+
+def decode_base64_to_spool(data, max_memory=SPOOL_MAX_MEMORY):
     """
-    Extract bank name, form type, and year from first page of PDF
+    Decode a base64 string chunk by chunk into a spooled temporary file
+    
+    Only one chunk of decoded bytes is held at a time; documents larger than
+    max_memory roll over to a temp file on disk. Whitespace in the input is
+    ignored. The returned file is positioned at 0 and must be closed by the
+    caller.
     """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        carry = ''
+        for start in range(0, len(data), BASE64_CHUNK_CHARS):
+            chunk = carry + ''.join(data[start:start + BASE64_CHUNK_CHARS].split())
+            aligned = len(chunk) - len(chunk) % 4
+            spool.write(base64.b64decode(chunk[:aligned]))
+            carry = chunk[aligned:]
+        if carry:
+            spool.write(base64.b64decode(carry))
+        spool.seek(0)
+        return spool
+    except Exception:
+        spool.close()
+        raise
+
+def extract_metadata(pdf_base64, filename, incremental=True, debug=None):
+    """
+    Extract bank name, form type, and year from a base64-encoded PDF
+    """
+    try:
+        pdf_file = decode_base64_to_spool(pdf_base64)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'filename': filename
+        }
+    with pdf_file:
+        return extract_metadata_from_file(pdf_file, filename, incremental=incremental, debug=debug)
+
+def extract_metadata_from_file(pdf_file, filename, incremental=True, debug=None):
+    """
+    Extract bank name, form type, and year from the first pages of a PDF file
+
+    In incremental mode pages are extracted one at a time and reading stops
+    as soon as bank name, form type and year have all been found with
+    confidence (usually on the cover page). Otherwise the first
+    MAX_METADATA_PAGES pages are always read.
+    """
+    # Imported here so the agent can import this module without paying for PyPDF2 at startup
+    from PyPDF2 import PdfReader
+
+    if debug is None:
+        debug = DEBUG_DUMP
+
     try:
-        # Decode base64 to bytes
-        pdf_bytes = base64.b64decode(pdf_base64)
-        pdf_file = BytesIO(pdf_bytes)
-        
         # Read PDF
         reader = PdfReader(pdf_file)
+        total_pages = len(reader.pages)
         
-        # Extract text from first 3-5 pages (cover page might not have the info)
+        # Extract text page by page (cover page might not have the info)
         combined_text = ""
-        pages_to_check = min(5, len(reader.pages))
+        pages_to_check = min(MAX_METADATA_PAGES, total_pages)
+        pages_read = 0
+        scan = None
         for i in range(pages_to_check):
-            combined_text += reader.pages[i].extract_text() + "\n\n"
-        
-        # Debug: Write to a debug file
-        import sys
-        try:
-            with open('/tmp/pdf_debug.txt', 'w') as f:
-                f.write(f"Filename: {filename}\n")
-                f.write(f"Total pages: {len(reader.pages)}\n")
-                f.write(f"First 3000 chars from first {pages_to_check} pages:\n{combined_text[:3000]}\n")
-        except:
-            pass
-        
-        # Also try to get metadata
-        metadata = reader.metadata if reader.metadata else {}
-        
-        # Extract bank name from combined text
-        bank_name = extract_bank_name(combined_text, filename)
-        print(f"DEBUG: Extracted bank name: {bank_name}", file=sys.stderr)
+            combined_text += (reader.pages[i].extract_text() or "") + "\n\n"
+            pages_read = i + 1
+            if incremental:
+                scan = scan_text(combined_text)
+                if is_confident(scan):
+                    break
+        if scan is None:
+            scan = scan_text(combined_text)
         
-        # Extract form type (10-K, 10-Q, etc.)
-        form_type = extract_form_type(combined_text, filename)
+        if debug:
+            write_debug_dump(filename, total_pages, pages_read, combined_text)
         
-        # Extract year
-        year = extract_year(combined_text, filename)
+        # Bank name, form type (10-K, 10-Q, etc.) and year, falling back to the filename
+        bank_name = extract_bank_name(combined_text, filename, scan)
+        print(f"DEBUG: Extracted bank name: {bank_name} ({pages_read}/{total_pages} pages read)", file=sys.stderr)
+        form_type = extract_form_type(combined_text, filename, scan)
+        year = extract_year(combined_text, filename, scan)
         
         return {
             'success': True,
@@ -56,7 +113,9 @@ def extract_metadata(pdf_base64, filename):
             'form_type': form_type,
             'year': year,
             'filename': filename,
-            'pages': len(reader.pages)
+            'pages': total_pages,
+            'pages_read': pages_read,
+            'confident': is_confident(scan)
         }
         
     except Exception as e:
@@ -66,183 +125,267 @@ def extract_metadata(pdf_base64, filename):
             'filename': filename
         }
 
-def extract_bank_name(text, filename):
+def write_debug_dump(filename, total_pages, pages_read, text):
     """
-    Extract bank/company name from PDF text
-    Common patterns in SEC filings:
-    - Company name appears in first few lines
-    - Often in ALL CAPS
-    - May include "CORPORATION", "BANK", "FINANCIAL", etc.
+    Write the extracted text to DEBUG_DUMP_PATH for troubleshooting
+    """
+    try:
+        with open(DEBUG_DUMP_PATH, 'w') as f:
+            f.write(f"Filename: {filename}\n")
+            f.write(f"Total pages: {total_pages}\n")
+            f.write(f"First 3000 chars from first {pages_read} pages:\n{text[:3000]}\n")
+    except OSError:
+        pass
+
+# ============================================================================
+# SINGLE-PASS METADATA SCANNER
+# ============================================================================
+
+# Bank name is only looked for in the first lines of the text
+NAME_SCAN_LINES = 50
+
+# Fiscal years accepted as a filing year
+MIN_YEAR = 2020
+MAX_YEAR = 2025
+
+COMPANY_KEYWORDS = ('CORPORATION', 'BANK', 'FINANCIAL', 'CORP', 'INC', 'COMPANY', '&')
+BANK_KEYWORDS = ('CORPORATION', 'BANK', 'FINANCIAL', 'BANCORP', 'BANCSHARES',
+                 'CORP', 'INC', 'COMPANY', 'GROUP', 'HOLDING')
+COVER_PART_EXCLUDES = ('letter', 'chairman', 'officer', 'dear', 'stockholder')
+REGISTRANT_EXCLUDES = ('FORM 10', 'SECURITIES', 'COMMISSION', 'WASHINGTON', 'UNITED STATES',
+                       'PAGE', 'FOR THE', 'FISCAL YEAR')
+KEYWORD_LINE_EXCLUDES = ('SECURITIES', 'COMMISSION', 'FORM 10', 'WASHINGTON', 'PAGE')
+CAPS_LINE_EXCLUDES = ('FORM 10', 'PAGE', 'TABLE OF CONTENTS', 'SECURITIES', 'COMMISSION', 'WASHINGTON')
+
+# One alternation covering every form-type and year token, so each line is
+# scanned once. Year anchors ("fiscal year ended", "December 31", "annual
+# report", ...) mark the years on the same line as confident; "annual report"
+# also stands in for the form type on glossy covers without "10-K". The leading
+# word-boundary + first-character lookahead lets the engine skip most
+# positions without trying every alternative.
+TOKEN_RE = re.compile(r"""
+    \b(?=[fydaFYDA128])
+    (?:
+        (?P<form_prefixed>FORM\s+(?P<form_name>10-K|10-Q|8-K|20-F))
+      | (?P<form>(?:10-K|10-Q|8-K|20-F)\b)
+      | (?P<anchor>fiscal\s+year\s+ended|year\s+ended|for\s+the\b[^\d\n]*?\byear|december\s+31|(?P<annual>annual\s+report))
+      | (?P<year>20\d{2}\b)
+    )
+""", re.IGNORECASE | re.VERBOSE)
+US_PREFIX_RE = re.compile(r'^(UNITED STATES|U\.S\.|US)\s+', re.IGNORECASE)
+FILENAME_YEAR_RE = re.compile(r'20\d{2}')
+
+# Candidate scores - a higher score wins regardless of position
+NAME_SCORE_COVER = 4       # "Annual Report" cover page followed by the name
+NAME_SCORE_REGISTRANT = 3  # Line above "(Exact name of registrant ...)"
+NAME_SCORE_KEYWORD = 2     # Longest line with a bank keyword
+NAME_SCORE_CAPS = 1        # Any long ALL CAPS line
+FORM_SCORE_PREFIXED = 3    # "FORM 10-K"
+FORM_SCORE_BARE = 2        # "10-K"
+FORM_SCORE_ANNUAL = 1      # "Annual Report" (read as 10-K)
+YEAR_SCORE_ANCHORED = 2    # Year on a line with fiscal-year context
+YEAR_SCORE_BARE = 1        # Any year
+
+@lru_cache(maxsize=8)
+def scan_text(text):
     """
-    lines = text.split('\n')[:50]  # Check first 50 lines
+    Scan PDF text once and return the best bank name, form type and year
+    candidates with their scores (None / 0 when nothing was found)
     
-    # Pattern 0: Cover page format - "Annual Report\nCompany Name\nYear"
-    # Sometimes the company name is split across lines, so we need to combine them
-    for i, line in enumerate(lines):
-        if 'annual report' in line.lower():
-            # Look at the next few lines and combine them if they look like a company name
-            company_parts = []
-            for j in range(i + 1, min(i + 5, len(lines))):
-                part = lines[j].strip()
-                # Stop if we hit a year or empty line
-                if not part or part.isdigit() or (len(part) == 4 and part.startswith('20')):
-                    break
-                # Add this part if it contains company keywords or is short (likely part of name)
-                if any(kw in part.upper() for kw in ['CORPORATION', 'BANK', 'FINANCIAL', 'CORP', 'INC', 'COMPANY', '&', 'GROUP']):
-                    company_parts.append(part)
-                elif len(part) < 30 and not any(x in part.lower() for x in ['letter', 'chairman', 'officer', 'dear', 'stockholder']):
-                    company_parts.append(part)
-                else:
-                    break
-            
-            if company_parts:
-                # Combine the parts
-                full_name = ' '.join(company_parts)
-                # Verify it has company keywords
-                if any(kw in full_name.upper() for kw in ['CORPORATION', 'BANK', 'FINANCIAL', 'CORP', 'INC', 'COMPANY', '&']):
-                    return full_name
+    Results are memoized per text so the extract_* helpers can share one
+    scan; treat the returned dict as read-only.
+    """
+    # Bank name: the first candidate per pattern wins, except keyword
+    # lines where the longest wins (usually the full name)
+    names = {}
+    lines = text.split('\n', NAME_SCAN_LINES)[:NAME_SCAN_LINES]
+    for i in range(len(lines)):
+        scan_name_line(lines, i, names)
     
-    # Pattern 1: Look for "(Exact name of registrant as specified in its charter)"
-    # This is the most reliable pattern in SEC filings
-    for i, line in enumerate(lines):
-        if 'exact name of registrant' in line.lower() or 'name of registrant' in line.lower():
-            # The company name is usually 1-3 lines above this
-            for j in range(max(0, i-3), i):
-                candidate = lines[j].strip()
-                # Must be substantial length and contain bank-related keywords
-                if len(candidate) > 10 and not any(x in candidate.upper() for x in 
-                    ['FORM 10', 'SECURITIES', 'COMMISSION', 'WASHINGTON', 'UNITED STATES', 'PAGE', 'FOR THE', 'FISCAL YEAR']):
-                    # Check if it has bank-related keywords or is all caps (company names are usually all caps)
-                    if any(kw in candidate.upper() for kw in ['CORPORATION', 'BANK', 'FINANCIAL', 'CORP', 'INC', 'COMPANY', '&']) or candidate.isupper():
-                        return candidate
+    # Form type: highest score, then earliest
+    form_type, form_score = None, 0
+    # Year: highest score, then most recent
+    year, year_score = None, 0
     
-    # Pattern 2: Look for lines with CORPORATION, BANK, FINANCIAL, etc.
-    bank_keywords = ['CORPORATION', 'BANK', 'FINANCIAL', 'BANCORP', 'BANCSHARES', 
-                     'CORP', 'INC', 'COMPANY', 'GROUP', 'HOLDING']
+    # One regex pass over the whole text; years are scored per line
+    line_start, line_anchored, line_years = -1, False, []
+    for match in TOKEN_RE.finditer(text):
+        start = text.rfind('\n', 0, match.start()) + 1
+        if start != line_start:
+            year, year_score = pick_year(year, year_score, line_years, line_anchored)
+            line_start, line_anchored, line_years = start, False, []
+        
+        kind = match.lastgroup
+        if kind == 'anchor':
+            line_anchored = True
+            if match.group('annual') and form_score < FORM_SCORE_ANNUAL:
+                form_type, form_score = '10-K', FORM_SCORE_ANNUAL
+        elif kind == 'year':
+            value = int(match.group(0))
+            if MIN_YEAR <= value <= MAX_YEAR:
+                line_years.append(value)
+        elif form_score < FORM_SCORE_PREFIXED:
+            # Prefixed matches expose the bare form in 'form_name'
+            score = FORM_SCORE_PREFIXED if kind == 'form_prefixed' else FORM_SCORE_BARE
+            if score > form_score:
+                form = match.group('form_name') or match.group('form')
+                form_type, form_score = form.upper(), score
+    year, year_score = pick_year(year, year_score, line_years, line_anchored)
     
-    candidates = []
-    for line in lines:
-        line = line.strip()
-        # Skip very short lines or lines with too many special chars
-        if len(line) < 10 or line.count('•') > 2:
-            continue
-            
-        # Check if line contains bank keywords
-        upper_line = line.upper()
-        for keyword in bank_keywords:
-            if keyword in upper_line:
-                # Clean up the name
-                name = line.strip()
-                # Remove common prefixes
-                name = re.sub(r'^(UNITED STATES|U\.S\.|US)\s+', '', name, flags=re.IGNORECASE)
-                # Skip if it contains SEC-related terms
-                if any(x in name.upper() for x in ['SECURITIES', 'COMMISSION', 'FORM 10', 'WASHINGTON', 'PAGE']):
-                    continue
-                # Skip if it's just the keyword alone
-                if name.upper().strip() in bank_keywords:
-                    continue
-                candidates.append(name)
+    bank_name, name_score = None, 0
+    for score in (NAME_SCORE_COVER, NAME_SCORE_REGISTRANT, NAME_SCORE_KEYWORD, NAME_SCORE_CAPS):
+        if score in names:
+            bank_name, name_score = names[score], score
+            break
+    
+    return {
+        'bank_name': bank_name,
+        'bank_name_score': name_score,
+        'form_type': form_type,
+        'form_type_score': form_score,
+        'year': year,
+        'year_score': year_score
+    }
+
+def pick_year(year, year_score, line_years, line_anchored):
+    """
+    Merge the years found on one line into the best (year, score) so far
+    """
+    score = YEAR_SCORE_ANCHORED if line_anchored else YEAR_SCORE_BARE
+    for value in line_years:
+        if (score, value) > (year_score, year or 0):
+            year, year_score = value, score
+    return year, year_score
+
+def scan_name_line(lines, i, names):
+    """
+    Record bank name candidates found at line i into names (score -> name)
+    """
+    line = lines[i]
+    stripped = line.strip()
+    lower = stripped.lower()
+    upper = stripped.upper()
+    
+    # Pattern 0: Cover page format - "Annual Report\nCompany Name\nYear"
+    # Sometimes the company name is split across lines, so combine them
+    if NAME_SCORE_COVER not in names and 'annual report' in lower:
+        company_parts = []
+        for j in range(i + 1, min(i + 5, len(lines))):
+            part = lines[j].strip()
+            # Stop if we hit a year or empty line
+            if not part or part.isdigit() or (len(part) == 4 and part.startswith('20')):
                 break
+            # Add this part if it contains company keywords or is short (likely part of name)
+            if any(kw in part.upper() for kw in COMPANY_KEYWORDS + ('GROUP',)):
+                company_parts.append(part)
+            elif len(part) < 30 and not any(x in part.lower() for x in COVER_PART_EXCLUDES):
+                company_parts.append(part)
+            else:
+                break
+        full_name = ' '.join(company_parts)
+        if company_parts and any(kw in full_name.upper() for kw in COMPANY_KEYWORDS):
+            names[NAME_SCORE_COVER] = full_name
     
-    # Return the longest candidate (usually the full name)
-    if candidates:
-        return max(candidates, key=len)
+    # Pattern 1: "(Exact name of registrant as specified in its charter)"
+    # The company name is usually 1-3 lines above this
+    if NAME_SCORE_REGISTRANT not in names and 'name of registrant' in lower:
+        for j in range(max(0, i - 3), i):
+            candidate = lines[j].strip()
+            candidate_upper = candidate.upper()
+            if len(candidate) > 10 and not any(x in candidate_upper for x in REGISTRANT_EXCLUDES):
+                if any(kw in candidate_upper for kw in COMPANY_KEYWORDS) or candidate.isupper():
+                    names[NAME_SCORE_REGISTRANT] = candidate
+                    break
     
-    # Pattern 3: Look for specific SEC filing patterns
-    # "WEBSTER FINANCIAL CORPORATION" or similar
-    for line in lines:
-        if len(line.strip()) > 15 and line.strip().isupper():
-            # Check if it's not a header/footer
-            if not any(x in line.upper() for x in ['FORM 10', 'PAGE', 'TABLE OF CONTENTS', 'SECURITIES', 'COMMISSION', 'WASHINGTON']):
-                return line.strip()
+    # Pattern 2: Lines with CORPORATION, BANK, FINANCIAL, etc.
+    # Skip very short lines or lines with too many special chars
+    if len(stripped) >= 10 and stripped.count('•') <= 2 and any(kw in upper for kw in BANK_KEYWORDS):
+        name = US_PREFIX_RE.sub('', stripped)
+        name_upper = name.upper()
+        if (not any(x in name_upper for x in KEYWORD_LINE_EXCLUDES)
+                and name_upper.strip() not in BANK_KEYWORDS
+                and len(name) > len(names.get(NAME_SCORE_KEYWORD, ''))):
+            names[NAME_SCORE_KEYWORD] = name
     
-    # Fallback: Try to extract from filename
-    if 'webster' in filename.lower():
+    # Pattern 3: Long ALL CAPS line that is not a header/footer
+    # "WEBSTER FINANCIAL CORPORATION" or similar
+    if NAME_SCORE_CAPS not in names and len(stripped) > 15 and stripped.isupper():
+        if not any(x in upper for x in CAPS_LINE_EXCLUDES):
+            names[NAME_SCORE_CAPS] = stripped
+
+def is_confident(scan):
+    """
+    True when bank name, form type and year were all read from the text
+    itself with anchored patterns (no filename fallbacks, no bare years);
+    an "Annual Report" cover counts as the form type
+    """
+    return (scan['bank_name_score'] >= NAME_SCORE_REGISTRANT
+            and scan['form_type_score'] > 0
+            and scan['year_score'] >= YEAR_SCORE_ANCHORED)
+
+def extract_bank_name(text, filename, scan=None):
+    """
+    Extract bank/company name from PDF text
+    Common patterns in SEC filings:
+    - Company name appears in first few lines
+    - Often in ALL CAPS
+    - May include "CORPORATION", "BANK", "FINANCIAL", etc.
+    """
+    return (scan or scan_text(text))['bank_name'] or bank_name_from_filename(filename)
+
+def extract_form_type(text, filename, scan=None):
+    """
+    Extract SEC form type (10-K, 10-Q, 8-K, etc.)
+    """
+    return (scan or scan_text(text))['form_type'] or form_type_from_filename(filename)
+
+def extract_year(text, filename, scan=None):
+    """
+    Extract fiscal year from PDF
+    """
+    return (scan or scan_text(text))['year'] or year_from_filename(filename)
+
+def bank_name_from_filename(filename):
+    """
+    Fallback: Try to extract bank name from filename
+    """
+    lower = filename.lower()
+    if 'webster' in lower:
         return 'Webster Financial Corporation'
-    elif 'jpmorgan' in filename.lower() or 'jpm' in filename.lower():
+    elif 'jpmorgan' in lower or 'jpm' in lower:
         return 'JPMorgan Chase & Co.'
-    elif 'bofa' in filename.lower() or 'bank-of-america' in filename.lower():
+    elif 'bofa' in lower or 'bank-of-america' in lower:
         return 'Bank of America Corporation'
-    elif 'wells' in filename.lower():
+    elif 'wells' in lower:
         return 'Wells Fargo & Company'
-    elif 'citi' in filename.lower():
+    elif 'citi' in lower:
         return 'Citigroup Inc.'
-    elif 'usbank' in filename.lower() or 'us-bank' in filename.lower():
+    elif 'usbank' in lower or 'us-bank' in lower:
         return 'U.S. Bancorp'
     
     return 'Unknown Bank'
 
-def extract_form_type(text, filename):
+def form_type_from_filename(filename):
     """
-    Extract SEC form type (10-K, 10-Q, 8-K, etc.)
+    Fallback: Check filename for form type
     """
-    # Look for "FORM 10-K" or "10-K" in first page
-    patterns = [
-        r'FORM\s+(10-K|10-Q|8-K|20-F)',
-        r'\b(10-K|10-Q|8-K|20-F)\b',
-        r'ANNUAL REPORT.*10-K',
-        r'QUARTERLY REPORT.*10-Q'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            form = match.group(1) if match.lastindex else match.group(0)
-            # Normalize to uppercase
-            if '10-K' in form.upper():
-                return '10-K'
-            elif '10-Q' in form.upper():
-                return '10-Q'
-            elif '8-K' in form.upper():
-                return '8-K'
-            elif '20-F' in form.upper():
-                return '20-F'
-    
-    # Check filename
-    if '10-k' in filename.lower() or '10k' in filename.lower():
+    lower = filename.lower()
+    if '10-k' in lower or '10k' in lower:
         return '10-K'
-    elif '10-q' in filename.lower() or '10q' in filename.lower():
+    elif '10-q' in lower or '10q' in lower:
         return '10-Q'
-    elif 'annual' in filename.lower() or 'ar' in filename.lower():
+    elif 'annual' in lower or 'ar' in lower:
         return '10-K'
-    elif 'quarterly' in filename.lower():
+    elif 'quarterly' in lower:
         return '10-Q'
     
     return '10-K'  # Default to annual report
 
-def extract_year(text, filename):
+def year_from_filename(filename):
     """
-    Extract fiscal year from PDF
+    Fallback: Check filename for year, else current year
     """
-    # Look for year patterns in first page
-    # Common patterns: "For the fiscal year ended December 31, 2024"
-    #                  "Year Ended December 31, 2024"
-    #                  "2024 Annual Report"
-    
-    patterns = [
-        r'fiscal year ended.*?(\d{4})',
-        r'year ended.*?(\d{4})',
-        r'for the.*?year.*?(\d{4})',
-        r'december 31,?\s*(\d{4})',
-        r'(\d{4})\s+annual report',
-        r'annual report.*?(\d{4})',
-        r'\b(20\d{2})\b'  # Any year 2000-2099
-    ]
-    
-    years_found = []
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            year = int(match.group(1))
-            if 2020 <= year <= 2025:  # Reasonable range
-                years_found.append(year)
-    
-    # Return most recent year found
-    if years_found:
-        return max(years_found)
-    
-    # Check filename
-    filename_years = re.findall(r'20\d{2}', filename)
+    filename_years = FILENAME_YEAR_RE.findall(filename)
     if filename_years:
         return int(filename_years[-1])  # Take last year in filename
     
@@ -250,16 +393,52 @@ def extract_year(text, filename):
     from datetime import datetime
     return datetime.now().year
 
-if __name__ == '__main__':
-    # Read input from stdin
-    input_data = json.loads(sys.stdin.read())
-    
+def handle_request(input_data):
+    """
+    Handle one extraction request dict and return the result dict
+    """
     pdf_content = input_data.get('pdf_content')
     filename = input_data.get('filename', 'unknown.pdf')
     
     if not pdf_content:
+        return {'success': False, 'error': 'No PDF content provided', 'filename': filename}
+    
+    return extract_metadata(pdf_content, filename,
+                            incremental=input_data.get('incremental', True),
+                            debug=input_data.get('debug'))
+
+def run_worker(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Long-lived worker mode: read newline-delimited JSON requests from stdin
+    and write one JSON line per request, echoing the request 'id'.
+    Used by server.js to keep a small pool of warm extractors.
+    """
+    print(json.dumps({'ready': True}), file=stdout, flush=True)
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            input_data = json.loads(line)
+            request_id = input_data.get('id')
+            result = handle_request(input_data)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        result['id'] = request_id
+        print(json.dumps(result), file=stdout, flush=True)
+
+if __name__ == '__main__':
+    if '--worker' in sys.argv[1:]:
+        run_worker()
+        sys.exit(0)
+    
+    # Read input from stdin
+    input_data = json.loads(sys.stdin.read())
+    
+    if not input_data.get('pdf_content'):
         print(json.dumps({'success': False, 'error': 'No PDF content provided'}))
         sys.exit(1)
     
-    result = extract_metadata(pdf_content, filename)
+    result = handle_request(input_data)
     print(json.dumps(result))
@@ -2,6 +2,7 @@ const express = require('express');
 const cors = require('cors');
 const AWS = require('aws-sdk');
 const https = require('https');
+const crypto = require('crypto');
 const { spawn } = require('child_process');
 const path = require('path');
 const { verifyToken } = require('./auth-middleware');
@@ -139,6 +140,110 @@ const JOB_STATUS = {
   FAILED: 'failed'
 };
 
+// ============================================================================
+// PDF METADATA WORKER POOL
+// ============================================================================
+
+// Long-lived `extract_pdf_metadata.py --worker` processes speaking
+// newline-delimited JSON, so uploads don't pay Python startup per file
+const PDF_WORKER_POOL_SIZE = parseInt(process.env.PDF_WORKER_POOL_SIZE || '2', 10);
+const PDF_WORKER_TIMEOUT_MS = parseInt(process.env.PDF_WORKER_TIMEOUT_MS || '60000', 10);
+
+class PdfMetadataWorkerPool {
+  constructor(size) {
+    this.size = Math.max(1, size);
+    this.workers = [];
+    this.nextId = 0;
+  }
+
+  spawnWorker() {
+    const proc = spawn('python3', [path.join(__dirname, 'extract_pdf_metadata.py'), '--worker']);
+    const worker = { proc, buffer: '', pending: new Map() };
+
+    proc.stdout.on('data', (chunk) => {
+      worker.buffer += chunk.toString();
+      let newline;
+      while ((newline = worker.buffer.indexOf('\n')) >= 0) {
+        const line = worker.buffer.slice(0, newline);
+        worker.buffer = worker.buffer.slice(newline + 1);
+        this.handleLine(worker, line);
+      }
+    });
+    proc.stderr.on('data', (d) => logger.debug('[pdf-worker]', d.toString().trim()));
+    proc.stdin.on('error', (err) => logger.warn('[pdf-worker] stdin error:', err.message));
+    // 'exit' is not guaranteed after a spawn error, so retire on either
+    proc.on('error', (err) => {
+      logger.error('[pdf-worker] spawn error:', err.message);
+      this.retire(worker, `PDF worker failed: ${err.message}`);
+    });
+    proc.on('exit', (code) => {
+      logger.warn(`[pdf-worker] pid ${proc.pid} exited with code ${code}`);
+      this.retire(worker, `PDF worker exited with code ${code}`);
+    });
+
+    this.workers.push(worker);
+    return worker;
+  }
+
+  // Drop a dead worker from the pool and fail its in-flight requests
+  retire(worker, reason) {
+    this.workers = this.workers.filter(w => w !== worker);
+    for (const { reject, timer } of worker.pending.values()) {
+      clearTimeout(timer);
+      reject(new Error(reason));
+    }
+    worker.pending.clear();
+  }
+
+  handleLine(worker, line) {
+    if (!line.trim()) return;
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      logger.warn('[pdf-worker] Unparseable output:', line.substring(0, 200));
+      return;
+    }
+    if (message.ready) return;
+
+    const request = worker.pending.get(message.id);
+    if (!request) return;
+    worker.pending.delete(message.id);
+    clearTimeout(request.timer);
+    request.resolve(message);
+  }
+
+  // Pick the least busy worker, spawning up to the pool size on demand
+  acquire() {
+    if (this.workers.length < this.size) {
+      return this.spawnWorker();
+    }
+    return this.workers.reduce((a, b) => (b.pending.size < a.pending.size ? b : a));
+  }
+
+  extract(pdfContent, filename) {
+    const worker = this.acquire();
+    const id = ++this.nextId;
+
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        worker.pending.delete(id);
+        reject(new Error(`PDF metadata extraction timed out after ${PDF_WORKER_TIMEOUT_MS}ms`));
+        worker.proc.kill(); // Stuck worker - replaced on next acquire
+      }, PDF_WORKER_TIMEOUT_MS);
+
+      worker.pending.set(id, { resolve, reject, timer });
+      worker.proc.stdin.write(JSON.stringify({ id, pdf_content: pdfContent, filename }) + '\n');
+    });
+  }
+}
+
+const pdfMetadataPool = new PdfMetadataWorkerPool(PDF_WORKER_POOL_SIZE);
+
+// Large uploads are split into parts sent concurrently
+const S3_UPLOAD_PART_SIZE = parseInt(process.env.S3_UPLOAD_PART_SIZE || String(8 * 1024 * 1024), 10);
+const S3_UPLOAD_CONCURRENCY = parseInt(process.env.S3_UPLOAD_CONCURRENCY || '4', 10);
+
 // Health check
 app.get('/health', (req, res) => {
   res.json({ status: 'healthy', service: 'BankIQ+ Backend' });
@@ -426,6 +531,108 @@ async function invokeAgent(req, res) {
   }
 }
 
+// Streaming agent invocation (protected)
+// Relays the runtime's SSE events ({chunk}, {done, output}, {error}) as they arrive
+// so the first tokens reach the browser while tools are still generating
+app.post('/api/invoke-agent-stream', verifyToken, async (req, res) => {
+  const { inputText, sessionId, tool, args } = req.body;
+
+  if (!inputText && !tool) {
+    return res.status(400).json({ error: 'Missing inputText or tool' });
+  }
+
+  logger.info(`Invoking agent (streaming): ${tool ? `tool:${tool}` : inputText.substring(0, 100)}...`);
+
+  try {
+    const agentRuntimeArn = process.env.AGENTCORE_AGENT_ARN; if (!agentRuntimeArn) throw new Error("AGENTCORE_AGENT_ARN not set");
+    const region = agentRuntimeArn.split(':')[3] || 'us-east-1';
+    const runtimeSessionId = sessionId || `session-${Date.now()}-${Math.random().toString(36).substring(2)}-${Math.random().toString(36).substring(2)}`;
+
+    const payload = JSON.stringify(tool ? { tool, args: args || {}, stream: true } : { prompt: inputText, stream: true });
+    const host = `bedrock-agentcore.${region}.amazonaws.com`;
+    const path = `/runtimes/${encodeURIComponent(agentRuntimeArn)}/invocations`;
+
+    await new Promise((resolve, reject) => {
+      AWS.config.getCredentials((err) => err ? reject(err) : resolve());
+    });
+
+    const endpoint = new AWS.Endpoint(host);
+    const request = new AWS.HttpRequest(endpoint, region);
+
+    request.method = 'POST';
+    request.path = path;
+    request.headers['Host'] = host;
+    request.headers['Content-Type'] = 'application/json';
+    request.headers['Accept'] = 'text/event-stream';
+    request.headers['X-Amzn-Bedrock-AgentCore-Runtime-Session-Id'] = runtimeSessionId;
+    request.body = payload;
+
+    const signer = new AWS.Signers.V4(request, 'bedrock-agentcore');
+    signer.addAuthorization(AWS.config.credentials, new Date());
+
+    const requestStartTime = Date.now();
+    const upstream = https.request({
+      hostname: host,
+      path: request.path,
+      method: request.method,
+      headers: request.headers
+    }, (agentRes) => {
+      if (agentRes.statusCode < 200 || agentRes.statusCode >= 300) {
+        let data = '';
+        agentRes.on('data', (chunk) => { data += chunk; });
+        agentRes.on('end', () => {
+          logger.error(`AgentCore returned error ${agentRes.statusCode}: ${data}`);
+          res.status(502).json({ error: `HTTP ${agentRes.statusCode}: ${data}` });
+        });
+        return;
+      }
+
+      res.writeHead(200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no'
+      });
+
+      let firstChunk = true;
+      agentRes.on('data', (chunk) => {
+        if (firstChunk) {
+          logger.info(`AgentCore first chunk in ${Date.now() - requestStartTime}ms`);
+          firstChunk = false;
+        }
+        res.write(chunk);
+      });
+      agentRes.on('end', () => {
+        logger.info(`AgentCore stream finished in ${Date.now() - requestStartTime}ms`);
+        res.end();
+      });
+    });
+
+    upstream.on('error', (err) => {
+      logger.error('HTTPS request error:', err);
+      if (!res.headersSent) {
+        res.status(500).json({ error: err.message });
+      } else {
+        res.write(`data: ${JSON.stringify({ error: err.message })}\n\n`);
+        res.end();
+      }
+    });
+
+    // Stop the agent run if the browser goes away
+    res.on('close', () => upstream.destroy());
+
+    upstream.write(payload);
+    upstream.end();
+  } catch (error) {
+    logger.error('Agent streaming error:', { message: error.message, name: error.name });
+    res.status(500).json({
+      error: error.message,
+      code: error.code || 'Unknown',
+      timestamp: new Date().toISOString()
+    });
+  }
+});
+
 // Store CSV data endpoint (for local mode)
 app.post('/api/store-csv-data', (req, res) => {
   const { data, filename } = req.body;
@@ -571,63 +778,30 @@ app.post('/api/upload-pdf', async (req, res) => {
       // Step 1: Extract metadata using PyPDF2
       console.log(`[${new Date().toISOString()}] Extracting metadata from ${file.name}...`);
 
-      const extractPython = spawn('python3', [path.join(__dirname, 'extract_pdf_metadata.py')]);
-
-      let extractOutput = '';
-      let extractError = '';
-
-      await new Promise((resolve, reject) => {
-        extractPython.stdout.on('data', (d) => { extractOutput += d.toString(); });
-        extractPython.stderr.on('data', (d) => { extractError += d.toString(); });
-
-        extractPython.stdin.write(JSON.stringify({
-          pdf_content: file.content,
-          filename: file.name
-        }));
-        extractPython.stdin.end();
-
-        extractPython.on('close', (code) => {
-          if (extractError) {
-            console.log(`[${new Date().toISOString()}] Python stderr:`, extractError);
-          }
-          if (code !== 0) {
-            console.error('Metadata extraction error:', extractError);
-            resolve(); // Don't fail, use fallback
-          } else {
-            resolve();
-          }
-        });
-      });
+      let extracted = null;
+      try {
+        extracted = await pdfMetadataPool.extract(file.content, file.name);
+        console.log(`[${new Date().toISOString()}] Parsed extraction result:`, JSON.stringify(extracted));
+      } catch (e) {
+        console.error(`[${new Date().toISOString()}] ❌ Metadata extraction error:`, e.message);
+      }
 
-      // Parse extracted metadata
+      // Parse extracted metadata (fall back to defaults on failure)
       let metadata = {
         bank_name: bankName || 'Unknown Bank',
         form_type: '10-K',
         year: new Date().getFullYear()
       };
 
-      console.log(`[${new Date().toISOString()}] Raw extraction output:`, extractOutput.substring(0, 200));
-      if (extractError) {
-        console.error(`[${new Date().toISOString()}] Extraction stderr:`, extractError);
-      }
-
-      try {
-        const extracted = JSON.parse(extractOutput);
-        console.log(`[${new Date().toISOString()}] Parsed extraction result:`, JSON.stringify(extracted));
-
-        if (extracted.success) {
-          metadata = {
-            bank_name: extracted.bank_name,
-            form_type: extracted.form_type,
-            year: extracted.year
-          };
-          console.log(`[${new Date().toISOString()}] ✅ Extracted: ${metadata.bank_name} ${metadata.form_type} ${metadata.year}`);
-        } else {
-          console.error(`[${new Date().toISOString()}] ❌ Extraction failed:`, extracted.error);
-        }
-      } catch (e) {
-        console.error(`[${new Date().toISOString()}] ❌ Failed to parse metadata:`, e.message);
-        console.error(`[${new Date().toISOString()}] Raw output was:`, extractOutput);
+      if (extracted && extracted.success) {
+        metadata = {
+          bank_name: extracted.bank_name,
+          form_type: extracted.form_type,
+          year: extracted.year
+        };
+        console.log(`[${new Date().toISOString()}] ✅ Extracted: ${metadata.bank_name} ${metadata.form_type} ${metadata.year}`);
+      } else if (extracted) {
+        console.error(`[${new Date().toISOString()}] ❌ Extraction failed:`, extracted.error);
       }
 
       // Step 2: Upload to S3
@@ -643,7 +817,8 @@ app.post('/api/upload-pdf', async (req, res) => {
         // Decode base64 and upload
         const pdfBuffer = Buffer.from(file.content, 'base64');
 
-        await s3.putObject({
+        // Managed upload: concurrent multipart above one part, per-part retries
+        await s3.upload({
           Bucket: process.env.UPLOADED_DOCS_BUCKET || 'bankiq-uploaded-docs-prod',
           Key: s3Key,
           Body: pdfBuffer,
@@ -654,6 +829,11 @@ app.post('/api/upload-pdf', async (req, res) => {
             'year': metadata.year.toString(),
             'original-filename': file.name
           }
+        }, {
+          partSize: S3_UPLOAD_PART_SIZE,
+          queueSize: S3_UPLOAD_CONCURRENCY
+        }).on('httpUploadProgress', (progress) => {
+          logger.debug(`S3 upload ${s3Key}: ${progress.loaded}/${progress.total || pdfBuffer.length} bytes`);
         }).promise();
 
         console.log(`[${new Date().toISOString()}] ✅ Uploaded to S3: ${s3Key}`);
@@ -682,6 +862,37 @@ app.post('/api/upload-pdf', async (req, res) => {
   }
 });
 
+// Run one tool as a job and wait for it - no model turn picks the tool or
+// copies its output; returns the tool's parsed JSON result
+async function runToolJob(tool, args, jobType) {
+  const jobId = `job-${Date.now()}-${Math.random().toString(36).substring(2, 10)}`;
+
+  jobs.set(jobId, {
+    jobId,
+    status: JOB_STATUS.PENDING,
+    inputText: `tool:${tool}`,
+    tool,
+    args,
+    jobType,
+    createdAt: new Date().toISOString(),
+    updatedAt: new Date().toISOString()
+  });
+
+  await processJob(jobId);
+
+  const job = jobs.get(jobId);
+
+  if (job.status !== JOB_STATUS.COMPLETED) {
+    throw new Error(job.error || 'Agent processing failed');
+  }
+
+  const output = JSON.parse(job.result);
+  if (!output.success) {
+    throw new Error(output.error || `${tool} failed`);
+  }
+  return output;
+}
+
 // Agent-powered PDF upload endpoint (uses Claude for intelligent analysis)
 app.post('/api/upload-pdf-agent', async (req, res) => {
   const { files, bankName } = req.body;
@@ -696,61 +907,16 @@ app.post('/api/upload-pdf-agent', async (req, res) => {
     const documents = [];
 
     for (const file of files) {
-      // Use the agent's analyze_and_upload_pdf tool
-      const prompt = `Use the analyze_and_upload_pdf tool to analyze and upload this PDF document.
-
-File name: ${file.name}
-File content: ${file.content}
-
-Call analyze_and_upload_pdf with:
-- file_content: "${file.content}"
-- filename: "${file.name}"
-
-Return the exact JSON output from the tool.`;
-
-      // Submit as async job
-      const jobId = `job-${Date.now()}-${Math.random().toString(36).substring(2, 10)}`;
-
-      jobs.set(jobId, {
-        jobId,
-        status: JOB_STATUS.PENDING,
-        inputText: prompt,
-        jobType: 'pdf-upload',
-        createdAt: new Date().toISOString(),
-        updatedAt: new Date().toISOString()
+      const docInfo = await runToolJob('analyze_and_upload_pdf', { file_content: file.content, filename: file.name }, 'pdf-upload');
+      documents.push({
+        bank_name: docInfo.bank_name,
+        form_type: docInfo.form_type,
+        year: docInfo.year,
+        filename: docInfo.filename,
+        size: docInfo.size,
+        s3_key: docInfo.s3_key
       });
-
-      // Process job
-      await processJob(jobId);
-
-      const job = jobs.get(jobId);
-
-      if (job.status === JOB_STATUS.COMPLETED) {
-        // Parse the agent's response
-        try {
-          const jsonMatch = job.result.match(/\{[^]*?"success"\s*:\s*true[^]*?\}/);
-          if (jsonMatch) {
-            const docInfo = JSON.parse(jsonMatch[0]);
-            documents.push({
-              bank_name: docInfo.bank_name,
-              form_type: docInfo.form_type,
-              year: docInfo.year,
-              filename: docInfo.filename,
-              size: docInfo.size,
-              s3_key: docInfo.s3_key
-            });
-            logger.info(`✅ Uploaded via agent: ${docInfo.bank_name} ${docInfo.form_type} ${docInfo.year}`);
-          } else {
-            throw new Error('Could not parse agent response');
-          }
-        } catch (parseError) {
-          logger.error(`Failed to parse agent response for ${file.name}:`, parseError.message);
-          // Fallback to old method for this file
-          throw parseError;
-        }
-      } else {
-        throw new Error(job.error || 'Agent processing failed');
-      }
+      logger.info(`✅ Uploaded via agent: ${docInfo.bank_name} ${docInfo.form_type} ${docInfo.year}`);
     }
 
     logger.info(`Successfully processed ${documents.length} document(s) via agent`);
@@ -767,6 +933,80 @@ Return the exact JSON output from the tool.`;
   }
 });
 
+// Presigned upload URL endpoint (client uploads PDFs straight to S3)
+app.post('/api/upload-url', verifyToken, async (req, res) => {
+  const { filename } = req.body;
+
+  if (!filename) {
+    return res.status(400).json({ error: 'No filename provided' });
+  }
+
+  try {
+    const s3 = new AWS.S3({ signatureVersion: 'v4' });
+    const docId = crypto.randomUUID();
+    const s3Key = `uploads/${docId}/${path.basename(filename)}`;
+    const expiresIn = parseInt(process.env.PRESIGNED_UPLOAD_EXPIRES || '900', 10);
+
+    const uploadUrl = await s3.getSignedUrlPromise('putObject', {
+      Bucket: process.env.UPLOADED_DOCS_BUCKET || 'bankiq-uploaded-docs-prod',
+      Key: s3Key,
+      ContentType: 'application/pdf',
+      Expires: expiresIn
+    });
+
+    logger.info(`Issued upload URL for ${s3Key}`);
+    res.json({ success: true, upload_url: uploadUrl, s3_key: s3Key, doc_id: docId, expires_in: expiresIn });
+  } catch (error) {
+    logger.error('Upload URL error:', error.message);
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Staging keys issued by /api/upload-url: uploads/<uuid4>/<file name>
+const STAGED_UPLOAD_KEY = /^uploads\/[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}\/[^/]+$/;
+
+// Register PDFs uploaded by reference - the agent only receives the S3 key
+app.post('/api/upload-pdf-ref', verifyToken, async (req, res) => {
+  const { documents: uploaded } = req.body;
+
+  if (!Array.isArray(uploaded) || uploaded.length === 0) {
+    return res.status(400).json({ error: 'No documents provided' });
+  }
+  for (const doc of uploaded) {
+    if (typeof doc.s3_key !== 'string' || !STAGED_UPLOAD_KEY.test(doc.s3_key)) {
+      return res.status(400).json({ error: `Invalid s3_key: ${doc.s3_key}` });
+    }
+    if (doc.filename !== undefined && (typeof doc.filename !== 'string' || doc.filename !== path.basename(doc.filename) || /["\\\n\r]/.test(doc.filename))) {
+      return res.status(400).json({ error: `Invalid filename: ${doc.filename}` });
+    }
+  }
+
+  try {
+    logger.info(`Registering ${uploaded.length} PDF(s) uploaded by reference...`);
+
+    const documents = [];
+
+    for (const doc of uploaded) {
+      const docInfo = await runToolJob('register_uploaded_pdf', { s3_key: doc.s3_key, filename: doc.filename || '' }, 'pdf-upload');
+      documents.push({
+        bank_name: docInfo.bank_name,
+        form_type: docInfo.form_type,
+        year: docInfo.year,
+        filename: docInfo.filename,
+        size: docInfo.size,
+        s3_key: docInfo.s3_key
+      });
+      logger.info(`✅ Registered by reference: ${docInfo.bank_name} ${docInfo.form_type} ${docInfo.year}`);
+    }
+
+    res.json({ success: true, documents, method: 'reference' });
+
+  } catch (error) {
+    logger.error('Upload-by-reference error:', error.message);
+    res.status(500).json({ error: error.message });
+  }
+});
+
 // Direct SEC filings endpoint (bypasses agent for faster results)
 app.post('/api/get-sec-filings', async (req, res) => {
   const { bankName, cik } = req.body;
@@ -964,10 +1204,12 @@ app.post('/api/search-banks', async (req, res) => {
 
 // Async job submission endpoint (auth handled by frontend)
 app.post('/api/jobs/submit', async (req, res) => {
-  const { inputText, sessionId, jobType } = req.body;
+  // Either a free-text prompt for the agent, or a structured { tool, args }
+  // request that the agent runtime dispatches straight to the tool
+  const { inputText, sessionId, jobType, tool, args } = req.body;
 
-  if (!inputText) {
-    return res.status(400).json({ error: 'Missing inputText' });
+  if (!inputText && !tool) {
+    return res.status(400).json({ error: 'Missing inputText or tool' });
   }
 
   // Generate job ID
@@ -977,14 +1219,16 @@ app.post('/api/jobs/submit', async (req, res) => {
   jobs.set(jobId, {
     jobId,
     status: JOB_STATUS.PENDING,
-    inputText,
+    inputText: inputText || `tool:${tool}`,
+    tool,
+    args: args || {},
     sessionId,
     jobType: jobType || 'agent-invocation',
     createdAt: new Date().toISOString(),
     updatedAt: new Date().toISOString()
   });
 
-  console.log(`[${new Date().toISOString()}] Job ${jobId} created: ${inputText.substring(0, 100)}...`);
+  console.log(`[${new Date().toISOString()}] Job ${jobId} created: ${(inputText || `tool:${tool}`).substring(0, 100)}...`);
 
   // Start processing asynchronously (don't await)
   processJob(jobId).catch(err => {
@@ -1057,6 +1301,7 @@ app.get('/api/jobs/:jobId/result', (req, res) => {
     jobId: job.jobId,
     status: job.status,
     result: job.result,
+    artifacts: job.artifacts || [],
     sessionId: job.sessionId,
     createdAt: job.createdAt,
     completedAt: job.updatedAt
@@ -1085,7 +1330,7 @@ async function processJob(jobId) {
     const region = agentRuntimeArn.split(':')[3] || 'us-east-1';
     const runtimeSessionId = job.sessionId || `session-${Date.now()}-${Math.random().toString(36).substring(2)}-${Math.random().toString(36).substring(2)}`;
 
-    const payload = JSON.stringify({ prompt: job.inputText });
+    const payload = JSON.stringify(job.tool ? { tool: job.tool, args: job.args } : { prompt: job.inputText });
     const host = `bedrock-agentcore.${region}.amazonaws.com`;
     const path = `/runtimes/${encodeURIComponent(agentRuntimeArn)}/invocations`;
 
@@ -1167,9 +1412,11 @@ async function processJob(jobId) {
       output = result.analysis || result.text || result.content || 'No response available';
     }
 
-    // Update job with result
+    // Update job with result (structured tool data such as chart points
+    // arrives as artifacts beside the text)
     job.status = JOB_STATUS.COMPLETED;
     job.result = output;
+    job.artifacts = Array.isArray(result.artifacts) ? result.artifacts : [];
     job.sessionId = runtimeSessionId;
     job.updatedAt = new Date().toISOString();
 
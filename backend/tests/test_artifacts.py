@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strands import tool
+
+import bank_iq_agent_v1_fixed as agent
+
+RESULT = {
+    "data": [
+        {"Bank": "JPMorgan", "Quarter": "2024-Q1", "Metric": "ROA", "Value": 1.1},
+        {"Bank": "BofA", "Quarter": "2024-Q1", "Metric": "ROA", "Value": 0.8},
+        {"Bank": "JPMorgan", "Quarter": "2024-Q2", "Metric": "ROA", "Value": 1.3},
+        {"Bank": "BofA", "Quarter": "2024-Q2", "Metric": "ROA", "Value": 0.9},
+    ],
+    "base_bank": "JPMorgan",
+    "peer_banks": ["BofA"],
+    "analysis": "JPMorgan leads on ROA.",
+    "source": "FDIC",
+}
+
+
+def collect_artifacts(call):
+    """Run call() with an artifact sink; returns (output, artifacts)."""
+    artifacts = []
+
+    def run():
+        agent.artifact_sink.set(artifacts.append)
+        return call()
+
+    return contextvars.copy_context().run(run), artifacts
+
+
+def test_without_a_sink_the_full_result_is_inline():
+    assert json.loads(agent.peer_analysis_result(RESULT)) == RESULT
+
+
+def test_with_a_sink_the_model_only_gets_a_summary():
+    output, artifacts = collect_artifacts(lambda: agent.peer_analysis_result(RESULT))
+    summary = json.loads(output)
+
+    assert len(artifacts) == 1
+    assert artifacts[0]["type"] == "peer_comparison"
+    assert artifacts[0]["data"] == RESULT
+    assert summary["artifact_id"] == artifacts[0]["id"]
+    assert "data" not in summary
+    assert summary["data_points"] == 4
+    assert summary["period"] == "2024-Q1 to 2024-Q2"
+    assert summary["latest_values"] == {"JPMorgan": 1.3, "BofA": 0.9}
+    assert summary["analysis"] == RESULT["analysis"]
+
+
+def test_summary_of_empty_data_has_no_period():
+    empty = dict(RESULT, data=[])
+    output, _ = collect_artifacts(lambda: agent.peer_analysis_result(empty))
+
+    assert json.loads(output)["period"] == ""
+
+
+def test_invoke_returns_artifacts_beside_the_output(monkeypatch):
+    @tool
+    def fake_peers() -> str:
+        """Peer comparison stub."""
+        return agent.peer_analysis_result(RESULT)
+
+    monkeypatch.setitem(agent.fast_path_tools, "fake_peers", fake_peers)
+
+    response = asyncio.run(agent.invoke({"tool": "fake_peers", "args": {}}, None))
+
+    assert response["artifacts"][0]["data"] == RESULT
+    assert json.loads(response["output"])["artifact_id"] == response["artifacts"][0]["id"]
+    assert agent.artifact_sink.get() is None
@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_reports
+import bank_iq_agent_v1_fixed as agent
+
+
+class Paginator:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def paginate(self, Bucket, Prefix):
+        return self.pages
+
+
+class ListingS3:
+    """Stub S3 client with a fixed listing that records puts."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.puts = []
+
+    def get_paginator(self, name):
+        return Paginator([{'Contents': [{'Key': key} for key in self.keys]}])
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.puts.append((Bucket, Key))
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Fake report generation; records each call, fails banks listed in 'incomplete'."""
+    calls = {'banks': [], 'incomplete': set()}
+
+    def fake_generate_report(bank_name, context, source):
+        calls['banks'].append(bank_name)
+        return f"report for {bank_name}", bank_name not in calls['incomplete']
+
+    monkeypatch.setattr(agent, 'generate_report', fake_generate_report)
+    monkeypatch.setattr(agent, 'put_cached_report', lambda bank, report: None)
+    monkeypatch.setattr(batch_reports.time, 'sleep', lambda seconds: None)
+    return calls
+
+
+def test_read_bank_list_skips_comments_blanks_and_duplicates(tmp_path):
+    path = tmp_path / 'banks.txt'
+    path.write_text("# Q1 batch\nJPMorgan\n\nWebster\nJPMorgan\n  BofA  \n")
+
+    assert batch_reports.read_bank_list(str(path)) == ['JPMorgan', 'Webster', 'BofA']
+
+
+def test_checkpoint_names_are_unique_and_filesystem_safe():
+    first = batch_reports.checkpoint_name('U.S. Bancorp')
+    second = batch_reports.checkpoint_name('US Bancorp')
+
+    assert first != second
+    assert first.startswith('u-s-bancorp-') and first.endswith('.json')
+    assert '/' not in batch_reports.checkpoint_name('A/B Bank')
+
+
+def test_run_batch_checkpoints_each_report(tmp_path, generated):
+    checkpoint = batch_reports.LocalCheckpoint(str(tmp_path))
+
+    completed, failed = batch_reports.run_batch(['JPMorgan', 'Webster'], checkpoint, 2)
+
+    assert sorted(completed) == ['JPMorgan', 'Webster']
+    assert failed == []
+    with open(tmp_path / batch_reports.checkpoint_name('Webster')) as f:
+        entry = json.load(f)
+    assert entry['report'] == 'report for Webster'
+    assert entry['prompt_version'] == agent.REPORT_PROMPT_VERSION
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
+
+
+def test_rerun_resumes_after_checkpointed_banks(tmp_path, generated):
+    checkpoint = batch_reports.LocalCheckpoint(str(tmp_path))
+    batch_reports.run_batch(['JPMorgan'], checkpoint, 1)
+    generated['banks'].clear()
+
+    completed, _ = batch_reports.run_batch(['JPMorgan', 'Webster'], checkpoint, 1)
+
+    assert completed == ['Webster']
+    assert generated['banks'] == ['Webster']
+
+
+def test_incomplete_reports_are_retried_then_not_checkpointed(tmp_path, generated, monkeypatch):
+    monkeypatch.setattr(batch_reports, 'BATCH_MAX_ATTEMPTS', 3)
+    generated['incomplete'].add('Webster')
+    checkpoint = batch_reports.LocalCheckpoint(str(tmp_path))
+
+    completed, failed = batch_reports.run_batch(['Webster'], checkpoint, 1)
+
+    assert (completed, failed) == ([], ['Webster'])
+    assert generated['banks'] == ['Webster'] * 3
+    assert not checkpoint.exists(batch_reports.checkpoint_name('Webster'))
+
+
+def test_s3_checkpoint_lists_existing_reports_under_prefix(monkeypatch, generated):
+    done = batch_reports.checkpoint_name('JPMorgan')
+    s3 = ListingS3([f'reports/q1/{done}'])
+    monkeypatch.setattr(agent, 's3', s3)
+
+    checkpoint = batch_reports.open_checkpoint('s3://bucket/reports/q1')
+    completed, _ = batch_reports.run_batch(['JPMorgan', 'Webster'], checkpoint, 1)
+
+    assert checkpoint.exists(done)
+    assert completed == ['Webster']
+    assert s3.puts == [('bucket', f"reports/q1/{batch_reports.checkpoint_name('Webster')}")]
@@ -0,0 +1,88 @@
+import gc
+import os
+import sys
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bank_iq_agent_v1_fixed as agent
+
+EVENTS = [{'contentBlockDelta': {'delta': {'text': 'a'}}}, {'contentBlockDelta': {'delta': {'text': 'b'}}}]
+
+
+class RawBedrock:
+    """Stub bedrock-runtime client returning canned responses."""
+
+    def converse(self, **kwargs):
+        return {'output': {'message': {'content': [{'text': 'ok'}]}}}
+
+    def converse_stream(self, **kwargs):
+        return {'stream': iter(EVENTS)}
+
+
+def free_slots(client):
+    return client.slots._value
+
+
+def test_drained_streams_release_their_slot():
+    client = agent.LimitedBedrockClient(RawBedrock(), 1)
+    stream = client.converse_stream()['stream']
+
+    assert free_slots(client) == 0
+    assert len(list(stream)) == 2
+    assert free_slots(client) == 1
+    stream.close()
+    assert free_slots(client) == 1
+
+
+def test_context_manager_releases_a_partly_read_stream():
+    client = agent.LimitedBedrockClient(RawBedrock(), 1)
+
+    with client.converse_stream()['stream'] as stream:
+        next(stream)
+        assert free_slots(client) == 0
+
+    assert stream.released
+    assert free_slots(client) == 1
+
+
+def test_leaked_stream_releases_its_slot_when_collected():
+    client = agent.LimitedBedrockClient(RawBedrock(), 1, slot_timeout=5)
+    response = client.converse_stream()
+    response['self'] = response  # a reference cycle keeps it alive until gc runs
+    del response
+
+    assert free_slots(client) == 0
+    gc.collect()
+    assert free_slots(client) == 1
+    assert client.converse()['output']['message']['content'][0]['text'] == 'ok'
+
+
+def test_full_slots_time_out_as_throttling():
+    client = agent.LimitedBedrockClient(RawBedrock(), 1, slot_timeout=0.05)
+    held = client.converse_stream()['stream']
+
+    with pytest.raises(ClientError) as raised:
+        client.converse()
+    assert raised.value.response['Error']['Code'] == 'ThrottlingException'
+    assert raised.value.response['Error']['Code'] in agent.FALLBACK_ERROR_CODES
+
+    held.close()
+    assert client.converse()['output']['message']['content'][0]['text'] == 'ok'
+
+
+def test_waiters_get_the_slot_when_it_frees_up():
+    client = agent.LimitedBedrockClient(RawBedrock(), 1, slot_timeout=5)
+    held = client.converse_stream()['stream']
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(client.converse()))
+    waiter.start()
+
+    list(held)
+    waiter.join(5)
+
+    assert len(results) == 1
+    assert free_slots(client) == 1
@@ -0,0 +1,70 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bank_iq_agent_v1_fixed as agent
+
+NOTES = """### Part 1 (pages 1-20)
+- Net interest margin widened to 3.4% on higher loan yields
+- The company opened a new headquarters building
+### Part 2 (pages 21-40)
+- CET1 capital ratio of 11.2% and liquidity coverage ratio of 115%
+- Credit risk: net charge-offs rose to 0.6% of loans
+- Digital transformation spending grew 12%"""
+
+
+def test_relevant_context_prefers_lines_on_the_topic():
+    context = agent.relevant_context(NOTES, "Capital Position & Liquidity: capital ratios, liquidity coverage", 20)
+
+    assert "CET1 capital ratio" in context
+    assert "headquarters" not in context
+    assert context.startswith("### Part 2")
+
+
+def test_relevant_context_keeps_document_order_and_headings():
+    context = agent.relevant_context(NOTES, "net interest margin and credit risk charge-offs", 1000)
+    lines = context.split('\n')
+
+    assert lines == NOTES.split('\n')
+
+
+def test_relevant_context_respects_the_budget():
+    notes = '\n'.join(f"- capital item {n}" for n in range(1000))
+    context = agent.relevant_context(notes, "capital", 100)
+
+    assert len(context) <= agent.budget_chars(100)
+
+
+def test_relevant_context_falls_back_to_a_head_excerpt_for_long_lines():
+    text = "capital " * 1000
+    assert agent.relevant_context(text, "capital", 50) == agent.fit_context(text, 50)
+
+
+def test_report_sections_share_one_report_budget():
+    per_section = agent.report_section_budget()
+
+    assert per_section * len(agent.REPORT_SECTIONS) <= agent.CONTEXT_BUDGETS["report"]
+    assert per_section <= agent.CONTEXT_BUDGETS["report_section"]
+
+
+def test_comprehensive_analysis_stays_within_the_report_budget(monkeypatch):
+    notes = '\n'.join(
+        f"### Part {part}\n" + '\n'.join(f"- capital liquidity credit revenue digital market note {part}.{n}" for n in range(200))
+        for part in range(1, 11)
+    )
+    prompts = []
+
+    def fake_generate_report(bank_name, context, source, section_contexts=None):
+        prompts.extend(section_contexts)
+        return "report", True
+
+    monkeypatch.setattr(agent, 'MAP_REDUCE_ANALYSIS', True)
+    monkeypatch.setattr(agent, 'extract_document_text', lambda *args: notes)
+    monkeypatch.setattr(agent, 'document_notes', lambda bucket, key, text, prefix: (text, True))
+    monkeypatch.setattr(agent, 'generate_report', fake_generate_report)
+
+    assert agent.analyze_uploaded_pdf(s3_key="uploads/k/doc.pdf", bank_name="X Bank") == "report"
+    assert len(prompts) == len(agent.REPORT_SECTIONS)
+    total = sum(agent.estimate_tokens(prompt) for prompt in prompts)
+    assert total <= agent.CONTEXT_BUDGETS["report"] + 100 * len(prompts)
@@ -0,0 +1,104 @@
+import contextvars
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bank_iq_agent_v1_fixed as agent
+
+
+def pages(count, chars):
+    return ''.join(f"\n--- Page {n} ---\n" + 'x' * chars for n in range(1, count + 1))
+
+
+def in_session(session_id, call):
+    def run():
+        agent.current_session.set(session_id)
+        return call()
+    return contextvars.copy_context().run(run)
+
+
+@pytest.fixture
+def converse(monkeypatch):
+    """Fake chunk_notes model; records each prompt."""
+    prompts = []
+
+    def fake_converse_routed(task, messages, inferenceConfig):
+        prompts.append(messages[0]['content'][0]['text'])
+        return {'output': {'message': {'content': [{'text': f"notes {len(prompts)}"}]}}}
+
+    monkeypatch.setattr(agent, 'converse_routed', fake_converse_routed)
+    monkeypatch.setattr(agent, 'session_store', agent.SessionStore(3600, 10 * 1024 * 1024))
+    monkeypatch.setattr(agent, 'MAP_CHUNK_CHARS', 250)
+    return prompts
+
+
+def test_chunks_break_between_pages():
+    text = pages(6, 100)
+    chunks = agent.chunk_document(text, 250)
+
+    assert ''.join(chunks) == text
+    assert all(chunk.startswith('\n--- Page ') for chunk in chunks)
+    assert [agent.chunk_pages(chunk) for chunk in chunks] == ['pages 1-2', 'pages 3-4', 'pages 5-6']
+
+
+def test_oversized_page_is_split_on_characters():
+    text = pages(1, 1000)
+    chunks = agent.chunk_document(text, 200)
+
+    assert ''.join(chunks) == text
+    assert max(len(chunk) for chunk in chunks) <= 400
+
+
+def test_text_without_page_markers_is_one_chunk():
+    assert agent.chunk_document('short text', 250) == ['short text']
+
+
+def test_single_chunk_documents_skip_the_map_step(converse):
+    notes, complete = agent.document_notes('bucket', 'uploads/x/doc.pdf', 'short text', 'test')
+
+    assert (notes, complete) == ('short text', True)
+    assert converse == []
+
+
+def test_notes_for_uuid_uploads_are_reused_within_a_session(converse):
+    text = pages(6, 100)
+    key = 'uploads/6f1c2d3e-1111-4222-8333-123456789abc/doc.pdf'
+
+    first, complete = in_session('s1', lambda: agent.document_notes('bucket', key, text, 'test'))
+    calls = len(converse)
+    second, _ = in_session('s1', lambda: agent.document_notes('bucket', key, text, 'test'))
+
+    assert complete
+    assert calls == 3
+    assert len(converse) == calls
+    assert second == first
+
+
+def test_notes_cache_misses_for_other_sessions_and_changed_text(converse):
+    text = pages(6, 100)
+    key = 'uploads/6f1c2d3e-1111-4222-8333-123456789abc/doc.pdf'
+
+    in_session('s1', lambda: agent.document_notes('bucket', key, text, 'test'))
+    in_session('s2', lambda: agent.document_notes('bucket', key, text, 'test'))
+    assert len(converse) == 6
+
+    in_session('s1', lambda: agent.document_notes('bucket', key, text.replace('x', 'y', 1), 'test'))
+    assert len(converse) == 7
+
+
+def test_failed_chunks_are_not_cached(converse, monkeypatch):
+    def failing(task, messages, inferenceConfig):
+        converse.append('failed')
+        raise RuntimeError('throttled')
+
+    monkeypatch.setattr(agent, 'converse_routed', failing)
+    text = pages(6, 100)
+
+    _, complete = in_session('s1', lambda: agent.document_notes('bucket', 'uploads/k/doc.pdf', text, 'test'))
+    in_session('s1', lambda: agent.document_notes('bucket', 'uploads/k/doc.pdf', text, 'test'))
+
+    assert not complete
+    assert len(converse) == 6
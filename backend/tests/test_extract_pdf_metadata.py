@@ -0,0 +1,95 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract_pdf_metadata as metadata
+
+TEN_K_COVER = """UNITED STATES
+SECURITIES AND EXCHANGE COMMISSION
+Washington, D.C. 20549
+FORM 10-K
+ANNUAL REPORT PURSUANT TO SECTION 13 OR 15(d)
+For the fiscal year ended December 31, 2024
+Commission File Number 001-31486
+WEBSTER FINANCIAL CORPORATION
+(Exact name of registrant as specified in its charter)
+"""
+
+TEN_Q_COVER = """FORM 10-Q
+QUARTERLY REPORT PURSUANT TO SECTION 13 OR 15(d)
+For the quarterly period ended September 30, 2023
+JPMORGAN CHASE & CO.
+(Exact name of registrant as specified in its charter)
+"""
+
+GLOSSY_COVER = """Annual Report
+Citizens Financial Group
+2023
+Dear fellow stockholders, this letter reviews the year ended December 31, 2023.
+"""
+
+
+def test_ten_k_cover_is_confident():
+    scan = metadata.scan_text(TEN_K_COVER)
+
+    assert scan['bank_name'] == 'WEBSTER FINANCIAL CORPORATION'
+    assert scan['form_type'] == '10-K'
+    assert scan['year'] == 2024
+    assert metadata.is_confident(scan)
+
+
+def test_ten_q_cover():
+    assert metadata.extract_bank_name(TEN_Q_COVER, 'q3.pdf') == 'JPMORGAN CHASE & CO.'
+    assert metadata.extract_form_type(TEN_Q_COVER, 'q3.pdf') == '10-Q'
+    assert metadata.extract_year(TEN_Q_COVER, 'q3.pdf') == 2023
+
+
+def test_annual_report_cover_counts_as_ten_k():
+    scan = metadata.scan_text(GLOSSY_COVER)
+
+    assert scan['bank_name'] == 'Citizens Financial Group'
+    assert scan['form_type'] == '10-K'
+    assert scan['year'] == 2023
+    assert metadata.is_confident(scan)
+
+
+def test_explicit_form_beats_annual_report_mention():
+    text = "Annual Report\nFORM 10-Q\nFor the quarterly period ended March 31, 2024\n"
+
+    assert metadata.scan_text(text)['form_type'] == '10-Q'
+
+
+def test_anchored_year_preferred_over_bare_year():
+    text = ("Projections through 2025 are discussed below\n"
+            "For the fiscal year ended December 31, 2023\n")
+    scan = metadata.scan_text(text)
+
+    assert scan['year'] == 2023
+    assert scan['year_score'] == metadata.YEAR_SCORE_ANCHORED
+
+
+def test_bare_years_pick_most_recent_in_range():
+    text = "Results for 2019, 2021 and 2022 and the 2030 outlook\n"
+    scan = metadata.scan_text(text)
+
+    assert scan['year'] == 2022
+    assert not metadata.is_confident(scan)
+
+
+def test_filename_fallbacks():
+    assert metadata.extract_bank_name('', 'wells-2022-10q.pdf') == 'Wells Fargo & Company'
+    assert metadata.extract_form_type('', 'wells-2022-10q.pdf') == '10-Q'
+    assert metadata.extract_year('', 'wells-2022-10q.pdf') == 2022
+    assert metadata.extract_bank_name('', 'unknown.pdf') == 'Unknown Bank'
+
+
+def test_helpers_share_one_scan():
+    metadata.scan_text.cache_clear()
+    scan = metadata.scan_text(TEN_K_COVER)
+
+    assert metadata.extract_bank_name(TEN_K_COVER, 'x.pdf', scan) == 'WEBSTER FINANCIAL CORPORATION'
+    metadata.extract_form_type(TEN_K_COVER, 'x.pdf')
+    metadata.extract_year(TEN_K_COVER, 'x.pdf')
+
+    assert metadata.scan_text.cache_info().misses == 1
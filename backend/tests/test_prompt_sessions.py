@@ -0,0 +1,74 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bank_iq_agent_v1_fixed as agent
+
+
+class FakeAgent:
+    """Strands-like agent: refuses concurrent invocations and keeps history."""
+
+    def __init__(self):
+        self.messages = []
+        self.running = False
+        self.history_seen = []
+
+    async def invoke_async(self, prompt):
+        if self.running:
+            raise RuntimeError("ConcurrencyException")
+        self.running = True
+        try:
+            self.history_seen.append(len(self.messages))
+            await asyncio.sleep(0.01)
+            self.messages += [prompt, f"answer to {prompt}"]
+            return f"answer to {prompt}"
+        finally:
+            self.running = False
+
+    async def stream_async(self, prompt):
+        result = await self.invoke_async(prompt)
+        yield {"data": result}
+        yield {"result": result}
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    fake = FakeAgent()
+    monkeypatch.setattr(agent.agent, 'instance', fake)
+    monkeypatch.setattr(agent, 'agent_lock', asyncio.Lock())
+    return fake
+
+
+def context(session_id):
+    return SimpleNamespace(session_id=session_id)
+
+
+def test_concurrent_prompt_jobs_take_turns_without_shared_history(fake_agent):
+    async def both():
+        return await asyncio.gather(
+            agent.invoke({"prompt": "one"}, context("a" * 33)),
+            agent.invoke({"prompt": "two"}, context("b" * 33)),
+        )
+
+    assert asyncio.run(both()) == ["answer to one", "answer to two"]
+    assert fake_agent.history_seen == [0, 0]
+
+
+def test_concurrent_prompt_streams_take_turns(fake_agent):
+    async def collect(prompt):
+        stream = await agent.invoke({"prompt": prompt, "stream": True}, context(None))
+        return [event async for event in stream]
+
+    async def both():
+        return await asyncio.gather(collect("one"), collect("two"))
+
+    first, second = asyncio.run(both())
+
+    assert first[-1] == {"done": True, "output": "answer to one"}
+    assert second[-1] == {"done": True, "output": "answer to two"}
+    assert fake_agent.history_seen == [0, 0]
@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bank_iq_agent_v1_fixed as agent
+from bank_iq_agent_v1_fixed import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ObjectS3:
+    """Stub S3 client holding objects in a dict."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def report_cache(monkeypatch):
+    cache = TTLCache(10, 60)
+    monkeypatch.setattr(agent, 'report_cache', cache)
+    monkeypatch.setattr(agent, 'REPORT_CACHE_BUCKET', '')
+    monkeypatch.setattr(agent, 'REPORT_CACHE_TTL', 60)
+    return cache
+
+
+def test_ttl_expiry(clock):
+    cache = TTLCache(10, 60)
+    cache.set('a', 1)
+
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is None
+    assert 'a' not in cache.items
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction_keeps_recently_read_entries(clock):
+    cache = TTLCache(2, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_created_at_is_honoured_for_backfilled_entries(clock):
+    cache = TTLCache(10, 60)
+    cache.set('a', 1, created_at=clock.now - 61)
+
+    assert cache.get('a') is None
+
+
+def test_values_skips_expired_entries_and_pop_removes(clock):
+    cache = TTLCache(10, 60)
+    cache.set('old', 1)
+    clock.now += 30
+    cache.set('new', 2)
+    clock.now += 31
+
+    assert cache.values() == [2]
+    assert cache.pop('new') == 2
+    assert cache.pop('new') is None
+
+
+def test_report_cache_key_normalizes_bank_and_tracks_prompt_and_model(monkeypatch):
+    key = agent.report_cache_key('  JPMorgan   Chase ')
+
+    assert key == agent.report_cache_key('jpmorgan chase')
+    monkeypatch.setattr(agent, 'REPORT_PROMPT_VERSION', 'v-next')
+    assert agent.report_cache_key('jpmorgan chase') != key
+    monkeypatch.setenv('MODEL_ROUTE_REPORT_SECTION', 'fast')
+    assert agent.route_models('report_section')[0] in agent.report_cache_key('jpmorgan chase')
+
+
+def test_generate_bank_report_serves_cached_complete_reports(report_cache, monkeypatch):
+    calls = []
+
+    def fake_generate_report(bank_name, context, source):
+        calls.append(bank_name)
+        return f"report {len(calls)}", True
+
+    monkeypatch.setattr(agent, 'generate_report', fake_generate_report)
+
+    assert agent.generate_bank_report(bank_name='Webster') == 'report 1'
+    assert agent.generate_bank_report(bank_name='webster') == 'report 1'
+    assert agent.generate_bank_report(bank_name='Webster', force_refresh=True) == 'report 2'
+    assert agent.generate_bank_report(bank_name='Webster') == 'report 2'
+    assert len(calls) == 2
+
+
+def test_incomplete_reports_are_not_cached(report_cache, monkeypatch):
+    monkeypatch.setattr(agent, 'generate_report', lambda bank_name, context, source: ("partial", False))
+
+    agent.generate_bank_report(bank_name='Webster')
+    assert agent.get_cached_report('Webster') is None
+
+
+def test_s3_tier_backfills_memory_and_respects_ttl(report_cache, clock, monkeypatch):
+    s3 = ObjectS3()
+    monkeypatch.setattr(agent, 's3', s3)
+    monkeypatch.setattr(agent, 'REPORT_CACHE_BUCKET', 'reports')
+
+    agent.put_cached_report('Webster', 'shared report')
+    report_cache.items.clear()
+
+    assert agent.get_cached_report('Webster') == 'shared report'
+    assert report_cache.get(agent.report_cache_key('Webster')) == 'shared report'
+
+    report_cache.items.clear()
+    clock.now += 61
+    assert agent.get_cached_report('Webster') is None
+
+
+def test_s3_tier_ignores_entries_for_other_keys(report_cache, monkeypatch):
+    s3 = ObjectS3()
+    monkeypatch.setattr(agent, 's3', s3)
+    monkeypatch.setattr(agent, 'REPORT_CACHE_BUCKET', 'reports')
+
+    agent.put_cached_report('Webster', 'shared report')
+    (bucket, object_key), body = next(iter(s3.objects.items()))
+    entry = json.loads(body)
+    entry['key'] = 'v0|other|webster'
+    s3.objects[(bucket, object_key)] = json.dumps(entry).encode('utf-8')
+    report_cache.items.clear()
+
+    assert agent.get_cached_report('Webster') is None
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    cache = TTLCache(10, 60)
+    monkeypatch.setattr(agent, 'answer_cache', cache)
+    monkeypatch.setattr(agent, 'ANSWER_NEAR_DUPLICATES', False)
+    agent.put_cached_answer("Why did net interest income increase in 2024?", "JPMorgan", "increase answer")
+    return cache
+
+
+def test_answer_cache_ignores_stopwords_punctuation_and_order(answer_cache):
+    assert agent.get_cached_answer("why did net interest income increase in 2024", "JPMorgan") == "increase answer"
+    assert agent.get_cached_answer("In 2024, why did net interest income increase?", "jpmorgan.") == "increase answer"
+
+
+def test_answer_cache_misses_antonyms(answer_cache):
+    assert agent.get_cached_answer("Why did net interest income decrease in 2024?", "JPMorgan") is None
+
+
+def test_answer_cache_misses_other_years(answer_cache):
+    assert agent.get_cached_answer("Why did net interest income increase in 2023?", "JPMorgan") is None
+
+
+def test_answer_cache_misses_changed_context(answer_cache):
+    assert agent.get_cached_answer("Why did net interest income increase in 2024?", "Webster") is None
+    assert agent.get_cached_answer("Why did net interest income increase in 2024?", "") is None
+
+
+def test_near_duplicate_matching_is_off_by_default():
+    assert os.environ.get('ANSWER_NEAR_DUPLICATES') or not agent.ANSWER_NEAR_DUPLICATES
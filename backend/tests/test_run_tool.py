@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strands import tool
+
+import bank_iq_agent_v1_fixed as agent
+
+
+@tool
+def echo_sync(text: str, times: int = 1) -> str:
+    """Echo text from a worker thread."""
+    return json.dumps({"text": text * times, "thread": threading.current_thread().name})
+
+
+@tool
+async def echo_async(text: str) -> str:
+    """Echo text on the event loop."""
+    return json.dumps({"text": text, "thread": threading.current_thread().name})
+
+
+@pytest.fixture(autouse=True)
+def echo_tools(monkeypatch):
+    monkeypatch.setitem(agent.fast_path_tools, "echo_sync", echo_sync)
+    monkeypatch.setitem(agent.fast_path_tools, "echo_async", echo_async)
+
+
+def run(name, args):
+    return json.loads(asyncio.run(agent.run_tool(name, args)))
+
+
+def test_unknown_tool():
+    assert run("no_such_tool", {}) == {"success": False, "error": "Unknown tool: no_such_tool"}
+
+
+def test_args_must_be_an_object():
+    assert run("echo_sync", ["hi"]) == {"success": False, "error": "args must be an object"}
+
+
+def test_missing_required_argument():
+    result = run("echo_sync", {"times": 2})
+
+    assert result["success"] is False
+    assert result["error"].startswith("Invalid args for echo_sync")
+
+
+def test_unexpected_argument():
+    result = run("echo_sync", {"text": "a", "bogus": 1})
+
+    assert result["success"] is False
+    assert "bogus" in result["error"]
+
+
+def test_sync_tools_run_in_a_worker_thread():
+    result = run("echo_sync", {"text": "ab", "times": 2})
+
+    assert result["text"] == "abab"
+    assert result["thread"] != threading.main_thread().name
+
+
+def test_async_tools_are_awaited_on_the_loop():
+    result = run("echo_async", {"text": "hi"})
+
+    assert result == {"text": "hi", "thread": threading.main_thread().name}
+
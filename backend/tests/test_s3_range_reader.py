@@ -0,0 +1,98 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_iq_agent_v1_fixed import S3RangeReader
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+class RangeS3:
+    """Stub S3 client serving one object and recording requested ranges."""
+
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.data)}
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        self.ranges.append((start, end))
+        return {'Body': io.BytesIO(self.data[start:end + 1])}
+
+
+def open_reader(block_size=1024, cache_blocks=4):
+    client = RangeS3(DATA)
+    return S3RangeReader('bucket', 'doc.pdf', client=client, block_size=block_size, cache_blocks=cache_blocks), client
+
+
+def test_sequential_read_coalesces_missing_blocks():
+    reader, client = open_reader(cache_blocks=16)
+
+    assert reader.read(len(DATA)) == DATA
+    assert client.ranges == [(0, len(DATA) - 1)]
+    assert reader.bytes_fetched == len(DATA)
+
+
+def test_tail_read_fetches_only_the_last_block():
+    reader, client = open_reader()
+
+    reader.seek(-100, io.SEEK_END)
+    assert reader.read(100) == DATA[-100:]
+    assert client.ranges == [(10240 - 1024, 10239)]
+
+
+def test_read_spanning_blocks_at_unaligned_offset():
+    reader, client = open_reader()
+
+    reader.seek(1000)
+    assert reader.read(100) == DATA[1000:1100]
+    assert client.ranges == [(0, 2047)]
+    assert reader.tell() == 1100
+
+
+def test_cached_blocks_are_not_refetched():
+    reader, client = open_reader()
+
+    reader.read(10)
+    reader.seek(500)
+    reader.read(10)
+    assert len(client.ranges) == 1
+
+
+def test_read_larger_than_cache_is_still_correct():
+    reader, client = open_reader(block_size=512, cache_blocks=2)
+
+    assert reader.read(4096) == DATA[:4096]
+    assert len(reader.blocks) == 2
+
+
+def test_read_past_end_returns_empty():
+    reader, _ = open_reader()
+
+    reader.seek(len(DATA) + 10)
+    assert reader.read(10) == b''
+
+
+def test_seek_whence_and_bounds():
+    reader, _ = open_reader()
+
+    assert reader.seek(100) == 100
+    assert reader.seek(50, io.SEEK_CUR) == 150
+    assert reader.seek(0, io.SEEK_END) == len(DATA)
+    with pytest.raises(ValueError):
+        reader.seek(-1)
+
+
+def test_buffered_wrapper_reads_like_a_file():
+    reader, _ = open_reader()
+    buffered = io.BufferedReader(reader, buffer_size=1024)
+
+    buffered.seek(3000)
+    assert buffered.read(3000) == DATA[3000:6000]
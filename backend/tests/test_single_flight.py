@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_iq_agent_v1_fixed import SingleFlight
+
+
+def test_cancelled_follower_does_not_cancel_shared_call():
+    flight = SingleFlight("test")
+
+    async def main():
+        release = asyncio.Event()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await release.wait()
+            return "result"
+
+        leader = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(flight.run_async("key", upstream))
+        follower = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == "result"
+        assert await follower == "result"
+        assert cancelled.cancelled()
+        assert len(calls) == 1
+
+    asyncio.run(main())
+    assert flight.in_flight == {}
+
+
+def test_thread_leader_finishes_after_async_follower_is_cancelled():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def upstream():
+        started.set()
+        release.wait(5)
+        return "result"
+
+    leader = threading.Thread(target=lambda: results.append(flight.run("key", upstream)))
+    leader.start()
+    started.wait(5)
+
+    async def cancelled_follower():
+        follower = asyncio.create_task(flight.run_async("key", lambda: None))
+        await asyncio.sleep(0)
+        follower.cancel()
+        await asyncio.gather(follower, return_exceptions=True)
+        return follower.cancelled()
+
+    assert asyncio.run(cancelled_follower())
+    release.set()
+    leader.join(5)
+
+    assert results == ["result"]
+    assert flight.in_flight == {}
+
+
+def test_cancelled_leader_fails_followers_with_runtime_error():
+    flight = SingleFlight("test")
+
+    async def main():
+        async def upstream():
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        results = await asyncio.gather(leader, follower, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert isinstance(results[1], RuntimeError)
+
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import base64
+import binascii
+import mmap
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract_pdf_metadata
+import bank_iq_agent_v1_fixed as agent
+from extract_pdf_metadata import decode_base64_to_spool
+
+PAYLOAD = os.urandom(5000)
+
+
+def test_decodes_small_payload_in_memory():
+    with decode_base64_to_spool(base64.b64encode(PAYLOAD).decode()) as spool:
+        assert spool.tell() == 0
+        assert spool.read() == PAYLOAD
+        assert not spool._rolled
+
+
+def test_ignores_line_wrapping():
+    wrapped = base64.encodebytes(PAYLOAD).decode()
+    assert '\n' in wrapped
+
+    with decode_base64_to_spool(wrapped) as spool:
+        assert spool.read() == PAYLOAD
+
+
+def test_chunks_that_split_base64_quads(monkeypatch):
+    # Whitespace shifts the quad alignment between chunks
+    monkeypatch.setattr(extract_pdf_metadata, 'BASE64_CHUNK_CHARS', 10)
+    wrapped = base64.encodebytes(PAYLOAD[:997]).decode()
+
+    with decode_base64_to_spool(wrapped) as spool:
+        assert spool.read() == PAYLOAD[:997]
+
+
+def test_large_payload_rolls_over_to_disk():
+    with decode_base64_to_spool(base64.b64encode(PAYLOAD).decode(), max_memory=1024) as spool:
+        assert spool._rolled
+        assert agent.spooled_size(spool) == len(PAYLOAD)
+        assert spool.read() == PAYLOAD
+
+
+def test_invalid_base64_raises():
+    with pytest.raises(binascii.Error):
+        decode_base64_to_spool('not base64!')
+
+
+def test_spooled_buffer_maps_rolled_over_files(monkeypatch):
+    monkeypatch.setattr(agent, 'SPOOL_MAX_MEMORY', 1024)
+    with decode_base64_to_spool(base64.b64encode(PAYLOAD).decode(), max_memory=1024) as spool:
+        buffer = agent.spooled_buffer(spool)
+        assert isinstance(buffer, mmap.mmap)
+        assert buffer[:] == PAYLOAD
+        buffer.close()
+
+
+def test_spooled_buffer_returns_bytes_for_small_files():
+    with decode_base64_to_spool(base64.b64encode(PAYLOAD[:100]).decode()) as spool:
+        assert agent.spooled_buffer(spool) == PAYLOAD[:100]
@@ -18,6 +18,7 @@ aws cloudformation create-stack \
   --stack-name ${STACK_NAME}-infra \
   --template-body file://prerequisites.yaml \
   --parameters ParameterKey=ProjectName,ParameterValue=$STACK_NAME ParameterKey=Environment,ParameterValue=prod \
+    ParameterKey=FrontendOrigin,ParameterValue=${FRONTEND_ORIGIN:-http://localhost:3000} \
   --capabilities CAPABILITY_NAMED_IAM \
   --region $REGION
 
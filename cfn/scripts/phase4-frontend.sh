@@ -36,6 +36,20 @@ aws cloudformation wait stack-create-complete --stack-name ${STACK_NAME}-fronten
 # Get CloudFront URL
 CLOUDFRONT_URL=$(aws cloudformation describe-stacks --stack-name ${STACK_NAME}-frontend --region $REGION --query 'Stacks[0].Outputs[?OutputKey==`ApplicationUrl`].OutputValue' --output text)
 
+# Only the frontend may PUT presigned uploads into the uploaded-docs bucket
+echo "🔒 Restricting upload bucket CORS to $CLOUDFRONT_URL..."
+aws cloudformation update-stack \
+  --stack-name ${STACK_NAME}-infra \
+  --use-previous-template \
+  --parameters \
+    ParameterKey=ProjectName,UsePreviousValue=true \
+    ParameterKey=Environment,UsePreviousValue=true \
+    ParameterKey=CodeBuildRoleArn,UsePreviousValue=true \
+    ParameterKey=FrontendOrigin,ParameterValue=$CLOUDFRONT_URL \
+  --capabilities CAPABILITY_NAMED_IAM \
+  --region $REGION
+aws cloudformation wait stack-update-complete --stack-name ${STACK_NAME}-infra --region $REGION
+
 # Get Cognito config
 COGNITO_USER_POOL_ID=$(aws cloudformation describe-stacks --stack-name ${STACK_NAME}-auth --region $REGION --query 'Stacks[0].Outputs[?OutputKey==`UserPoolId`].OutputValue' --output text)
 COGNITO_CLIENT_ID=$(aws cloudformation describe-stacks --stack-name ${STACK_NAME}-auth --region $REGION --query 'Stacks[0].Outputs[?OutputKey==`UserPoolClientId`].OutputValue' --output text)
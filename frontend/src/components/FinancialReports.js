@@ -136,46 +136,18 @@ function FinancialReports() {
       setFullReport('');
       setError('');
       
-      let inputText;
-      if (mode === 'local' && analyzedDocs.length > 0) {
-        const doc = analyzedDocs[0];
-        if (doc.s3_key) {
-          inputText = `Use the analyze_uploaded_pdf tool to generate a comprehensive financial analysis report.
-
-Call analyze_uploaded_pdf with these parameters:
-- s3_key: "${doc.s3_key}"
-- bank_name: "${doc.bank_name}"
-- analysis_type: "comprehensive"
-
-Generate a detailed 8-section report with markdown headers covering all aspects of the bank's financial performance.`;
-        } else {
-          inputText = `Generate a comprehensive financial analysis report for ${selectedBank} based on their ${doc.form_type} filing for fiscal year ${doc.year}. ` +
-            `Use publicly available data and SEC filings.`;
-        }
-      } else {
-        inputText = `Use the generate_bank_report tool to create a comprehensive financial analysis report for ${selectedBank}. Call generate_bank_report with bank_name: "${selectedBank}".`;
-      }
-      
-      // Submit async job
-      console.log('Submitting async job for full report...');
-      setPollingStatus('Submitting request...');
-      const jobSubmission = await api.submitJob(inputText, 'full-report');
-      const jobId = jobSubmission.jobId;
-      
-      console.log(`Job ${jobId} submitted, polling for completion...`);
+      // Stream the report so sections render as they are written
       setPollingStatus('Generating report (this may take 1-2 minutes)...');
+      const onChunk = (chunk) => setFullReport(prev => prev + chunk);
       
-      // Poll for completion (max 4 minutes = 120 attempts * 2 seconds)
-      const result = await api.pollJobUntilComplete(jobId, 120, 2000);
-      
-      if (result.status === 'failed') {
-        throw new Error(result.error || 'Job failed');
-      }
-      
-      // Remove DATA: line from report display
-      let cleanReport = result.result;
-      if (cleanReport.includes('DATA:')) {
-        cleanReport = cleanReport.replace(/DATA:\s*\{[\s\S]*?\}\s*\n+/g, '').trim();
+      let cleanReport;
+      if (mode === 'local' && analyzedDocs.length > 0 && analyzedDocs[0].s3_key) {
+        console.log('Streaming analysis of uploaded document...');
+        cleanReport = await api.analyzeUploadedDocument(analyzedDocs[0], onChunk);
+      } else {
+        const bankName = selectedBank || (analyzedDocs[0] && analyzedDocs[0].bank_name);
+        console.log(`Streaming full report for ${bankName}...`);
+        cleanReport = await api.generateFullReport(bankName, onChunk);
       }
       
       setFullReport(cleanReport);
@@ -184,6 +156,7 @@ Generate a detailed 8-section report with markdown headers covering all aspects
       
     } catch (err) {
       console.error('Full report generation error:', err);
+      setFullReport('');
       setError('Failed to generate full report: ' + err.message);
       setPollingStatus('');
     } finally {
@@ -399,25 +372,33 @@ Generate a detailed 8-section report with markdown headers covering all aspects
                         setLoading(true);
                         setError('');
                         
-                        // Convert files to base64 for upload
-                        const filePromises = uploadedFiles.map(file => {
-                          return new Promise((resolve) => {
-                            const reader = new FileReader();
-                            reader.onload = (e) => {
-                              resolve({
-                                name: file.name,
-                                size: file.size,
-                                content: e.target.result.split(',')[1] // Get base64 part
-                              });
-                            };
-                            reader.readAsDataURL(file);
+                        let response;
+                        try {
+                          // Upload directly to S3 and analyze by reference
+                          response = await api.uploadPDFsByReference(uploadedFiles);
+                        } catch (refError) {
+                          console.log('Upload by reference failed, falling back to base64 upload:', refError.message);
+                          
+                          // Convert files to base64 for upload
+                          const filePromises = uploadedFiles.map(file => {
+                            return new Promise((resolve) => {
+                              const reader = new FileReader();
+                              reader.onload = (e) => {
+                                resolve({
+                                  name: file.name,
+                                  size: file.size,
+                                  content: e.target.result.split(',')[1] // Get base64 part
+                                });
+                              };
+                              reader.readAsDataURL(file);
+                            });
                           });
-                        });
-                        
-                        const filesData = await Promise.all(filePromises);
-                        
-                        // Upload to backend
-                        const response = await api.uploadPDFs(filesData);
+                          
+                          const filesData = await Promise.all(filePromises);
+                          
+                          // Upload to backend
+                          response = await api.uploadPDFs(filesData);
+                        }
                         
                         if (response.success && response.documents) {
                           setAnalyzedDocs(response.documents);
@@ -66,6 +66,25 @@ describe('API Service Tests', () => {
       expect(result.result.data).toEqual([]);
       expect(result.result.analysis).toBe(mockResponse);
     });
+
+    it('should take chart data from the peer_comparison artifact', async () => {
+      const mockResponse = 'JPMorgan leads the peer group on ROA...';
+      const artifact = {
+        id: 'peer_comparison-1a2b3c4d',
+        type: 'peer_comparison',
+        data: { data: [{ Bank: 'JPMorgan', Quarter: '2024-Q1', Metric: 'ROA', Value: 1.5 }], analysis: 'Tool analysis' }
+      };
+
+      fetch
+        .mockResolvedValueOnce({ ok: true, json: async () => ({ jobId: 'test-art', status: 'pending' }) })
+        .mockResolvedValueOnce({ ok: true, json: async () => ({ status: 'completed' }) })
+        .mockResolvedValueOnce({ ok: true, json: async () => ({ status: 'completed', result: mockResponse, artifacts: [artifact] }) });
+
+      const result = await api.analyzePeers('JPMorgan', ['BofA'], 'ROA');
+
+      expect(result.result.data).toEqual(artifact.data.data);
+      expect(result.result.analysis).toBe(mockResponse);
+    });
   });
 
   describe('getFDICData', () => {
@@ -82,6 +101,96 @@ describe('API Service Tests', () => {
       expect(result.success).toBe(true);
       expect(result.result.data).toHaveLength(1);
       expect(result.result.data[0].NAME).toBe('JPMorgan');
+      expect(JSON.parse(fetch.mock.calls[0][1].body)).toEqual({ tool: 'get_fdic_data', args: {}, jobType: 'tool-invocation', sessionId: expect.any(String) });
+    });
+  });
+
+  describe('chatWithLocalFiles', () => {
+    it('should ask chat_with_documents about the uploaded document directly', async () => {
+      fetch
+        .mockResolvedValueOnce({ ok: true, json: async () => ({ jobId: 'test-789', status: 'pending' }) })
+        .mockResolvedValueOnce({ ok: true, json: async () => ({ status: 'completed' }) })
+        .mockResolvedValueOnce({ ok: true, json: async () => ({ status: 'completed', result: 'Revenue grew 8%.' }) });
+
+      const doc = { s3_key: 'uploads/abc/10k.pdf', bank_name: 'JPMorgan', form_type: '10-K', year: 2024 };
+      const result = await api.chatWithLocalFiles('What was revenue growth?', [doc]);
+
+      expect(result.response).toBe('Revenue grew 8%.');
+      expect(JSON.parse(fetch.mock.calls[0][1].body)).toEqual({
+        tool: 'chat_with_documents',
+        args: { question: 'What was revenue growth?', s3_key: 'uploads/abc/10k.pdf', bank_name: 'JPMorgan', form_type: '10-K' },
+        jobType: 'tool-invocation',
+        sessionId: expect.any(String)
+      });
+    });
+  });
+
+  describe('uploadPDFsByReference', () => {
+    it('should upload to the presigned URL and register by S3 key', async () => {
+      const mockFiles = [{ name: 'test.pdf', size: 10 }];
+
+      fetch
+        .mockResolvedValueOnce({ // upload-url
+          ok: true,
+          json: async () => ({ upload_url: 'https://s3.example/put', s3_key: 'uploads/abc/test.pdf' })
+        })
+        .mockResolvedValueOnce({ ok: true }) // S3 PUT
+        .mockResolvedValueOnce({ // upload-pdf-ref
+          ok: true,
+          json: async () => ({ success: true, documents: [{ s3_key: 'uploads/abc/test.pdf' }] })
+        });
+
+      const result = await api.uploadPDFsByReference(mockFiles);
+
+      expect(result.success).toBe(true);
+      expect(result.method).toBe('reference');
+      expect(fetch).toHaveBeenCalledTimes(3);
+      expect(fetch.mock.calls[1][0]).toBe('https://s3.example/put');
+      expect(JSON.parse(fetch.mock.calls[2][1].body).documents[0].s3_key).toBe('uploads/abc/test.pdf');
+    });
+  });
+
+  describe('generateFullReport', () => {
+    it('should stream the report tool and return the final output', async () => {
+      const { TextEncoder, TextDecoder } = require('util');
+      global.TextDecoder = global.TextDecoder || TextDecoder;
+      const events = [
+        { chunk: '## Executive', source: 'generate_bank_report' },
+        { chunk: ' Summary\n', source: 'generate_bank_report' },
+        { done: true, output: '## Executive Summary\n' }
+      ];
+      const encoded = new TextEncoder().encode(events.map(e => `data: ${JSON.stringify(e)}\n\n`).join(''));
+      const reads = [{ done: false, value: encoded.slice(0, 20) }, { done: false, value: encoded.slice(20) }, { done: true }];
+
+      fetch.mockResolvedValueOnce({
+        ok: true,
+        body: { getReader: () => ({ read: async () => reads.shift() }) }
+      });
+
+      const chunks = [];
+      const report = await api.generateFullReport('JPMorgan', (chunk) => chunks.push(chunk));
+
+      expect(report).toBe('## Executive Summary\n');
+      expect(chunks.join('')).toBe('## Executive Summary\n');
+      expect(fetch.mock.calls[0][0]).toContain('/api/invoke-agent-stream');
+      expect(JSON.parse(fetch.mock.calls[0][1].body)).toEqual({ tool: 'generate_bank_report', args: { bank_name: 'JPMorgan' }, sessionId: expect.any(String) });
+    });
+  });
+
+  describe('sessions', () => {
+    it('should give each prompt job its own session and share one across tool jobs', async () => {
+      fetch.mockResolvedValue({ ok: true, json: async () => ({ jobId: 'job', status: 'pending' }) });
+
+      await Promise.all([api.submitJob('first prompt'), api.submitJob('second prompt')]);
+      await api.submitToolJob('get_fdic_data');
+      await api.submitToolJob('get_fdic_data');
+
+      const sessions = fetch.mock.calls.map(call => JSON.parse(call[1].body).sessionId);
+      expect(sessions.every(session => session.length >= 33)).toBe(true);
+      expect(sessions[0]).not.toBe(sessions[1]);
+      expect(sessions[2]).toBe(sessions[3]);
+      expect(sessions.slice(0, 2)).not.toContain(sessions[2]);
+      fetch.mockReset();
     });
   });
 
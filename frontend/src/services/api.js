@@ -20,8 +20,32 @@ async function getAuthHeaders() {
   return headers;
 }
 
+// AgentCore requires session IDs of at least 33 characters.
+const newSessionId = () => `bankiq-${Date.now()}-${Math.random().toString(36).substring(2)}-${Math.random().toString(36).substring(2)}`;
+
+// Tool calls share one AgentCore session per page load, so follow-up requests
+// reuse the bank identifiers, datasets and document text already resolved.
+// Prompts each get a fresh session: the agent keeps conversation history per
+// session and runs one prompt at a time, so concurrent prompts must not share one.
+const SESSION_ID = newSessionId();
+
 // Removed callBackend function - all endpoints now use async jobs for reliability
 
+// Report tools return markdown, or a {"success": false, "error": ...} object on failure
+function cleanStreamedReport(report) {
+  if (report && report.trim().startsWith('{')) {
+    let parsed = null;
+    try { parsed = JSON.parse(report); } catch (e) { /* not JSON - a report */ }
+    if (parsed && parsed.success === false) {
+      throw new Error(parsed.error || 'Report generation failed');
+    }
+  }
+  if (report && report.includes('DATA:')) {
+    return report.replace(/DATA:\s*\{[\s\S]*?\}\s*\n+/g, '').trim();
+  }
+  return report;
+}
+
 export const api = {
   async getSECReports(bankName, year, useRag, cik) {
     // Use direct backend endpoint for faster, more reliable SEC filings
@@ -114,15 +138,7 @@ export const api = {
 - peer_banks: ["${peerBanks.join('", "')}"]
 - metric: "${metric}"
 
-CRITICAL INSTRUCTIONS:
-1. Call the compare_banks tool
-2. Return the tool's JSON output EXACTLY as-is on the first line
-3. Then provide your expanded analysis below it
-
-Format:
-{"data": [...], "base_bank": "...", "peer_banks": [...], "analysis": "...", "source": "..."}
-
-Your detailed analysis here...`;
+The chart data is delivered separately, so do not repeat it. Provide your expanded analysis.`;
     
     // Use async job pattern for better reliability
     const job = await this.submitJob(prompt);
@@ -131,7 +147,22 @@ Your detailed analysis here...`;
     
     console.log('Agent response for peer analysis:', response);
     
-    // Extract chart data from agent response
+    // Chart data arrives as a tool artifact; the response is all analysis
+    const artifact = (result.artifacts || []).find(a => a.type === 'peer_comparison');
+    if (artifact) {
+      console.log('✓ Chart data artifact:', artifact.data.data.length, 'records');
+      return {
+        success: true,
+        result: {
+          data: artifact.data.data,
+          analysis: response || artifact.data.analysis,
+          base_bank: baseBank,
+          peer_banks: peerBanks
+        }
+      };
+    }
+    
+    // Older runtimes echo the tool JSON in the response text
     let chartData = [];
     let extractedAnalysis = '';
     
@@ -219,7 +250,7 @@ Your detailed analysis here...`;
   },
 
   async getFDICData() {
-    const job = await this.submitJob('Use the get_fdic_data tool to get current FDIC banking data. Call get_fdic_data() to fetch real-time financial metrics from FDIC API.');
+    const job = await this.submitToolJob('get_fdic_data');
     const result = await this.pollJobUntilComplete(job.jobId);
     
     // Parse the agent response which should contain JSON from the tool
@@ -266,7 +297,10 @@ Your detailed analysis here...`;
       }
     }
     
-    const job = await this.submitJob(`Use the answer_banking_question tool to answer this question: "${prompt}". Call answer_banking_question with question: "${prompt}" and context: "${bankName || 'General banking question'}".`);
+    const job = await this.submitToolJob('answer_banking_question', {
+      question: prompt,
+      context: bankName || 'General banking question'
+    });
     const result = await this.pollJobUntilComplete(job.jobId);
     
     // Clean response - remove DATA: lines from chat responses
@@ -278,27 +312,46 @@ Your detailed analysis here...`;
     return { response: cleanResponse, sources: [] };
   },
 
-  async generateFullReport(bankName) {
-    const job = await this.submitJob(`Use the generate_bank_report tool to create a comprehensive financial analysis report for ${bankName}. Call generate_bank_report with bank_name: "${bankName}".`);
-    const result = await this.pollJobUntilComplete(job.jobId);
+  // Reports stream section by section; onChunk receives the text as it is written
+  async generateFullReport(bankName, onChunk = () => {}) {
+    const report = await this.streamTool('generate_bank_report', { bank_name: bankName }, onChunk);
+    return cleanStreamedReport(report);
+  },
+
+  async analyzeUploadedDocument(doc, onChunk = () => {}) {
+    const report = await this.streamTool('analyze_uploaded_pdf', {
+      s3_key: doc.s3_key,
+      bank_name: doc.bank_name,
+      analysis_type: 'comprehensive'
+    }, onChunk);
+    return cleanStreamedReport(report);
+  },
+
+  // Async job methods
+  async submitJob(inputText, jobType = 'agent-invocation') {
+    const headers = await getAuthHeaders();
+    
+    const response = await fetch(`${BACKEND_URL}/api/jobs/submit`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({ inputText, jobType, sessionId: newSessionId() })
+    });
     
-    // Clean response - remove DATA: lines from reports
-    let cleanReport = result.result;
-    if (cleanReport && cleanReport.includes('DATA:')) {
-      cleanReport = cleanReport.replace(/DATA:\s*\{[\s\S]*?\}\s*\n+/g, '').trim();
+    if (!response.ok) {
+      throw new Error(`Job submission failed: ${response.status}`);
     }
     
-    return cleanReport;
+    return response.json();
   },
 
-  // Async job methods
-  async submitJob(inputText, jobType = 'agent-invocation') {
+  // Structured job: the agent runtime runs this tool directly, skipping LLM tool selection
+  async submitToolJob(tool, args = {}, jobType = 'tool-invocation') {
     const headers = await getAuthHeaders();
     
     const response = await fetch(`${BACKEND_URL}/api/jobs/submit`, {
       method: 'POST',
       headers,
-      body: JSON.stringify({ inputText, jobType })
+      body: JSON.stringify({ tool, args, jobType, sessionId: SESSION_ID })
     });
     
     if (!response.ok) {
@@ -371,31 +424,72 @@ Your detailed analysis here...`;
   },
 
   async chatWithLocalFiles(message, analyzedDocs) {
-    let prompt = message;
-    if (analyzedDocs && analyzedDocs.length > 0) {
-      const doc = analyzedDocs[0];
-      if (doc.s3_key) {
-        // Use the chat_with_documents tool for Q&A (not analyze_uploaded_pdf which is for full reports)
-        prompt = `Use the chat_with_documents tool to answer this question about the uploaded document.
-
-Question: "${message}"
-
-Document details:
-- s3_key: "${doc.s3_key}"
-- bank_name: "${doc.bank_name}"
-- form_type: "${doc.form_type}"
-- year: ${doc.year}
-
-Call chat_with_documents with these parameters to get the answer from the document.`;
-      } else {
-        prompt = `Answer this question about ${doc.bank_name} ${doc.form_type} ${doc.year}: ${message}`;
-      }
+    let job;
+    const doc = analyzedDocs && analyzedDocs.length > 0 ? analyzedDocs[0] : null;
+    if (doc && doc.s3_key) {
+      // Q&A over the uploaded document (analyze_uploaded_pdf is for full reports)
+      job = await this.submitToolJob('chat_with_documents', {
+        question: message,
+        s3_key: doc.s3_key,
+        bank_name: doc.bank_name || '',
+        form_type: doc.form_type || '10-K'
+      });
+    } else {
+      job = await this.submitToolJob('answer_banking_question', {
+        question: message,
+        context: doc ? `${doc.bank_name} ${doc.form_type} ${doc.year}` : ''
+      });
     }
-    const job = await this.submitJob(prompt);
     const result = await this.pollJobUntilComplete(job.jobId);
     return { response: result.result, sources: [] };
   },
 
+  // Upload-by-reference: PUT the raw files straight to S3 via presigned URLs,
+  // then have the agent analyze them by S3 key (no base64 through the agent)
+  async uploadPDFsByReference(files) {
+    const headers = await getAuthHeaders();
+    const uploaded = [];
+
+    for (const file of files) {
+      const urlResponse = await fetch(`${BACKEND_URL}/api/upload-url`, {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({ filename: file.name })
+      });
+
+      if (!urlResponse.ok) {
+        throw new Error(`Upload URL request failed: ${urlResponse.status}`);
+      }
+
+      const { upload_url, s3_key } = await urlResponse.json();
+
+      const putResponse = await fetch(upload_url, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/pdf' },
+        body: file
+      });
+
+      if (!putResponse.ok) {
+        throw new Error(`S3 upload failed: ${putResponse.status}`);
+      }
+
+      uploaded.push({ s3_key, filename: file.name, size: file.size });
+    }
+
+    const response = await fetch(`${BACKEND_URL}/api/upload-pdf-ref`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({ documents: uploaded })
+    });
+
+    if (!response.ok) {
+      throw new Error(`Upload registration failed: ${response.status}`);
+    }
+
+    const result = await response.json();
+    return { ...result, method: 'reference' };
+  },
+
   async uploadPDFs(files, bankName = '') {
     // Try agent-powered upload first (uses Claude for intelligent analysis)
     try {
@@ -434,32 +528,54 @@ Call chat_with_documents with these parameters to get the answer from the docume
     return { ...result, method: 'direct' };
   },
 
-  // Streaming method
-  async callAgentStream(inputText, onChunk, onComplete, onError) {
+  // Run one tool over the streaming endpoint; resolves with its final output
+  streamTool(tool, args, onChunk = () => {}, onArtifact = () => {}) {
+    return new Promise((resolve, reject) => {
+      this.callAgentStream({ tool, args }, onChunk, resolve, (error) => reject(new Error(error)), onArtifact)
+        .then(() => reject(new Error('Stream ended without a result')));
+    });
+  },
+
+  // Streaming method - request is a prompt string or a structured { tool, args } call
+  async callAgentStream(request, onChunk, onComplete, onError, onArtifact = () => {}) {
     try {
+      const headers = await getAuthHeaders();
+      const body = typeof request === 'string'
+        ? { inputText: request, sessionId: newSessionId() }
+        : { tool: request.tool, args: request.args || {}, sessionId: SESSION_ID };
       const response = await fetch(`${BACKEND_URL}/api/invoke-agent-stream`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ inputText })
+        headers,
+        body: JSON.stringify(body)
       });
 
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.error || `HTTP ${response.status}`);
+      }
+
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
+      let buffer = '';
 
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
 
-        const chunk = decoder.decode(value);
-        const lines = chunk.split('\n');
+        // Events can be split across reads; keep the trailing partial line
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
 
         for (const line of lines) {
           if (line.startsWith('data: ')) {
             const data = JSON.parse(line.slice(6));
             if (data.chunk) {
-              onChunk(data.chunk);
+              onChunk(data.chunk, data.source);
+            } else if (data.artifact) {
+              onArtifact(data.artifact);
             } else if (data.done) {
-              onComplete();
+              onComplete(data.output);
             } else if (data.error) {
               onError(data.error);
             }